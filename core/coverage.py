@@ -0,0 +1,220 @@
+"""
+資料覆蓋位元圖
+以「股票 × 日期」的位元矩陣記錄每支股票在哪些日期有資料：
+- 每支股票一列，以 ORIGIN 起算的日曆天為欄，有資料為 1
+- 以 np.packbits 壓縮（每天 1 bit），2,000 支股票 × 20 年約 3.6 MB
+- 完整度、缺失日期與缺失區間都由向量化的位元運算取得，不必讀取資料
+
+狀態檔由儲存後端的寫入監聽器隨寫入更新；不存在或與資料集清單不一致時由歷史資料重建
+"""
+
+import os
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from core.store import StockStore
+
+ORIGIN = "2010-01-01"
+# 欄數不足時一次擴充的天數
+GROW_DAYS = 366
+
+
+def _days(dates, origin):
+    """日期（字串 Series / 陣列）轉為以 origin 起算的天數"""
+    values = np.asarray(pd.Series(dates).astype(str).str[:10], dtype='datetime64[D]')
+    return (values - origin).astype(np.int64)
+
+
+class CoverageIndex:
+    """
+    股票 × 日期覆蓋位元圖
+
+    Attributes:
+        origin: 第 0 欄的日期（numpy datetime64[D]）
+        stock_ids: 各列的股票代號
+        bits: (股票數, 位元組數) 的 uint8 矩陣，第 d 天位於第 d // 8 個位元組的第 d % 8 個位元（高位在前）
+    """
+
+    FILENAME = "coverage.npz"
+    FORMAT_VERSION = 1
+
+    def __init__(self, path, origin=ORIGIN):
+        self.path = Path(path)
+        self.origin = np.datetime64(origin, 'D')
+        self.stock_ids = []
+        self.rows = {}
+        self.bits = np.zeros((0, 0), dtype=np.uint8)
+        self.synced_version = None
+
+    # ---- 持久化 ----
+
+    @classmethod
+    def load(cls, path):
+        """載入位元圖，不存在或格式不符時返回 None"""
+        path = Path(path)
+        if not path.exists():
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                if int(data["format"]) != cls.FORMAT_VERSION:
+                    return None
+                index = cls(path, str(data["origin"]))
+                index.stock_ids = data["stock_ids"].astype(str).tolist()
+                index.bits = data["bits"]
+                index.synced_version = int(data["synced_version"])
+        except (OSError, ValueError, KeyError):
+            return None
+        index.rows = {stock_id: row for row, stock_id in enumerate(index.stock_ids)}
+        return index
+
+    def save(self):
+        """原子性地寫入狀態檔"""
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(
+                f,
+                format=self.FORMAT_VERSION,
+                origin=str(self.origin),
+                stock_ids=np.array(self.stock_ids, dtype=str),
+                bits=self.bits,
+                synced_version=-1 if self.synced_version is None else self.synced_version,
+            )
+        os.replace(tmp_path, self.path)
+
+    # ---- 由資料更新 ----
+
+    @classmethod
+    def rebuild(cls, storage):
+        """由歷史資料重建（只讀取 date, stock_id 欄位）"""
+        manifest = storage.load_manifest()
+        origin = ORIGIN
+        if not manifest.is_empty and manifest.min_date < ORIGIN:
+            origin = manifest.min_date[:4] + "-01-01"
+
+        index = cls(Path(storage.output_dir) / cls.FILENAME, origin)
+        index.synced_version = manifest.version
+        if not manifest.is_empty:
+            index.apply(StockStore(storage).query(columns=['date', 'stock_id']))
+        return index
+
+    def apply(self, batch_df):
+        """
+        標記一批記錄的 (股票, 日期) 為有資料
+
+        Returns:
+            bool: 有早於 origin 的日期（無法表示，需要重建）時返回 False
+        """
+        if batch_df.empty:
+            return True
+        days = _days(batch_df['date'], self.origin)
+        if days.min() < 0:
+            return False
+
+        self._grow_days(int(days.max()) + 1)
+        stock_ids = batch_df['stock_id'].astype(str)
+        self._add_stocks(pd.unique(stock_ids))
+        rows = stock_ids.map(self.rows).to_numpy(dtype=np.int64)
+
+        masks = (np.uint8(0x80) >> (days & 7).astype(np.uint8)).astype(np.uint8)
+        np.bitwise_or.at(self.bits, (rows, days >> 3), masks)
+        return True
+
+    def _grow_days(self, day_count):
+        byte_count = (day_count + 7) // 8
+        if byte_count > self.bits.shape[1]:
+            byte_count = max(byte_count, self.bits.shape[1] + GROW_DAYS // 8)
+            grown = np.zeros((self.bits.shape[0], byte_count), dtype=np.uint8)
+            grown[:, :self.bits.shape[1]] = self.bits
+            self.bits = grown
+
+    def _add_stocks(self, stock_ids):
+        new_ids = [stock_id for stock_id in stock_ids if stock_id not in self.rows]
+        if not new_ids:
+            return
+        for stock_id in new_ids:
+            self.rows[stock_id] = len(self.stock_ids)
+            self.stock_ids.append(stock_id)
+        self.bits = np.vstack([self.bits, np.zeros((len(new_ids), self.bits.shape[1]), dtype=np.uint8)])
+
+    # ---- 查詢 ----
+
+    def matrix(self, dates):
+        """
+        指定日期的覆蓋矩陣
+
+        Args:
+            dates: 日期字串列表（例如交易日曆的交易日）
+
+        Returns:
+            np.ndarray: (股票數, 日期數) 的 bool 矩陣，列的順序同 stock_ids
+        """
+        days = _days(dates, self.origin) if len(dates) else np.zeros(0, dtype=np.int64)
+        out = np.zeros((len(self.stock_ids), len(days)), dtype=bool)
+        inside = (days >= 0) & (days < self.bits.shape[1] * 8)
+        if inside.any():
+            columns = self.bits[:, days[inside] >> 3]
+            out[:, inside] = (columns & (np.uint8(0x80) >> (days[inside] & 7).astype(np.uint8))) != 0
+        return out
+
+    def day_counts(self, start_date, end_date):
+        """各股票在 start_date 與 end_date 之間（含）有資料的天數"""
+        start, end = _days([start_date, end_date], self.origin)
+        start, end = max(int(start), 0), min(int(end), self.bits.shape[1] * 8 - 1)
+        if end < start:
+            return np.zeros(len(self.stock_ids), dtype=np.int64)
+        unpacked = np.unpackbits(self.bits, axis=1)[:, start:end + 1]
+        return unpacked.sum(axis=1, dtype=np.int64)
+
+
+def missing_runs(missing):
+    """
+    缺失矩陣中每列連續為 True 的區段
+
+    Args:
+        missing: (股票數, 日期數) 的 bool 矩陣
+
+    Returns:
+        tuple: (列索引, 起始欄, 結束欄（含）) 三個陣列，依列、欄排序
+    """
+    padded = np.zeros((missing.shape[0], missing.shape[1] + 2), dtype=np.int8)
+    padded[:, 1:-1] = missing
+    edges = np.diff(padded, axis=1)
+    start_rows, start_cols = np.nonzero(edges == 1)
+    _, end_cols = np.nonzero(edges == -1)
+    return start_rows, start_cols, end_cols - 1
+
+
+def attach_coverage(storage):
+    """在儲存後端註冊監聽器，每次寫入後更新位元圖（狀態檔不存在時不做任何事）"""
+    path = Path(storage.output_dir) / CoverageIndex.FILENAME
+
+    def _on_write(batch_df, manifest):
+        index = CoverageIndex.load(path)
+        if index is None or index.synced_version != manifest.version - 1:
+            # 中間有未經監聽器的寫入，交由 load_coverage 重建
+            return
+        if not index.apply(batch_df):
+            path.unlink()
+            return
+        index.synced_version = manifest.version
+        index.save()
+
+    storage.add_write_listener(_on_write)
+
+
+def load_coverage(storage, rebuild=False):
+    """取得與資料同步的位元圖，不存在或不一致時由歷史資料重建"""
+    path = Path(storage.output_dir) / CoverageIndex.FILENAME
+    manifest = storage.load_manifest()
+
+    index = None if rebuild else CoverageIndex.load(path)
+    if index is None or index.synced_version != manifest.version:
+        print("🔄 由歷史資料重建資料覆蓋位元圖...")
+        started = datetime.now()
+        index = CoverageIndex.rebuild(storage)
+        index.save()
+        print(f"✓ 位元圖重建完成（{len(index.stock_ids)} 支股票，{(datetime.now() - started).total_seconds():.1f} 秒）")
+    return index
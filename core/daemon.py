@@ -0,0 +1,307 @@
+"""
+常駐服務
+以單一行程取代每小時的抓取排程與每日的新高檢查排程：
+- 資料集、交易日曆與滾動新高狀態只在啟動時載入一次，常駐於記憶體
+  （滾動新高狀態即最近 N 年每支股票的單調遞減佇列，是資料的精簡形式）
+- 每批寫入由抓取器的滾動新高監聽器直接套用到記憶體中的狀態，篩選不必重新讀檔
+- 依內部排程執行抓取（fetch）、資料段合併（merge）與新高篩選（screen）工作，
+  工作依序在排程執行緒中執行，不會同時寫入資料
+- 透過本機的 Unix domain socket 提供狀態查詢、手動觸發與個股序列查詢（每行一個 JSON 指令）；
+  個股序列經由查詢介面的記憶體快取，重複查詢同一支股票不需讀檔
+"""
+
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+import traceback
+from datetime import datetime
+from pathlib import Path
+
+from core.fetch_status import probe_backoff, write_fetch_status
+from core.line_sender import send_line_message
+from core.new_high import format_new_high_message
+from core.rolling_high import load_rolling_high
+from core.stock_fetcher import TaiwanStockFetcher
+
+SOCKET_FILENAME = "daemon.sock"
+STATE_FILENAME = "daemon_state.json"  # 已篩選並通知的最新交易日（重新啟動後不重複通知）
+JOBS = ("fetch", "merge", "screen")
+
+
+class StockDaemon:
+    """
+    常駐抓取與篩選服務
+
+    - fetch: 每 fetch_interval 秒補齊到最新交易日（等同 fetch_latest_stock_prices.py）
+    - merge: 每 merge_interval 秒將資料段折疊回主資料
+    - screen: 新交易日的資料補齊後執行一次新高篩選並發送通知
+    """
+
+    def __init__(self, output_dir="data", socket_path=None, fetch_interval=3600,
+                 merge_interval=24 * 3600, api_token=None):
+        self.output_dir = Path(output_dir)
+        self.socket_path = Path(socket_path or self.output_dir / SOCKET_FILENAME)
+        self.intervals = {"fetch": fetch_interval, "merge": merge_interval}
+
+        self.fetcher = TaiwanStockFetcher(api_token=api_token, output_dir=self.output_dir)
+        self.storage = self.fetcher.storage
+        self.store = self.fetcher.store
+        self.listener = self.fetcher.rolling_high
+        self.years = self.listener.years
+        load_rolling_high(self.storage, years=self.years, listener=self.listener)
+
+        now = time.time()
+        self.next_run = {"fetch": now, "merge": now + merge_interval}
+        self.pending = []  # 手動觸發或由其他工作排入的工作
+        self.running = None
+        self.last_runs = {}  # {job: {"started", "duration", "result"}}
+        self.state_path = self.output_dir / STATE_FILENAME
+        self.screened_date = self._load_screened_date()
+        self.started_at = now
+        self._stopping = False
+        self._cond = threading.Condition()
+        self._server = None
+
+    # ---- 工作 ----
+
+    def run_fetch(self):
+        """補齊到今天之前的最後一個交易日，資料為最新時排入新高篩選"""
+        today_str = datetime.now().strftime('%Y-%m-%d')
+        backoff = probe_backoff(self.output_dir, today_str)
+        if backoff:
+            session, remaining = backoff
+            return f"{session} 的資料尚未公布，{remaining / 60:.0f} 分鐘後再探測"
+
+        total_new = self.fetcher.update_latest(today_str)
+        _, _, latest, _ = self.fetcher.get_existing_data_info()
+        if latest:
+            write_fetch_status(
+                self.output_dir, self.storage.manifest_path, latest, self.fetcher.calendar.next_session(latest)
+            )
+        if latest and latest == self.fetcher.calendar.prev_session(today_str) and latest != self.screened_date:
+            self._enqueue("screen")
+        return f"新增 {total_new:,} 筆，最新 {latest}"
+
+    def run_merge(self):
+        """將資料段折疊回主資料（合併不改變資料內容，記憶體狀態不需更新）"""
+        if not self.storage.list_segments():
+            return "沒有資料段"
+        compacted = self.storage.compact(self.fetcher.stock_name_map)
+        return f"已折疊 {compacted} 個資料段"
+
+    def run_screen(self):
+        """以記憶體中的狀態檢查最新交易日創新高的股票並發送通知"""
+        # 與資料同步時直接使用記憶體中的狀態；有其他程式寫入時才補上或重建
+        state = load_rolling_high(self.storage, years=self.years, listener=self.listener)
+        if state.latest_date is None:
+            return "沒有資料"
+
+        new_highs, _, _, active_count = state.evaluate()
+        message = format_new_high_message(new_highs, self.years)
+        send_line_message(message or f"📊 {state.latest_date} 無股票創 {self.years} 年新高")
+        self.screened_date = state.latest_date
+        self._save_screened_date()
+        return f"{state.latest_date}: {len(new_highs)} 支創新高（{active_count} 支有交易）"
+
+    def _run_job(self, job):
+        started = time.time()
+        print(f"\n▶️  [{datetime.now().strftime('%H:%M:%S')}] 執行工作: {job}")
+        try:
+            result = getattr(self, f"run_{job}")()
+            print(f"✓ {job}: {result}")
+        except Exception as e:
+            result = f"錯誤: {e}"
+            print(f"❌ {job} 發生錯誤: {e}")
+            traceback.print_exc()
+            send_line_message(f"❌ 常駐服務工作 {job} 發生錯誤: {e}")
+        with self._cond:
+            self.last_runs[job] = {
+                "started": datetime.fromtimestamp(started).strftime('%Y-%m-%d %H:%M:%S'),
+                "duration": round(time.time() - started, 2),
+                "result": result,
+            }
+
+    def _load_screened_date(self):
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f).get("screened_date")
+        except (OSError, ValueError):
+            return None
+
+    def _save_screened_date(self):
+        """原子性地寫入已篩選的交易日"""
+        tmp_path = self.state_path.with_name(self.state_path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"screened_date": self.screened_date}, f)
+        os.replace(tmp_path, self.state_path)
+
+    # ---- 排程 ----
+
+    def _enqueue(self, job):
+        with self._cond:
+            if job not in self.pending:
+                self.pending.append(job)
+            self._cond.notify()
+
+    def trigger(self, job):
+        """手動觸發工作（排入佇列，依序執行）"""
+        if job not in JOBS:
+            raise ValueError(f"未知的工作: {job}（可用: {', '.join(JOBS)}）")
+        self._enqueue(job)
+
+    def _next_job(self):
+        """等待下一個到期或被觸發的工作；停止時返回 None"""
+        with self._cond:
+            while not self._stopping:
+                if self.pending:
+                    return self.pending.pop(0)
+                now = time.time()
+                job = min(self.next_run, key=self.next_run.get)
+                if self.next_run[job] <= now:
+                    return job
+                self._cond.wait(self.next_run[job] - now)
+            return None
+
+    def run_forever(self):
+        """啟動控制 socket 並執行排程迴圈，直到 stop() 被呼叫"""
+        self._start_server()
+        print(f"✓ 常駐服務已啟動（控制 socket: {self.socket_path}）")
+        try:
+            while True:
+                job = self._next_job()
+                if job is None:
+                    break
+                with self._cond:
+                    if job in self.next_run:
+                        self.next_run[job] = time.time() + self.intervals[job]
+                    self.running = job
+                self._run_job(job)
+                with self._cond:
+                    self.running = None
+        finally:
+            self._stop_server()
+            print("✓ 常駐服務已停止")
+
+    def stop(self):
+        """
+        停止服務（可由 signal handler 呼叫）：執行中的抓取在進行中的請求寫出後結束，
+        未完成的請求留在抓取日誌中，下次啟動時續抓
+        """
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        self.fetcher.request_stop()
+
+    def status(self):
+        """服務狀態摘要"""
+        manifest = self.storage.load_manifest()
+        state = self.listener.state  # 寫入進行中時可能暫時為 None
+        # 排程狀態由排程執行緒修改，在鎖內取得快照
+        with self._cond:
+            running = self.running
+            pending = list(self.pending)
+            next_run = dict(self.next_run)
+            last_runs = {job: dict(run) for job, run in self.last_runs.items()}
+        return {
+            "pid": os.getpid(),
+            "uptime": round(time.time() - self.started_at),
+            "running": running,
+            "pending": pending,
+            "next_run": {
+                job: datetime.fromtimestamp(at).strftime('%Y-%m-%d %H:%M:%S') for job, at in next_run.items()
+            },
+            "last_runs": last_runs,
+            "data": {
+                "min_date": manifest.min_date,
+                "max_date": manifest.max_date,
+                "row_count": manifest.row_count,
+                "segments": len(self.storage.list_segments()),
+            },
+            "state": {
+                "latest_date": state.latest_date if state else None,
+                "synced_version": state.synced_version if state else None,
+                "stocks": len(state.stocks) if state else 0,
+                "screened_date": self.screened_date,
+            },
+            "series_cache": self.store.cache.summary() if self.store.cache else None,
+        }
+
+    # ---- 控制 socket ----
+
+    def handle_command(self, command):
+        """處理一個控制指令，返回回應的 dict"""
+        cmd = command.get("cmd")
+        if cmd == "status":
+            return {"ok": True, "status": self.status()}
+        if cmd == "trigger":
+            self.trigger(command.get("job"))
+            return {"ok": True, "queued": command.get("job")}
+        if cmd == "stop":
+            self.stop()
+            return {"ok": True}
+        if cmd == "series":
+            # 其他程式（補齊缺漏、回補歷史）寫入的資料也要反映在快取中
+            self.store.refresh()
+            arrays = self.store.series(
+                command["stock_id"], columns=command.get("columns") or ["close"],
+                start=command.get("start"), end=command.get("end"),
+            )
+            return {"ok": True, "series": {column: array.tolist() for column, array in arrays.items()}}
+        raise ValueError(f"未知的指令: {cmd}")
+
+    def _start_server(self):
+        if self.socket_path.exists():
+            if _is_listening(self.socket_path):
+                raise RuntimeError(f"已有常駐服務在執行（{self.socket_path}）")
+            self.socket_path.unlink()
+
+        daemon = self
+
+        class _Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    try:
+                        response = daemon.handle_command(json.loads(line))
+                    except Exception as e:
+                        response = {"ok": False, "error": str(e)}
+                    self.wfile.write((json.dumps(response, ensure_ascii=False) + "\n").encode('utf-8'))
+
+        self._server = socketserver.ThreadingUnixStreamServer(str(self.socket_path), _Handler)
+        self._server.daemon_threads = True
+        os.chmod(self.socket_path, 0o600)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def _stop_server(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self.socket_path.exists():
+            self.socket_path.unlink()
+
+
+def _is_listening(socket_path):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(str(socket_path))
+        except OSError:
+            return False
+    return True
+
+
+def send_command(socket_path, cmd, timeout=10, **params):
+    """
+    送出控制指令給執行中的常駐服務
+
+    Returns:
+        dict: 服務的回應
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(str(socket_path))
+        sock.sendall((json.dumps(dict(params, cmd=cmd)) + "\n").encode('utf-8'))
+        with sock.makefile('r', encoding='utf-8') as f:
+            return json.loads(f.readline())
@@ -0,0 +1,114 @@
+"""
+抓取日誌
+記錄每次批次抓取中已完成的請求單位（依股票的日期區間或依日期的全市場請求），
+單位只在其資料已寫成資料段後才標記完成。執行被中斷、逾時或遇到額度錯誤時，
+下次以相同參數重新執行即可跳過已完成的單位，只補抓剩下的部分
+
+本模組只依賴標準函式庫
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+
+
+class JournalRun:
+    """
+    一次批次抓取的紀錄
+
+    Attributes:
+        key: 識別字串（相同任務與參數的執行共用同一筆紀錄）
+        params: 建立時的參數（例如 task, start_date, end_date），供續抓時使用
+        done: 已完成的單位
+    """
+
+    def __init__(self, journal, key, params, done=None, started_at=None):
+        self.journal = journal
+        self.key = key
+        self.params = params
+        self.done = set(done or [])
+        self.started_at = started_at or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    def is_done(self, unit):
+        return unit in self.done
+
+    def mark_done(self, units):
+        """標記單位完成並立即寫入日誌檔"""
+        units = [unit for unit in units if unit not in self.done]
+        if units:
+            with self.journal._lock:
+                self.done.update(units)
+                self.journal._save()
+
+    def finish(self):
+        """整批完成，從日誌移除這筆紀錄"""
+        self.journal._remove(self)
+
+    def to_dict(self):
+        return {
+            "params": self.params,
+            "started_at": self.started_at,
+            "done": sorted(self.done),
+        }
+
+
+class FetchJournal:
+    """批次抓取日誌（JSON 檔，原子性寫入）"""
+
+    FILENAME = "fetch_journal.json"
+    FORMAT_VERSION = 1
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.runs = {}
+        self._load()
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            print(f"⚠️  抓取日誌損毀，將重新記錄: {self.path}")
+            return
+        if data.get("format") != self.FORMAT_VERSION:
+            return
+
+        for key, entry in data.get("runs", {}).items():
+            self.runs[key] = JournalRun(self, key, entry["params"], entry["done"], entry["started_at"])
+
+    def _save(self):
+        """寫入日誌檔（呼叫端需持有鎖）"""
+        data = {
+            "format": self.FORMAT_VERSION,
+            "runs": {key: run.to_dict() for key, run in self.runs.items()},
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, self.path)
+
+    def _remove(self, run):
+        with self._lock:
+            if self.runs.pop(run.key, None) is not None:
+                self._save()
+
+    def open_run(self, key, **params):
+        """取得未完成的紀錄（續抓），不存在時建立新紀錄"""
+        with self._lock:
+            run = self.runs.get(key)
+            if run is None:
+                run = JournalRun(self, key, params)
+                self.runs[key] = run
+                self._save()
+            return run
+
+    def unfinished(self, task):
+        """某任務所有未完成的紀錄（依開始時間排序）"""
+        runs = [run for run in self.runs.values() if run.params.get("task") == task]
+        return sorted(runs, key=lambda run: run.started_at)
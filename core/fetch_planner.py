@@ -0,0 +1,263 @@
+"""
+抓取計畫與成本模型
+FinMind 的 taiwan_stock_daily 有兩種請求方式：
+- 依股票：指定 stock_id 與日期範圍，一次取得單一股票多天的資料
+- 依日期：不指定 stock_id、只給單一日期，一次取得全市場當天的資料
+
+補齊最近幾天時依日期請求只需「天數」次請求，遠少於「股票數」次；
+回補多年歷史時則相反。本模組估算兩種方式的成本並選擇較低者
+
+補齊缺漏時（plan_gap_fill）則依整個「股票 × 交易日」缺失矩陣，
+混合兩種請求方式並在額度預算內排出請求數最少的計畫
+"""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from core.coverage import missing_runs
+
+MODE_AUTO = "auto"
+MODE_BY_DATE = "by_date"
+MODE_BY_STOCK = "by_stock"
+MODES = (MODE_AUTO, MODE_BY_DATE, MODE_BY_STOCK)
+
+# 成本權重：一次請求的固定成本（額度、延遲）以「傳輸幾筆記錄」計
+REQUEST_COST_ROWS = 2000
+# 依日期請求時每天回傳的全市場記錄數估計（含上櫃、ETF 等非目標股票）
+MARKET_ROWS_PER_DATE = 3000
+# 未設定速率上限時，估計每個請求的平均耗時（秒）
+REQUEST_SECONDS = 1.0
+
+
+def candidate_dates(start_date, end_date, calendar=None):
+    """
+    返回範圍內可能有交易的日期（'YYYY-MM-DD'）
+
+    有交易日曆時依日曆排除休市日；否則只排除週末，
+    國定假日依日期請求時該日回應為空即可
+    """
+    if calendar is not None:
+        return calendar.sessions_between(start_date, end_date)
+
+    current = datetime.strptime(start_date, '%Y-%m-%d')
+    end = datetime.strptime(end_date, '%Y-%m-%d')
+    dates = []
+    while current <= end:
+        if current.weekday() < 5:
+            dates.append(current.strftime('%Y-%m-%d'))
+        current += timedelta(days=1)
+    return dates
+
+
+class FetchPlan:
+    """
+    一次抓取的計畫
+
+    Attributes:
+        mode: MODE_BY_DATE 或 MODE_BY_STOCK
+        units: 依日期時為日期列表，依股票時為股票代號列表
+        by_date_cost / by_stock_cost: 兩種方式的估計成本（以記錄數為單位）
+    """
+
+    def __init__(self, mode, units, dates, stock_count, by_date_cost, by_stock_cost):
+        self.mode = mode
+        self.units = units
+        self.dates = dates
+        self.stock_count = stock_count
+        self.by_date_cost = by_date_cost
+        self.by_stock_cost = by_stock_cost
+
+    @property
+    def request_count(self):
+        return len(self.units)
+
+    def describe(self):
+        """簡短說明（供列印）"""
+        label = "依日期（全市場）" if self.mode == MODE_BY_DATE else "依股票"
+        return (
+            f"{label}，{self.request_count} 次請求"
+            f"（依日期 {len(self.dates)} 次 / 依股票 {self.stock_count} 次）"
+        )
+
+
+def estimate_costs(stock_count, date_count,
+                   request_cost=REQUEST_COST_ROWS, market_rows=MARKET_ROWS_PER_DATE):
+    """
+    估計兩種請求方式的成本
+
+    Returns:
+        tuple: (依日期成本, 依股票成本)
+    """
+    by_date = date_count * (request_cost + market_rows)
+    by_stock = stock_count * (request_cost + date_count)
+    return by_date, by_stock
+
+
+def plan_fetch(stock_list, start_date, end_date, mode=MODE_AUTO, calendar=None):
+    """
+    規劃抓取方式
+
+    Args:
+        stock_list: 目標股票代號列表
+        start_date, end_date: 日期範圍（'YYYY-MM-DD'，含首尾）
+        mode: MODE_AUTO 依成本模型選擇，或強制 MODE_BY_DATE / MODE_BY_STOCK
+        calendar: 交易日曆（TradingCalendar），範圍內沒有交易日時不需任何請求
+
+    Returns:
+        FetchPlan
+    """
+    if mode not in MODES:
+        raise ValueError(f"未知的抓取模式: {mode}（可用: {', '.join(MODES)}）")
+
+    dates = candidate_dates(start_date, end_date, calendar)
+    if not dates:
+        return FetchPlan(MODE_BY_DATE if mode == MODE_AUTO else mode, [], [], len(stock_list), 0, 0)
+
+    by_date_cost, by_stock_cost = estimate_costs(len(stock_list), len(dates))
+
+    if mode == MODE_AUTO:
+        mode = MODE_BY_DATE if by_date_cost < by_stock_cost else MODE_BY_STOCK
+
+    units = dates if mode == MODE_BY_DATE else list(stock_list)
+    return FetchPlan(mode, units, dates, len(stock_list), by_date_cost, by_stock_cost)
+
+
+def estimate_seconds(request_count, workers=1, rate_per_second=None):
+    """估計執行 request_count 個請求的時間（有速率上限時以速率為準）"""
+    if rate_per_second:
+        return request_count / rate_per_second
+    return request_count * REQUEST_SECONDS / max(1, workers)
+
+
+class GapFillPlan:
+    """
+    補齊缺漏的請求計畫
+
+    Attributes:
+        requests: [(stock_id, start_date, end_date), ...]，stock_id 為空字串時為全市場單日請求；
+                  依涵蓋的缺失筆數由多到少排序
+        market_dates: 依日期（全市場）請求的日期數
+        stock_requests: 依股票請求的日期區間數
+        missing_cells: 缺失的 (股票, 交易日) 數
+        deferred: 超出額度預算、留待下次執行的請求數
+        cost: 成本模型估計的成本（以記錄數為單位）
+    """
+
+    def __init__(self, requests, market_dates, stock_requests, missing_cells, cost, deferred=0):
+        self.requests = requests
+        self.market_dates = market_dates
+        self.stock_requests = stock_requests
+        self.missing_cells = missing_cells
+        self.cost = cost
+        self.deferred = deferred
+
+    @property
+    def request_count(self):
+        return len(self.requests)
+
+    def describe(self):
+        """簡短說明（供列印）"""
+        text = (
+            f"{self.request_count} 次請求（全市場 {self.market_dates} 天 + 依股票 {self.stock_requests} 個區間），"
+            f"涵蓋 {self.missing_cells:,} 筆缺失"
+        )
+        if self.deferred:
+            text += f"；超出額度預算 {self.deferred} 次請求，留待下次執行"
+        return text
+
+
+def _stock_ranges(missing, columns, request_cost):
+    """
+    依股票的請求區間
+
+    缺失區段之間相隔的交易日數不超過 request_cost 時合併成同一個請求
+    （多傳幾筆已有的記錄比多一次請求便宜）；columns 為各欄在完整交易日序列中的位置，
+    已改以全市場請求的日期不在 missing 中，兩側的區段可以跨過它合併
+
+    Returns:
+        tuple: (列索引, 起始位置, 結束位置, 涵蓋的缺失筆數) 四個陣列
+    """
+    rows, starts, ends = missing_runs(missing)
+    if len(rows) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty, empty
+
+    run_cells = ends - starts + 1
+    starts, ends = columns[starts], columns[ends]
+    new_group = np.ones(len(rows), dtype=bool)
+    new_group[1:] = (rows[1:] != rows[:-1]) | (starts[1:] - ends[:-1] - 1 > request_cost)
+    first = np.flatnonzero(new_group)
+    last = np.append(first[1:], len(rows)) - 1
+    cells = np.add.reduceat(run_cells, first)
+    return rows[first], starts[first], ends[last], cells
+
+
+def plan_gap_fill(missing, stock_ids, sessions, budget=None, mode=MODE_AUTO,
+                  request_cost=REQUEST_COST_ROWS, market_rows=MARKET_ROWS_PER_DATE):
+    """
+    規劃補齊缺漏的請求
+
+    缺失股票數達到門檻的日期改用一次全市場請求，其餘以依股票的日期區間補齊；
+    對一組門檻（1, 2, 4, ... 支股票）估算總成本，選出成本最低的計畫。
+    指定 budget 時優先選擇請求數在預算內的計畫；仍超出預算時選請求數最少者，
+    並只保留涵蓋缺失最多的 budget 個請求
+
+    mode 為 MODE_BY_STOCK 時只使用依股票的請求（帳號不支援全市場查詢），
+    MODE_BY_DATE 時有缺失的日期一律使用全市場請求
+
+    Args:
+        missing: (股票數, 交易日數) 的 bool 缺失矩陣
+        stock_ids: 各列的股票代號
+        sessions: 各欄的交易日（連續的交易日序列，'YYYY-MM-DD'）
+        budget: 本次最多可用的請求數（None 表示不限）
+        mode: 'auto' / 'by_date' / 'by_stock'
+
+    Returns:
+        GapFillPlan
+    """
+    missing = np.asarray(missing, dtype=bool)
+    missing_cells = int(missing.sum())
+    if missing_cells == 0:
+        return GapFillPlan([], 0, 0, 0, 0)
+
+    per_date = missing.sum(axis=0)
+    if mode == MODE_BY_STOCK:
+        thresholds = [int(per_date.max()) + 1]  # 門檻超過最大缺失數，沒有全市場請求
+    elif mode == MODE_BY_DATE:
+        thresholds = [1]
+    else:
+        thresholds = [1 << k for k in range(int(per_date.max()).bit_length())] + [int(per_date.max()) + 1]
+
+    best = None
+    for threshold in thresholds:
+        market = per_date >= threshold
+        columns = np.flatnonzero(~market)
+        ranges = _stock_ranges(missing[:, columns], columns, request_cost)
+        rows, starts, ends, _ = ranges
+        request_count = int(market.sum()) + len(rows)
+        cost = int(market.sum()) * (request_cost + market_rows) + int((request_cost + ends - starts + 1).sum())
+        within_budget = budget is None or request_count <= budget
+        key = (not within_budget, cost if within_budget else request_count)
+        if best is None or key < best[0]:
+            best = (key, market, ranges, cost)
+
+    _, market, (rows, starts, ends, cells), cost = best
+    market_dates = np.flatnonzero(market)
+
+    # 依涵蓋的缺失筆數排序，超出預算時先補缺最多的部分
+    requests = [(("", sessions[col], sessions[col]), int(per_date[col])) for col in market_dates]
+    requests += [
+        ((stock_ids[row], sessions[start], sessions[end]), int(count))
+        for row, start, end, count in zip(rows, starts, ends, cells)
+    ]
+    requests.sort(key=lambda item: -item[1])
+    requests = [request for request, _ in requests]
+
+    deferred = 0
+    if budget is not None and len(requests) > budget:
+        deferred = len(requests) - budget
+        requests = requests[:budget]
+
+    stock_requests = sum(1 for stock_id, _, _ in requests if stock_id)
+    return GapFillPlan(requests, len(requests) - stock_requests, stock_requests, missing_cells, cost, deferred)
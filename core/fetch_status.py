@@ -0,0 +1,144 @@
+"""
+每日抓取狀態
+每次完整執行 fetch_latest_stock_prices.py 後記錄最新資料日期與其後的下一個交易日，
+排程觸發時先讀這個小檔案：今天還沒超過下一個交易日（資料仍是最新）、沒有未完成的
+抓取紀錄，且資料集清單自記錄後未被改動時，不必載入 pandas、FinMind 或讀取資料即可結束
+
+最新交易日的資料尚未公布時，探測結果記錄在 publication_probe.json，
+依 PROBE_BACKOFF_MINUTES 逐步拉長下次探測的間隔，期間的排程觸發同樣直接結束
+
+本模組只依賴標準函式庫
+"""
+
+import json
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+
+from core.fetch_journal import FetchJournal
+
+FILENAME = "fetch_status.json"
+PROBE_FILENAME = "publication_probe.json"
+FORMAT_VERSION = 1
+
+# 資料尚未公布時，第 n 次探測失敗後等待的分鐘數（超過列表長度時沿用最後一個）
+PROBE_BACKOFF_MINUTES = [30, 60, 120, 240]
+
+
+def write_fetch_status(output_dir, manifest_path, latest_date, next_session):
+    """
+    記錄完整執行後的狀態
+
+    Args:
+        manifest_path: 資料集清單檔案（以其修改時間判斷資料是否被其他程式改動）
+        latest_date: 最新資料日期
+        next_session: latest_date 之後的下一個交易日
+    """
+    manifest_path = Path(manifest_path)
+    data = {
+        "format": FORMAT_VERSION,
+        "latest_date": latest_date,
+        "next_session": next_session,
+        "manifest_path": str(manifest_path),
+        "manifest_mtime_ns": manifest_path.stat().st_mtime_ns if manifest_path.exists() else None,
+        "updated_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+    }
+    _write_json(Path(output_dir) / FILENAME, data)
+
+
+def check_up_to_date(output_dir, today=None, task='latest'):
+    """
+    快速判斷是否不需執行
+
+    Returns:
+        str 或 None: 資料已是最新時返回最新資料日期，否則（需要完整執行）返回 None
+    """
+    path = Path(output_dir) / FILENAME
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            status = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if status.get("format") != FORMAT_VERSION or not status.get("next_session"):
+        return None
+
+    today = today or datetime.now().strftime('%Y-%m-%d')
+    if status["next_session"] < today:
+        return None
+
+    try:
+        mtime_ns = Path(status["manifest_path"]).stat().st_mtime_ns
+    except OSError:
+        return None
+    if mtime_ns != status["manifest_mtime_ns"]:
+        return None
+
+    if _has_unfinished(output_dir, task):
+        return None
+    return status["latest_date"]
+
+
+def _has_unfinished(output_dir, task):
+    return bool(FetchJournal(Path(output_dir) / FetchJournal.FILENAME).unfinished(task))
+
+
+def _write_json(path, data):
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def record_probe(output_dir, session, published, today=None):
+    """
+    記錄某交易日資料是否已公布的探測結果
+
+    Returns:
+        int 或 None: 尚未公布時返回下次探測前等待的分鐘數；已公布時返回 None
+    """
+    path = Path(output_dir) / PROBE_FILENAME
+    if published:
+        if path.exists():
+            path.unlink()
+        return None
+
+    today = today or datetime.now().strftime('%Y-%m-%d')
+    attempts = 0
+    probe = _read_probe(path)
+    if probe is not None and probe["session"] == session and probe["date"] == today:
+        attempts = probe["attempts"]
+
+    wait_minutes = PROBE_BACKOFF_MINUTES[min(attempts, len(PROBE_BACKOFF_MINUTES) - 1)]
+    _write_json(path, {
+        "format": FORMAT_VERSION,
+        "session": session,
+        "date": today,
+        "attempts": attempts + 1,
+        "next_probe_at": time.time() + wait_minutes * 60,
+    })
+    return wait_minutes
+
+
+def _read_probe(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            probe = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return probe if probe.get("format") == FORMAT_VERSION else None
+
+
+def probe_backoff(output_dir, today=None, task='latest'):
+    """
+    今天是否仍在探測退避期間（有未完成的抓取紀錄時不退避，以便續抓）
+
+    Returns:
+        tuple 或 None: 退避中時返回 (交易日, 剩餘秒數)，否則返回 None
+    """
+    probe = _read_probe(Path(output_dir) / PROBE_FILENAME)
+    today = today or datetime.now().strftime('%Y-%m-%d')
+    if probe is None or probe["date"] != today or _has_unfinished(output_dir, task):
+        return None
+    remaining = probe["next_probe_at"] - time.time()
+    return (probe["session"], remaining) if remaining > 0 else None
@@ -0,0 +1,155 @@
+"""
+股票代號字典（instrument dictionary）
+為每支股票指派固定的整數代碼（0, 1, 2, ...，只增不改），資料檔只需儲存
+int32 代碼，不必每筆記錄重複儲存股票代號與中文名稱：
+- 代碼 ↔ (stock_id, stock_name) 對應存放在 data/instruments.json
+- 第一次建立時依 stock_list.json 的順序指派代碼，之後出現的新股票依序追加
+- 名稱以最近一次寫入的非空名稱為準
+
+解碼時產生 pandas 類別型（categorical）欄位：每筆記錄只佔一個整數代碼，
+類別（股票代號）依字典序排列，排序結果與字串相同
+"""
+
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+class InstrumentDictionary:
+    """
+    股票代號字典
+
+    - stock_ids[code]: 代碼對應的股票代號
+    - names[code]: 代碼對應的股票名稱
+    - codes: {stock_id: code}
+    """
+
+    FILENAME = "instruments.json"
+    FORMAT_VERSION = 1
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.stock_ids = []
+        self.names = []
+        self.codes = {}
+        self.modified = False
+        self._decoders = None
+
+    # ---- 持久化 ----
+
+    @classmethod
+    def load(cls, path):
+        """載入字典，不存在或格式不符時返回 None"""
+        path = Path(path)
+        if not path.exists():
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get("format") != cls.FORMAT_VERSION:
+            return None
+
+        instruments = cls(path)
+        for stock_id, name in data["instruments"]:
+            instruments._add(stock_id, name)
+        instruments.modified = False
+        return instruments
+
+    def save(self):
+        """原子性地寫入字典（只在有變更時）"""
+        if not self.modified:
+            return
+        data = {
+            "format": self.FORMAT_VERSION,
+            "instruments": [[stock_id, name] for stock_id, name in zip(self.stock_ids, self.names)],
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, self.path)
+        self.modified = False
+
+    # ---- 更新 ----
+
+    def __len__(self):
+        return len(self.stock_ids)
+
+    def _add(self, stock_id, name=''):
+        self.codes[stock_id] = len(self.stock_ids)
+        self.stock_ids.append(stock_id)
+        self.names.append(name or '')
+        self.modified = True
+        self._decoders = None
+
+    def update_names(self, stock_ids, names):
+        """以非空的名稱更新字典（新股票同時指派代碼）"""
+        for stock_id, name in zip(stock_ids, names):
+            stock_id = str(stock_id)
+            if stock_id not in self.codes:
+                self._add(stock_id, name if isinstance(name, str) else '')
+            elif isinstance(name, str) and name and self.names[self.codes[stock_id]] != name:
+                self.names[self.codes[stock_id]] = name
+                self.modified = True
+                self._decoders = None
+
+    def encode(self, stock_ids):
+        """
+        股票代號轉為 int32 代碼（新股票依序指派代碼）
+
+        Args:
+            stock_ids: 股票代號的 Series（可為類別型）
+        """
+        stock_ids = pd.Series(stock_ids)
+        uniques = pd.unique(stock_ids.astype(str))
+        for stock_id in uniques:
+            if stock_id not in self.codes:
+                self._add(stock_id)
+        return stock_ids.astype(str).map(self.codes).to_numpy(dtype=np.int32)
+
+    # ---- 解碼 ----
+
+    def _build_decoders(self):
+        """建立 代碼 → 類別代碼 的對應陣列（股票代號依字典序、名稱去重）"""
+        if self._decoders is None:
+            ids = np.array(self.stock_ids, dtype=object)
+            order = np.argsort(ids.astype(str), kind='stable')
+            id_rank = np.empty(len(ids), dtype=np.int32)
+            id_rank[order] = np.arange(len(ids), dtype=np.int32)
+            name_codes, name_uniques = pd.factorize(pd.Series(self.names, dtype=object))
+            self._decoders = (id_rank, ids[order], name_codes.astype(np.int32), name_uniques)
+        return self._decoders
+
+    def decode_ids(self, codes):
+        """int 代碼陣列轉為股票代號的類別型陣列"""
+        id_rank, categories, _, _ = self._build_decoders()
+        return pd.Categorical.from_codes(id_rank[codes], categories=categories)
+
+    def decode_names(self, codes):
+        """int 代碼陣列轉為股票名稱的類別型陣列"""
+        _, _, name_codes, name_uniques = self._build_decoders()
+        return pd.Categorical.from_codes(name_codes[codes], categories=name_uniques)
+
+
+def load_instruments(output_dir):
+    """載入股票代號字典；不存在時依 stock_list.json 建立"""
+    path = Path(output_dir) / InstrumentDictionary.FILENAME
+    instruments = InstrumentDictionary.load(path)
+    if instruments is not None:
+        return instruments
+
+    instruments = InstrumentDictionary(path)
+    stock_list_path = Path(output_dir) / "stock_list.json"
+    if stock_list_path.exists():
+        try:
+            with open(stock_list_path, 'r', encoding='utf-8') as f:
+                stocks = json.load(f).get('stocks', [])
+            instruments.update_names([s['stock_id'] for s in stocks], [s.get('stock_name', '') for s in stocks])
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️  讀取股票列表失敗: {e}")
+    return instruments
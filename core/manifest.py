@@ -0,0 +1,225 @@
+"""
+資料集清單（manifest）
+以 JSON 檔記錄資料集摘要，由儲存後端的寫入路徑原子性地更新：
+- 全域最早/最晚日期、總記錄數
+- 每支股票的首筆/末筆日期與記錄數
+- 每個資料檔的雜湊與整體內容校驗碼
+
+狀態查詢只需讀取這個小檔案，不必解析整個資料集
+本模組只依賴標準函式庫，可在不載入 pandas 的情況下使用
+"""
+
+import hashlib
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    """計算檔案的 SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DatasetManifest:
+    """資料集清單"""
+
+    FORMAT_VERSION = 1
+    WRITE_LOG_SIZE = 256  # 保留最近幾次寫入的日期範圍
+
+    def __init__(self, path, data=None):
+        self.path = Path(path)
+        self.data = data or {
+            "format": self.FORMAT_VERSION,
+            "version": 0,
+            "updated_at": None,
+            "min_date": None,
+            "max_date": None,
+            "row_count": 0,
+            "stocks": {},
+            "files": {},
+            "checksum": None,
+            "writes": [],
+        }
+
+    @classmethod
+    def load(cls, path):
+        """載入清單，不存在或格式不符時返回 None"""
+        path = Path(path)
+        if not path.exists():
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get("format") != cls.FORMAT_VERSION:
+            return None
+        return cls(path, data)
+
+    def save(self):
+        """原子性地寫入清單（先寫暫存檔再改名）"""
+        self.data["updated_at"] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, self.path)
+
+    # ---- 摘要 ----
+
+    @property
+    def version(self):
+        """寫入版本號，每次寫入後遞增"""
+        return self.data["version"]
+
+    @property
+    def min_date(self):
+        return self.data["min_date"]
+
+    @property
+    def max_date(self):
+        return self.data["max_date"]
+
+    @property
+    def row_count(self):
+        return self.data["row_count"]
+
+    @property
+    def stocks(self):
+        """{stock_id: {"first": 'YYYY-MM-DD', "last": 'YYYY-MM-DD', "count": n}}"""
+        return self.data["stocks"]
+
+    @property
+    def checksum(self):
+        return self.data["checksum"]
+
+    def writes_since(self, version):
+        """
+        返回版本號大於 version 的寫入紀錄 [{"version", "min_date", "max_date"}, ...]
+
+        紀錄已被截斷（無法確定中間的寫入）時返回 None
+        """
+        writes = [w for w in self.data.get("writes", []) if w["version"] > version]
+        if len(writes) != self.version - version:
+            return None
+        return writes
+
+    @property
+    def is_empty(self):
+        return self.data["row_count"] == 0
+
+    # ---- 檔案追蹤 ----
+
+    @staticmethod
+    def _file_entry(path):
+        stat = path.stat()
+        return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": file_sha256(path)}
+
+    def set_files(self, root, paths):
+        """更新（新增或重寫過的）資料檔雜湊；root 為相對路徑的基準目錄"""
+        for path in paths:
+            self.data["files"][Path(path).relative_to(root).as_posix()] = self._file_entry(Path(path))
+        self._update_checksum()
+
+    def remove_files(self, root, paths):
+        """移除已刪除的資料檔"""
+        for path in paths:
+            self.data["files"].pop(Path(path).relative_to(root).as_posix(), None)
+        self._update_checksum()
+
+    def _update_checksum(self):
+        digest = hashlib.sha256()
+        for name in sorted(self.data["files"]):
+            digest.update(f"{name}:{self.data['files'][name]['sha256']}\n".encode('utf-8'))
+        self.data["checksum"] = digest.hexdigest()
+
+    def matches_files(self, root, paths):
+        """以檔名、大小與修改時間快速確認清單是否與磁碟上的資料檔一致"""
+        current = {}
+        for path in paths:
+            stat = Path(path).stat()
+            current[Path(path).relative_to(root).as_posix()] = (stat.st_size, stat.st_mtime_ns)
+        recorded = {
+            name: (entry["size"], entry["mtime_ns"])
+            for name, entry in self.data["files"].items()
+        }
+        return current == recorded
+
+    def verify(self, root):
+        """重新計算所有資料檔雜湊，確認內容未被更動"""
+        for name, entry in self.data["files"].items():
+            path = Path(root) / name
+            if not path.exists() or file_sha256(path) != entry["sha256"]:
+                return False
+        return True
+
+    # ---- 統計更新 ----
+
+    def _refresh_totals(self):
+        stocks = self.data["stocks"]
+        self.data["row_count"] = sum(s["count"] for s in stocks.values())
+        self.data["min_date"] = min((s["first"] for s in stocks.values()), default=None)
+        self.data["max_date"] = max((s["last"] for s in stocks.values()), default=None)
+
+    def rebuild_stats(self, keys_df):
+        """由完整的 (date, stock_id) 資料重建統計"""
+        self.data["stocks"] = {}
+        if not keys_df.empty:
+            stats = keys_df.groupby('stock_id', observed=True)['date'].agg(['min', 'max', 'count'])
+            for stock_id, first, last, count in stats.itertuples():
+                self.data["stocks"][str(stock_id)] = {"first": first, "last": last, "count": int(count)}
+        self._refresh_totals()
+
+    def new_key_candidates(self, batch_df):
+        """
+        找出可能已存在的記錄（日期落在該股票既有的首末日期之間）
+
+        落在範圍外的記錄必定是新記錄，不需讀取既有資料即可計數
+        """
+        stocks = self.data["stocks"]
+        # 轉為字串再對應（類別型的 stock_id 對應後仍為類別型，fillna 無法填入新值）
+        stock_ids = batch_df['stock_id'].astype(str)
+        first = stock_ids.map(lambda sid: stocks.get(sid, {}).get("first"))
+        last = stock_ids.map(lambda sid: stocks.get(sid, {}).get("last"))
+        inside = first.notna() & (batch_df['date'] >= first.fillna('')) & (batch_df['date'] <= last.fillna(''))
+        return batch_df[inside]
+
+    def apply_batch(self, batch_df, existing_keys=None):
+        """
+        以新寫入的一批資料更新統計
+
+        Args:
+            batch_df: 已去重的新資料（至少含 date, stock_id）
+            existing_keys: 與新資料重疊範圍內的既有 (date, stock_id)，用於排除覆寫的記錄
+        """
+        is_new = None
+        if existing_keys is not None and not existing_keys.empty:
+            known = set(zip(existing_keys['date'], existing_keys['stock_id']))
+            is_new = [key not in known for key in zip(batch_df['date'], batch_df['stock_id'])]
+
+        stats = batch_df.groupby('stock_id', observed=True)['date'].agg(['min', 'max'])
+        counts = (batch_df[is_new] if is_new is not None else batch_df).groupby('stock_id', observed=True).size()
+
+        stocks = self.data["stocks"]
+        for stock_id, first, last in stats.itertuples():
+            stock_id = str(stock_id)
+            entry = stocks.setdefault(stock_id, {"first": first, "last": last, "count": 0})
+            entry["first"] = min(entry["first"], first)
+            entry["last"] = max(entry["last"], last)
+            entry["count"] += int(counts.get(stock_id, 0))
+
+        self._refresh_totals()
+        self.data["version"] += 1
+
+        writes = self.data.setdefault("writes", [])
+        writes.append({
+            "version": self.data["version"],
+            "min_date": stats['min'].min(),
+            "max_date": stats['max'].max(),
+        })
+        del writes[:-self.WRITE_LOG_SIZE]
@@ -0,0 +1,104 @@
+"""
+查無資料快取（negative cache）
+暫停交易、尚未上市或已下市的股票每次請求都回傳空結果。本模組記錄每支股票
+確認無資料的日期區間，在有效期限內略過落在區間內的請求：
+- 結束日期在近期的區間視為「自起始日起持續無資料」（暫停交易、下市），
+  之後日期的請求也會略過；較早的歷史區間只略過區間內的請求
+- 同一支股票連續查無資料時有效期限加倍（ESCALATION），最長 MAX_TTL
+- 股票一旦取得資料即移除紀錄
+
+只在同一批次有其他股票取得資料時才記錄，避免把休市日或資料尚未公布誤判為查無資料
+
+本模組只依賴標準函式庫
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+
+class NegativeCache:
+    """
+    查無資料紀錄（JSON 檔，原子性寫入）
+
+    entries: {stock_id: {"from": 起始日, "to": 結束日或 None（持續無資料）,
+                         "strikes": 連續查無資料次數, "until": 有效期限（UNIX 時間）}}
+    """
+
+    FILENAME = "negative_cache.json"
+    FORMAT_VERSION = 1
+    BASE_TTL = 12 * 3600  # 第一次查無資料的有效秒數
+    ESCALATION = 2  # 每次再查無資料時有效期限的倍數
+    MAX_TTL = 7 * 24 * 3600
+    OPEN_ENDED_DAYS = 2  # 結束日期距今幾天內視為持續無資料
+    ADJACENT_DAYS = 7  # 與既有區間相隔幾天內視為相連（跨過週末與連假）
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.entries = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("format") == self.FORMAT_VERSION:
+            self.entries = data.get("entries", {})
+
+    def save(self):
+        """寫入紀錄檔（同時移除已過期的項目）"""
+        with self._lock:
+            now = time.time()
+            self.entries = {
+                stock_id: entry for stock_id, entry in self.entries.items() if entry["until"] > now
+            }
+            data = {"format": self.FORMAT_VERSION, "entries": self.entries}
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_name(self.path.name + '.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, separators=(',', ':'))
+            os.replace(tmp_path, self.path)
+
+    def should_skip(self, stock_id, start_date, end_date):
+        """請求的日期區間是否落在有效的查無資料區間內"""
+        entry = self.entries.get(stock_id)
+        if entry is None or entry["until"] <= time.time():
+            return False
+        return start_date >= entry["from"] and (entry["to"] is None or end_date <= entry["to"])
+
+    def record_empty(self, stock_id, start_date, end_date):
+        """記錄查無資料的區間，與既有區間相連或重疊時合併並延長有效期限"""
+        open_after = (datetime.now() - timedelta(days=self.OPEN_ENDED_DAYS)).strftime('%Y-%m-%d')
+        end = None if end_date >= open_after else end_date
+
+        with self._lock:
+            entry = self.entries.get(stock_id)
+            strikes = 1
+            if entry is not None \
+                    and (entry["to"] is None or entry["to"] >= _shift(start_date, -self.ADJACENT_DAYS)) \
+                    and (end is None or end >= _shift(entry["from"], -self.ADJACENT_DAYS)):
+                strikes = entry["strikes"] + 1
+                start_date = min(start_date, entry["from"])
+                end = None if end is None or entry["to"] is None else max(end, entry["to"])
+
+            ttl = min(self.MAX_TTL, self.BASE_TTL * self.ESCALATION ** (strikes - 1))
+            self.entries[stock_id] = {
+                "from": start_date, "to": end, "strikes": strikes, "until": time.time() + ttl
+            }
+
+    def clear(self, stock_id):
+        """股票取得資料，移除紀錄"""
+        with self._lock:
+            self.entries.pop(stock_id, None)
+
+
+def _shift(date_str, days):
+    return (datetime.strptime(date_str, '%Y-%m-%d') + timedelta(days=days)).strftime('%Y-%m-%d')
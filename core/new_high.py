@@ -0,0 +1,116 @@
+"""
+新高檢查引擎
+以單次分組/排序的向量化運算，找出最新交易日創 N 年新高的股票
+"""
+
+from datetime import timedelta
+
+import pandas as pd
+
+
+def find_new_highs(df, years=3):
+    """
+    計算所有股票的最新 high、過去 N 年（不含最新日期）最高價與前高日期
+
+    Args:
+        df: 股票資料 DataFrame（至少含 date, stock_id, stock_name, high）
+        years: 檢查幾年內的新高（預設 3 年）
+
+    Returns:
+        tuple: (創新高的股票資訊列表, 最新日期, 比對起始日期, 最新日期有交易的股票數)
+    """
+    dates = pd.to_datetime(df['date'])
+    latest_date = dates.max()
+    start_date = latest_date - timedelta(days=years * 365)
+
+    in_window = (dates >= start_date).to_numpy()
+    is_latest = (dates == latest_date).to_numpy()
+
+    frame = pd.DataFrame({
+        'stock_id': df['stock_id'].to_numpy(),
+        'date': dates.to_numpy(),
+        'high': df['high'].to_numpy(),
+    })
+
+    # 【比對點1】各股票最新日期的第一筆記錄
+    latest = df.loc[in_window & is_latest, ['stock_id', 'stock_name', 'high']]
+    latest = latest.drop_duplicates('stock_id', keep='first')
+    active_count = len(latest)
+
+    # 【比對點2】過去 N 年的最高價（不含最新日期）
+    history = frame[in_window & ~is_latest]
+    historical_max = history.groupby('stock_id', sort=False)['high'].max()
+
+    latest_high = latest['high'].to_numpy()
+    previous_high = historical_max.reindex(latest['stock_id'].to_numpy()).to_numpy()
+    broke_out = latest_high > previous_high  # 無歷史資料（NaN）時為 False
+    winners = latest[broke_out]
+    previous_high = previous_high[broke_out]
+
+    if winners.empty:
+        return [], latest_date, start_date, active_count
+
+    # 前高日期：等於前高價的最後一個日期
+    at_max = history[history['high'].to_numpy() == history['stock_id'].map(historical_max).to_numpy()]
+    previous_high_date = at_max.groupby('stock_id', sort=False)['date'].max()
+
+    new_highs = []
+    for (stock_id, stock_name, high), prev_high in zip(winners.itertuples(index=False), previous_high):
+        new_highs.append({
+            'stock_id': stock_id,
+            'stock_name': stock_name,
+            'date': latest_date.date(),
+            'latest_high': high,
+            'previous_high': prev_high,
+            'previous_high_date': previous_high_date[stock_id].date(),
+            'increase': high - prev_high,
+            'increase_pct': ((high - prev_high) / prev_high) * 100
+        })
+
+    return new_highs, latest_date, start_date, active_count
+
+
+def check_new_highs(df, years=3):
+    """
+    檢查哪些股票創下近期新高
+
+    Args:
+        df: 股票資料 DataFrame
+        years: 檢查幾年內的新高（預設 3 年）
+
+    Returns:
+        list: 創新高的股票資訊列表
+    """
+    if df is None or df.empty:
+        return []
+
+    new_highs, latest_date, start_date, active_count = find_new_highs(df, years=years)
+    print_check_header(latest_date, start_date, active_count, years)
+
+    return new_highs
+
+
+def format_new_high_message(new_highs, years=3):
+    """格式化新高通知訊息（依股票代號排序）；沒有新高時返回 None"""
+    if not new_highs:
+        return None
+
+    message_lines = [
+        f"🚀 創 {years} 年新高通知",
+        f"📅 {new_highs[0]['date']} (共 {len(new_highs)} 支)",
+        ""
+    ]
+    for stock in sorted(new_highs, key=lambda x: x['stock_id']):
+        message_lines.append(
+            f"{stock['stock_id']} ({stock['stock_name']}): "
+            f"新高 ${stock['latest_high']:.2f} | "
+            f"前高 ${stock['previous_high']:.2f} ({stock['previous_high_date']})"
+        )
+    return "\n".join(message_lines)
+
+
+def print_check_header(latest_date, start_date, active_count, years=3):
+    """列印新高檢查的日期範圍與股票數"""
+    print(f"🔍 最新日期: {latest_date.date()}")
+    print(f"📊 比對範圍: {start_date.date()} ~ {(latest_date - timedelta(days=1)).date()} (過去 {years} 年)")
+    print(f"💼 最新日期有交易的股票數: {active_count} 支\n")
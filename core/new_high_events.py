@@ -0,0 +1,204 @@
+"""
+歷史新高事件表
+記錄每個 (股票, 交易日) 的 high 超過前 N 年（不含當日）最高價的事件，
+以及被突破的前高與其日期，供研究回測使用：
+- 以區間極值索引（core.range_index）一次計算整段歷史：每個交易日的比對視窗
+  依長度分組後向量化查表，每個視窗長度只需一次處理，不必逐日執行新高檢查
+- 結果存為 data/new_high_events.csv（window, date, stock_id, high, previous_high,
+  previous_high_date），狀態存於 data/new_high_events.json
+- 依資料集清單的寫入紀錄增量更新：只重新計算最早被寫入的交易日之後的事件
+  （新交易日的寫入即只計算新的交易日）；紀錄不足時重新計算全部
+"""
+
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from core.range_index import WINDOWS, load_range_index
+
+EVENT_COLUMNS = ['window', 'date', 'stock_id', 'high', 'previous_high', 'previous_high_date']
+EVENT_DTYPES = {'window': 'category', 'stock_id': 'category'}
+
+# 一次計算的交易日數（限制暫存陣列大小）
+CHUNK_ROWS = 256
+
+
+class NewHighEventTable:
+    """
+    新高事件表
+
+    - events: EVENT_COLUMNS 的 DataFrame，依 (window, date, stock_id) 排序
+    - windows: 記錄的視窗（core.range_index.WINDOWS 的鍵）
+    """
+
+    FILENAME = "new_high_events.csv"
+    META_FILENAME = "new_high_events.json"
+    FORMAT_VERSION = 1
+
+    def __init__(self, output_dir, windows=('3y',)):
+        self.output_dir = Path(output_dir)
+        self.windows = list(windows)
+        self.events = pd.DataFrame(columns=EVENT_COLUMNS)
+        self.synced_version = None
+
+    @property
+    def path(self):
+        return self.output_dir / self.FILENAME
+
+    @property
+    def meta_path(self):
+        return self.output_dir / self.META_FILENAME
+
+    # ---- 持久化 ----
+
+    @classmethod
+    def load(cls, output_dir):
+        """載入事件表，不存在或格式不符時返回 None"""
+        output_dir = Path(output_dir)
+        try:
+            with open(output_dir / cls.META_FILENAME, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get("format") != cls.FORMAT_VERSION:
+            return None
+
+        table = cls(output_dir, meta["windows"])
+        table.synced_version = meta["synced_version"]
+        try:
+            table.events = pd.read_csv(
+                table.path, dtype=dict(EVENT_DTYPES, date=str, previous_high_date=str)
+            )
+        except (OSError, ValueError):
+            return None
+        return table
+
+    def save(self):
+        """原子性地寫入事件表，meta 最後寫入"""
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        self.events.to_csv(tmp_path, index=False, encoding='utf-8')
+        os.replace(tmp_path, self.path)
+
+        meta = {"format": self.FORMAT_VERSION, "synced_version": self.synced_version, "windows": self.windows}
+        tmp_path = self.meta_path.with_name(self.meta_path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self.meta_path)
+
+    # ---- 計算 ----
+
+    def recompute(self, panel, index, from_date=None):
+        """
+        重新計算 from_date（含）之後的事件（None 表示全部），保留更早的事件
+
+        Returns:
+            int: 新計算出的事件數
+        """
+        first_row = panel.row_range(from_date).start if from_date else 0
+        frames = []
+        for window in self.windows:
+            for start in range(first_row, len(panel.dates), CHUNK_ROWS):
+                rows = np.arange(start, min(start + CHUNK_ROWS, len(panel.dates)))
+                frames.append(find_new_high_events(panel, index, rows, window))
+        new_events = _concat(frames)
+
+        kept = self.events.iloc[0:0]
+        if from_date:
+            kept = self.events[self.events['date'] < from_date].astype({'window': str, 'stock_id': str})
+        events = _concat([kept, new_events])
+        self.events = events.sort_values(['window', 'date', 'stock_id'], ignore_index=True) \
+            .astype(EVENT_DTYPES)[EVENT_COLUMNS]
+        return len(new_events)
+
+
+def _concat(frames):
+    """合併事件（略過空的 DataFrame）"""
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return pd.DataFrame(columns=EVENT_COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+
+def find_new_high_events(panel, index, rows, window='3y'):
+    """
+    指定交易日（面板的列）上所有創 N 年新高的 (股票, 交易日)
+
+    每一列的比對範圍為該交易日往前 N 年（含）到前一個交易日，與 core.new_high.find_new_highs 相同
+
+    Returns:
+        DataFrame: EVENT_COLUMNS 的事件（未排序）
+    """
+    days = WINDOWS[window]
+    dates = np.asarray(panel.dates, dtype='datetime64[D]')
+    rows = np.asarray(rows, dtype=np.int64)
+    if days is None:
+        firsts = np.zeros(len(rows), dtype=np.int64)
+    else:
+        firsts = np.searchsorted(dates, dates[rows] - np.timedelta64(days, 'D'), side='left')
+
+    # 沒有更早交易日的列不會有事件
+    has_history = firsts < rows
+    rows, firsts = rows[has_history], firsts[has_history]
+    if not len(rows):
+        return pd.DataFrame(columns=EVENT_COLUMNS)
+
+    n_cols = len(panel.stock_ids)
+    previous, previous_rows = index.extremes_many(panel, 'high', firsts, rows - 1)
+    present = np.asarray(panel.arrays['present'][rows, :n_cols])
+    current = np.asarray(panel.arrays['high'][rows, :n_cols])
+    with np.errstate(invalid='ignore'):
+        broke_out = present & np.isfinite(previous) & (current > previous)
+
+    event_rows, event_cols = np.nonzero(broke_out)
+    stock_ids = np.asarray(panel.stock_ids, dtype=object)
+    panel_dates = np.asarray(panel.dates, dtype=object)
+    return pd.DataFrame({
+        'window': window,
+        'date': panel_dates[rows[event_rows]],
+        'stock_id': stock_ids[event_cols],
+        'high': current[event_rows, event_cols],
+        'previous_high': previous[event_rows, event_cols],
+        'previous_high_date': panel_dates[previous_rows[event_rows, event_cols]],
+    }, columns=EVENT_COLUMNS)
+
+
+def update_new_high_events(storage, windows=('3y',), rebuild=False):
+    """
+    取得與資料同步的新高事件表
+
+    事件表版本一致時直接使用；只落後幾次有紀錄的寫入時，從這些寫入中最早的日期起重新計算；
+    其他情況（不存在、視窗不同、紀錄不足）重新計算全部
+
+    Returns:
+        NewHighEventTable
+    """
+    windows = list(windows)
+    manifest = storage.load_manifest()
+    table = None if rebuild else NewHighEventTable.load(storage.output_dir)
+    if table is not None and table.windows == windows and table.synced_version == manifest.version:
+        return table
+
+    panel, index = load_range_index(storage)
+    from_date = None
+    if table is not None and table.windows == windows and table.synced_version is not None:
+        writes = manifest.writes_since(table.synced_version)
+        if writes:
+            from_date = min(w["min_date"] for w in writes)
+    else:
+        table = NewHighEventTable(storage.output_dir, windows)
+
+    if from_date is None:
+        print("🔄 由歷史資料計算新高事件表...")
+    else:
+        print(f"🔄 更新 {from_date} 之後的新高事件...")
+    started = datetime.now()
+    count = table.recompute(panel, index, from_date)
+    table.synced_version = manifest.version
+    table.save()
+    print(f"✓ 計算 {count:,} 筆事件（{(datetime.now() - started).total_seconds():.1f} 秒）")
+    return table
@@ -0,0 +1,278 @@
+"""
+日期 × 股票面板陣列
+將 open/high/low/close/volume 物化為對齊的「交易日 × 股票」矩陣，
+以 .npy 檔存放，讀取時以記憶體映射（np.memmap）開啟：
+- 不必解析 CSV / Parquet，開啟後即可直接做橫斷面的 numpy 運算
+- 多個程序開啟同一份面板時共用作業系統的 page cache
+- 價格缺值為 NaN；present 矩陣標記該 (交易日, 股票) 是否有記錄
+- 列（交易日）依日期遞增、欄（股票）依加入順序，兩個維度都預留空間，
+  新交易日的資料直接寫入檔案中的下一列，空間不足時才擴充重寫
+
+狀態由儲存後端的寫入監聽器隨寫入更新；不存在、不一致或寫入早於最後一列的
+新日期（需要插入中間的列）時由歷史資料重建
+"""
+
+import json
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from core.store import StockStore
+
+PRICE_FIELDS = ['open', 'high', 'low', 'close']
+FIELDS = PRICE_FIELDS + ['volume', 'present']
+DTYPES = {'open': np.float64, 'high': np.float64, 'low': np.float64, 'close': np.float64,
+          'volume': np.int64, 'present': np.bool_}
+FILL = {'open': np.nan, 'high': np.nan, 'low': np.nan, 'close': np.nan, 'volume': 0, 'present': False}
+
+# 空間不足時一次擴充的列數（約兩年交易日）與欄數
+GROW_ROWS = 512
+GROW_STOCKS = 256
+
+
+class PricePanel:
+    """
+    記憶體映射的價格面板
+
+    Attributes:
+        dates: 各列的交易日 ['YYYY-MM-DD', ...]
+        stock_ids: 各欄的股票代號
+        arrays: {欄位: (容量列數, 容量欄數) 的 memmap}；有效範圍為 [:len(dates), :len(stock_ids)]
+    """
+
+    DIRNAME = "panel"
+    META_FILENAME = "meta.json"
+    FORMAT_VERSION = 1
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.dates = []
+        self.stock_ids = []
+        self.arrays = {}
+        self.synced_version = None
+        self._rows = {}
+        self._cols = {}
+
+    # ---- 持久化 ----
+
+    @classmethod
+    def open(cls, directory, writable=False):
+        """以記憶體映射開啟面板，不存在或格式不符時返回 None"""
+        directory = Path(directory)
+        try:
+            with open(directory / cls.META_FILENAME, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get("format") != cls.FORMAT_VERSION:
+            return None
+
+        panel = cls(directory)
+        panel.dates = meta["dates"]
+        panel.stock_ids = meta["stock_ids"]
+        panel.synced_version = meta["synced_version"]
+        try:
+            for field in FIELDS:
+                panel.arrays[field] = np.load(directory / f"{field}.npy", mmap_mode='r+' if writable else 'r')
+        except (OSError, ValueError):
+            return None
+        panel._index()
+        return panel
+
+    def save(self):
+        """寫回矩陣並原子性地更新 meta（meta 最後寫入，中斷時版本不符即會重建）"""
+        for array in self.arrays.values():
+            array.flush()
+        meta = {
+            "format": self.FORMAT_VERSION,
+            "synced_version": self.synced_version,
+            "dates": self.dates,
+            "stock_ids": self.stock_ids,
+        }
+        tmp_path = self.directory / (self.META_FILENAME + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, separators=(',', ':'))
+        os.replace(tmp_path, self.directory / self.META_FILENAME)
+
+    def _index(self):
+        self._rows = {date: row for row, date in enumerate(self.dates)}
+        self._cols = {stock_id: col for col, stock_id in enumerate(self.stock_ids)}
+
+    def _allocate(self, row_capacity, col_capacity):
+        """配置（或擴充）矩陣檔案，保留既有內容；新檔先寫到暫存檔再改名"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        n_rows, n_cols = len(self.dates), len(self.stock_ids)
+        for field in FIELDS:
+            path = self.directory / f"{field}.npy"
+            tmp_path = self.directory / f"{field}.npy.tmp"
+            array = np.lib.format.open_memmap(
+                tmp_path, mode='w+', dtype=DTYPES[field], shape=(row_capacity, col_capacity)
+            )
+            array[:] = FILL[field]
+            if field in self.arrays:
+                array[:n_rows, :n_cols] = self.arrays[field][:n_rows, :n_cols]
+            array.flush()
+            del array
+            os.replace(tmp_path, path)
+            self.arrays[field] = np.load(path, mmap_mode='r+')
+
+    # ---- 由資料更新 ----
+
+    @classmethod
+    def rebuild(cls, storage):
+        """由歷史資料重建"""
+        panel = cls(Path(storage.output_dir) / cls.DIRNAME)
+        manifest = storage.load_manifest()
+        panel.synced_version = manifest.version
+        panel._allocate(GROW_ROWS, GROW_STOCKS)
+        if not manifest.is_empty:
+            panel.apply(StockStore(storage).query(columns=['date', 'stock_id'] + PRICE_FIELDS + ['volume']))
+        return panel
+
+    def apply(self, batch_df):
+        """
+        寫入一批記錄（新交易日附加在最後，既有交易日就地更新）
+
+        Returns:
+            bool: 有早於最後一列的新日期（需要插入中間的列，必須重建）時返回 False
+        """
+        if batch_df.empty:
+            return True
+        dates = batch_df['date'].astype(str).str[:10]
+        new_dates = sorted(set(pd.unique(dates)) - set(self._rows))
+        if new_dates and self.dates and new_dates[0] < self.dates[-1]:
+            return False
+
+        stock_ids = batch_df['stock_id'].astype(str)
+        new_stocks = [stock_id for stock_id in pd.unique(stock_ids) if stock_id not in self._cols]
+
+        row_capacity, col_capacity = self.arrays['present'].shape
+        n_rows, n_cols = len(self.dates) + len(new_dates), len(self.stock_ids) + len(new_stocks)
+        if n_rows > row_capacity or n_cols > col_capacity:
+            self._allocate(max(row_capacity, n_rows + GROW_ROWS), max(col_capacity, n_cols + GROW_STOCKS))
+
+        self.dates.extend(new_dates)
+        self.stock_ids.extend(new_stocks)
+        self._index()
+
+        rows = dates.map(self._rows).to_numpy(dtype=np.int64)
+        cols = stock_ids.map(self._cols).to_numpy(dtype=np.int64)
+        for field in PRICE_FIELDS:
+            self.arrays[field][rows, cols] = pd.to_numeric(batch_df[field]).to_numpy(dtype=np.float64)
+        volume = pd.to_numeric(batch_df['volume']).fillna(0)
+        self.arrays['volume'][rows, cols] = volume.to_numpy(dtype=np.int64)
+        self.arrays['present'][rows, cols] = True
+        return True
+
+    # ---- 查詢 ----
+
+    def __getitem__(self, field):
+        """有效範圍內的矩陣（memmap 視圖，不複製）"""
+        return self.arrays[field][:len(self.dates), :len(self.stock_ids)]
+
+    def row_range(self, start_date=None, end_date=None):
+        """start_date 與 end_date 之間（含）的列範圍 slice"""
+        dates = np.asarray(self.dates)
+        start = int(np.searchsorted(dates, start_date, side='left')) if start_date else 0
+        end = int(np.searchsorted(dates, end_date, side='right')) if end_date else len(dates)
+        return slice(start, end)
+
+    def column_of(self, stock_id):
+        """股票所在的欄，不存在時返回 None"""
+        return self._cols.get(stock_id)
+
+    def series(self, stock_id, field='close', start_date=None, end_date=None):
+        """單一股票的時間序列（只含有記錄的交易日）"""
+        col = self._cols.get(stock_id)
+        if col is None:
+            return pd.Series(dtype=DTYPES[field])
+        rows = self.row_range(start_date, end_date)
+        present = self['present'][rows, col]
+        values = self[field][rows, col][present]
+        index = np.asarray(self.dates[rows])[present]
+        return pd.Series(values, index=index, name=stock_id)
+
+
+def find_new_highs_panel(panel, years=3, stock_names=None):
+    """
+    以面板的橫斷面運算找出最新交易日創 N 年新高的股票（結果與 core.new_high.find_new_highs 相同）
+
+    Args:
+        stock_names: {stock_id: 名稱}（面板不儲存名稱）
+
+    Returns:
+        tuple: (創新高的股票資訊列表, 最新日期, 比對起始日期, 最新日期有交易的股票數)；
+               面板為空時返回 ([], None, None, 0)
+    """
+    if not panel.dates:
+        return [], None, None, 0
+
+    stock_names = stock_names or {}
+    latest_date = pd.Timestamp(panel.dates[-1])
+    start_date = latest_date - timedelta(days=years * 365)
+    last = len(panel.dates) - 1
+    first = panel.row_range(start_date.strftime('%Y-%m-%d')).start
+
+    latest_present = np.asarray(panel['present'][last])
+    latest_high = np.asarray(panel['high'][last])
+    history = np.asarray(panel['high'][first:last])
+
+    # 各股票過去 N 年（不含最新交易日）的最高價；沒有歷史記錄時為 -inf
+    previous_high = np.fmax.reduce(history, axis=0, initial=-np.inf)
+    broke_out = latest_present & np.isfinite(previous_high) & (latest_high > previous_high)
+
+    new_highs = []
+    for col in np.flatnonzero(broke_out):
+        # 前高日期：等於前高價的最後一個交易日
+        row = first + int(np.flatnonzero(history[:, col] == previous_high[col])[-1])
+        stock_id = panel.stock_ids[col]
+        high, prev_high = float(latest_high[col]), float(previous_high[col])
+        new_highs.append({
+            'stock_id': stock_id,
+            'stock_name': stock_names.get(stock_id, ''),
+            'date': latest_date.date(),
+            'latest_high': high,
+            'previous_high': prev_high,
+            'previous_high_date': datetime.strptime(panel.dates[row], '%Y-%m-%d').date(),
+            'increase': high - prev_high,
+            'increase_pct': ((high - prev_high) / prev_high) * 100
+        })
+    return new_highs, latest_date, start_date, int(latest_present.sum())
+
+
+def attach_panel(storage):
+    """在儲存後端註冊監聽器，每次寫入後更新面板（面板不存在時不做任何事）"""
+    directory = Path(storage.output_dir) / PricePanel.DIRNAME
+
+    def _on_write(batch_df, manifest):
+        panel = PricePanel.open(directory, writable=True)
+        if panel is None or panel.synced_version != manifest.version - 1:
+            # 中間有未經監聽器的寫入，交由 load_panel 重建
+            return
+        if not panel.apply(batch_df):
+            (directory / PricePanel.META_FILENAME).unlink()
+            return
+        panel.synced_version = manifest.version
+        panel.save()
+
+    storage.add_write_listener(_on_write)
+
+
+def load_panel(storage, rebuild=False):
+    """以記憶體映射開啟與資料同步的面板，不存在或不一致時由歷史資料重建"""
+    directory = Path(storage.output_dir) / PricePanel.DIRNAME
+    manifest = storage.load_manifest()
+
+    panel = None if rebuild else PricePanel.open(directory)
+    if panel is None or panel.synced_version != manifest.version:
+        print("🔄 由歷史資料重建價格面板...")
+        started = datetime.now()
+        panel = PricePanel.rebuild(storage)
+        panel.save()
+        print(f"✓ 面板重建完成（{len(panel.dates)} 個交易日 × {len(panel.stock_ids)} 支股票，"
+              f"{(datetime.now() - started).total_seconds():.1f} 秒）")
+        panel = PricePanel.open(directory)
+    return panel
@@ -0,0 +1,343 @@
+"""
+區間最高/最低價索引（sparse table）
+建立在價格面板（core.panel）之上，對 high 與 low 的每一欄（股票）預先計算
+各長度 2^k 區間的最高（最低）價所在的列：
+- 第 k 層第 j 列記錄 (j - 2^k, j] 區間內極值所在的列與 j 的距離（uint16）；
+  第 0 層即 j 本身，不需儲存
+- 任意區間 [a, b] 的極值由兩個重疊的 2^k 區間比較得出，查詢成本 O(1)，與區間長度無關
+- 相同極值以較晚的交易日為準（與 core.new_high 的前高日期相同）
+
+因此「截至任一交易日的 N 年高/低點與其日期」只需查表，不必掃描歷史；
+52 週、1 / 3 / 5 年與歷史新高的篩選都是同一個查詢
+
+每一層只依賴前一層的同一列與更早的列，新交易日附加在面板最後時只需計算新的列；
+既有交易日被改寫時從該列重新計算。索引與面板共用目錄與容量，面板擴充或重建時一併重建
+"""
+
+import json
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+
+from core.panel import PricePanel, load_panel
+
+FIELDS = ('high', 'low')
+
+# 常用的篩選視窗（天數；None 表示全部歷史）
+WINDOWS = {
+    '52w': 52 * 7,
+    '1y': 365,
+    '3y': 3 * 365,
+    '5y': 5 * 365,
+    'all': None,
+}
+
+
+class RangeIndex:
+    """
+    面板 high / low 的區間極值索引
+
+    Attributes:
+        offsets: {欄位: (層數 - 1, 容量列數, 容量欄數) 的 uint16 memmap}
+        rows: 已計算的列數（與面板的交易日數相同）
+    """
+
+    META_FILENAME = "range_meta.json"
+    FORMAT_VERSION = 1
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.offsets = {}
+        self.rows = 0
+        self.synced_version = None
+
+    # ---- 持久化 ----
+
+    @staticmethod
+    def _levels(row_capacity):
+        """需要的層數（含不儲存的第 0 層）；距離以 uint16 儲存，最大層為 2^16 列的區間"""
+        return max(1, min(row_capacity.bit_length(), 17))
+
+    @classmethod
+    def open(cls, directory, writable=False):
+        """以記憶體映射開啟索引，不存在或格式不符時返回 None"""
+        directory = Path(directory)
+        try:
+            with open(directory / cls.META_FILENAME, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get("format") != cls.FORMAT_VERSION:
+            return None
+
+        index = cls(directory)
+        index.rows = meta["rows"]
+        index.synced_version = meta["synced_version"]
+        try:
+            for field in FIELDS:
+                index.offsets[field] = np.load(directory / f"range_{field}.npy", mmap_mode='r+' if writable else 'r')
+        except (OSError, ValueError):
+            return None
+        return index
+
+    def save(self):
+        """寫回索引並原子性地更新 meta（meta 最後寫入，中斷時版本不符即會重建）"""
+        for array in self.offsets.values():
+            array.flush()
+        meta = {"format": self.FORMAT_VERSION, "synced_version": self.synced_version, "rows": self.rows}
+        tmp_path = self.directory / (self.META_FILENAME + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self.directory / self.META_FILENAME)
+
+    def _allocate(self, shape):
+        """配置與面板容量相同的索引檔案（先寫到暫存檔再改名）"""
+        row_capacity, col_capacity = shape
+        for field in FIELDS:
+            path = self.directory / f"range_{field}.npy"
+            tmp_path = self.directory / f"range_{field}.npy.tmp"
+            array = np.lib.format.open_memmap(
+                tmp_path, mode='w+', dtype=np.uint16,
+                shape=(self._levels(row_capacity) - 1, row_capacity, col_capacity)
+            )
+            array.flush()
+            del array
+            os.replace(tmp_path, path)
+            self.offsets[field] = np.load(path, mmap_mode='r+')
+
+    def matches(self, panel):
+        """索引的容量是否與面板相同（面板擴充後需重建）"""
+        shape = panel.arrays['present'].shape
+        return all(
+            array.shape == (self._levels(shape[0]) - 1,) + shape for array in self.offsets.values()
+        ) and self.rows <= len(panel.dates)
+
+    # ---- 建立與更新 ----
+
+    @classmethod
+    def rebuild(cls, panel):
+        """由面板重建"""
+        index = cls(panel.directory)
+        index.synced_version = panel.synced_version
+        index._allocate(panel.arrays['present'].shape)
+        index.extend(panel, 0)
+        return index
+
+    def extend(self, panel, from_row):
+        """
+        重新計算 from_row（含）之後的所有列（附加新交易日時 from_row 即原本的列數）
+
+        第 k 層第 j 列 = 比較第 k-1 層的第 j 列與第 j - 2^(k-1) 列，逐層向量化計算
+        （j - 2^(k-1) < 0 時區間截在第 0 列，沿用第 k-1 層）
+        """
+        n = len(panel.dates)
+        from_row = min(from_row, self.rows)
+        if from_row < n:
+            rows = np.arange(from_row, n)
+            for field in FIELDS:
+                values = panel.arrays[field]
+                offsets = self.offsets[field]
+                cols = np.arange(offsets.shape[2])
+                later = np.repeat(rows[:, None], len(cols), axis=1)  # 第 0 層：極值所在列即本身
+                for level in range(1, offsets.shape[0] + 1):
+                    earlier_rows = rows - (1 << (level - 1))
+                    valid = earlier_rows >= 0
+                    earlier = later.copy()
+                    earlier[valid] = self._argrows(field, level - 1, earlier_rows[valid])
+                    later = np.where(
+                        _keys(values, field, later, cols) >= _keys(values, field, earlier, cols), later, earlier
+                    )
+                    offsets[level - 1, from_row:n, :] = rows[:, None] - later
+        self.rows = n
+
+    def _argrows(self, field, level, rows):
+        """第 level 層、指定列的極值所在列 (len(rows), 容量欄數)"""
+        n_cols = self.offsets[field].shape[2]
+        if level == 0:
+            return np.repeat(rows[:, None], n_cols, axis=1)
+        return rows[:, None] - self.offsets[field][level - 1, rows, :].astype(np.int64)
+
+    # ---- 查詢 ----
+
+    def extremes(self, panel, field, first, last):
+        """
+        [first, last] 區間（含）內所有股票的極值與其所在的列，O(股票數)，與區間長度無關
+
+        由兩個重疊的 2^k 區間（以 first 起算與以 last 結束）各自的極值比較得出
+
+        Args:
+            field: 'high'（最高價）或 'low'（最低價）
+
+        Returns:
+            tuple: (極值陣列, 所在列陣列)，長度為面板的股票數；區間內沒有記錄的股票極值為 NaN
+        """
+        values, rows = self.extremes_many(panel, field, np.array([first]), np.array([last]))
+        return values[0], rows[0]
+
+    def extremes_many(self, panel, field, firsts, lasts):
+        """
+        多個區間 [firsts[i], lasts[i]]（含）的極值，一次向量化查詢（依區間長度所屬的層分組）
+
+        Returns:
+            tuple: (極值, 所在列)，皆為 (區間數, 面板股票數) 的陣列
+        """
+        firsts = np.asarray(firsts, dtype=np.int64)
+        lasts = np.asarray(lasts, dtype=np.int64)
+        n_cols = len(panel.stock_ids)
+        cols = np.arange(n_cols)
+        values = panel.arrays[field]
+
+        levels = np.floor(np.log2(lasts - firsts + 1)).astype(np.int64)
+        rows = np.empty((len(firsts), n_cols), dtype=np.int64)
+        for level in np.unique(levels):
+            group = np.flatnonzero(levels == level)
+            later = self._argrows(field, level, lasts[group])[:, :n_cols]
+            earlier = self._argrows(field, level, firsts[group] + (1 << int(level)) - 1)[:, :n_cols]
+            rows[group] = np.where(
+                _keys(values, field, later, cols) >= _keys(values, field, earlier, cols), later, earlier
+            )
+        return np.asarray(values[rows, cols]), rows
+
+
+def _keys(values, field, rows, cols):
+    """比較用的鍵：最高價直接比較、最低價取負值，缺值為 -inf"""
+    keys = values[rows, cols]
+    if field == 'low':
+        keys = -keys
+    return np.where(np.isnan(keys), -np.inf, keys)
+
+
+# ---- 篩選 ----
+
+def _window_start(panel, row, days):
+    """row 所在交易日往前 days 天（含）的第一列；days 為 None 時為第 0 列"""
+    if days is None:
+        return 0
+    start = datetime.strptime(panel.dates[row], '%Y-%m-%d') - timedelta(days=days)
+    return panel.row_range(start.strftime('%Y-%m-%d')).start
+
+
+def _as_of_row(panel, as_of=None):
+    """as_of（含）之前最後一個交易日的列；None 表示最新交易日"""
+    if as_of is None:
+        return len(panel.dates) - 1
+    return panel.row_range(end_date=as_of).stop - 1
+
+
+def find_breakouts(panel, index, field='high', days=3 * 365, as_of=None, stock_names=None):
+    """
+    找出某個交易日創 N 天（days）新高（field='low' 時為新低）的股票
+
+    比對範圍為該交易日往前 days 天（含）到前一個交易日；days 為 None 時比對全部歷史。
+    field='high'、days=3*365、as_of=None 時結果與 core.new_high.find_new_highs 相同
+
+    Args:
+        as_of: 檢查的日期（'YYYY-MM-DD'，該日或之前最後一個交易日；None 表示最新交易日）
+        stock_names: {stock_id: 名稱}（面板不儲存名稱）
+
+    Returns:
+        tuple: (創新高/新低的股票資訊列表, 檢查日期, 比對起始日期, 該日有交易的股票數)
+    """
+    stock_names = stock_names or {}
+    row = _as_of_row(panel, as_of)
+    if row < 0:
+        return [], None, None, 0
+    first = _window_start(panel, row, days)
+    current_date = datetime.strptime(panel.dates[row], '%Y-%m-%d')
+    start_date = current_date - timedelta(days=days) if days is not None \
+        else datetime.strptime(panel.dates[0], '%Y-%m-%d')
+
+    n_cols = len(panel.stock_ids)
+    present = np.asarray(panel['present'][row])
+    current = np.asarray(panel[field][row])
+    if first < row:
+        previous, previous_rows = index.extremes(panel, field, first, row - 1)
+    else:
+        previous, previous_rows = np.full(n_cols, np.nan), np.zeros(n_cols, dtype=np.int64)
+
+    with np.errstate(invalid='ignore'):
+        beyond = current > previous if field == 'high' else current < previous
+    broke_out = present & np.isfinite(previous) & beyond
+
+    results = []
+    for col in np.flatnonzero(broke_out):
+        stock_id = panel.stock_ids[col]
+        value, prev_value = float(current[col]), float(previous[col])
+        results.append({
+            'stock_id': stock_id,
+            'stock_name': stock_names.get(stock_id, ''),
+            'date': current_date.date(),
+            f'latest_{field}': value,
+            f'previous_{field}': prev_value,
+            f'previous_{field}_date': datetime.strptime(panel.dates[previous_rows[col]], '%Y-%m-%d').date(),
+            'increase': value - prev_value,
+            'increase_pct': ((value - prev_value) / prev_value) * 100
+        })
+    return results, current_date, start_date, int(present.sum())
+
+
+def extreme_as_of(panel, index, stock_id, field='high', days=None, as_of=None):
+    """
+    單一股票截至某交易日（含）往前 days 天內的最高（最低）價與其日期
+
+    Returns:
+        tuple: (價格, 日期 'YYYY-MM-DD')；沒有記錄時為 (None, None)
+    """
+    col = panel.column_of(stock_id)
+    row = _as_of_row(panel, as_of)
+    if col is None or row < 0:
+        return None, None
+    first = _window_start(panel, row, days)
+    values, rows = index.extremes(panel, field, first, row)
+    if np.isnan(values[col]):
+        return None, None
+    return float(values[col]), panel.dates[rows[col]]
+
+
+# ---- 與儲存後端同步 ----
+
+def attach_range_index(storage):
+    """
+    在儲存後端註冊監聽器，每次寫入後延伸索引（索引或面板不存在時不做任何事）
+
+    需在 attach_panel 之後註冊，才會在面板更新後執行
+    """
+    directory = Path(storage.output_dir) / PricePanel.DIRNAME
+
+    def _on_write(batch_df, manifest):
+        index = RangeIndex.open(directory, writable=True)
+        if index is None or index.synced_version != manifest.version - 1:
+            return
+        panel = PricePanel.open(directory)
+        if panel is None or panel.synced_version != manifest.version or not index.matches(panel):
+            # 面板已擴充或待重建，交由 load_range_index 重建
+            (directory / RangeIndex.META_FILENAME).unlink()
+            return
+        first_date = str(batch_df['date'].min())[:10]
+        index.extend(panel, panel.row_range(first_date).start)
+        index.synced_version = manifest.version
+        index.save()
+
+    storage.add_write_listener(_on_write)
+
+
+def load_range_index(storage, rebuild=False):
+    """
+    開啟與資料同步的面板與索引，不存在或不一致時重建
+
+    Returns:
+        tuple: (PricePanel, RangeIndex)
+    """
+    panel = load_panel(storage, rebuild=rebuild)
+    index = None if rebuild else RangeIndex.open(panel.directory)
+    if index is None or index.synced_version != panel.synced_version or not index.matches(panel) \
+            or index.rows != len(panel.dates):
+        print("🔄 由價格面板重建區間極值索引...")
+        started = datetime.now()
+        index = RangeIndex.rebuild(panel)
+        index.save()
+        print(f"✓ 索引重建完成（{index.rows} 個交易日，{(datetime.now() - started).total_seconds():.1f} 秒）")
+        index = RangeIndex.open(panel.directory)
+    return panel, index
@@ -0,0 +1,58 @@
+"""
+共用的 Token Bucket 速率限制器
+多個執行緒共用同一個 bucket，整體請求速率不超過設定值
+"""
+
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Token Bucket 速率限制器（執行緒安全）
+
+    Args:
+        rate: 每秒補充的 token 數（即平均請求速率上限）
+        capacity: bucket 容量（允許的瞬間突發請求數）
+    """
+
+    def __init__(self, rate, capacity=1):
+        if rate <= 0:
+            raise ValueError("rate 必須大於 0")
+        self.rate = float(rate)
+        self.capacity = float(max(capacity, 1))
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def per_hour(cls, requests_per_hour, capacity=1):
+        """以每小時請求數建立（FinMind 的額度以小時計）"""
+        return cls(requests_per_hour / 3600.0, capacity)
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self, tokens=1):
+        """
+        取得 token，不足時阻塞直到可用
+
+        先預扣 token（允許暫時為負），再於鎖外等待，多個執行緒會依序排隊
+        Returns:
+            float: 實際等待的秒數
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens -= tokens
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def set_rate(self, rate):
+        """調整速率（已預扣的 token 不受影響）"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = float(rate)
@@ -0,0 +1,189 @@
+"""
+FinMind 回應快取
+以 (資料集, 股票代號, 起訖日期) 的雜湊為鍵，把 API 回應以 gzip 壓縮的 pickle 存在磁碟：
+- 結束日期已過去夠久的歷史區間視為不會再變動，永久有效
+- 仍包含近期日期的區間只在 OPEN_TTL 秒內有效（資料可能尚未公布或被更正）
+- 總大小超過上限時，依最後存取時間（檔案 mtime）淘汰最久未使用的項目
+
+重試、續抓與歷史回補遇到相同的請求時直接讀取快取，不再消耗 API 額度
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+
+class ResponseCache:
+    """
+    磁碟回應快取（執行緒安全）
+
+    Args:
+        cache_dir: 快取目錄
+        max_bytes: 快取總大小上限（位元組）
+    """
+
+    SUFFIX = ".pkl.gz"
+    OPEN_TTL = 3600  # 未結束區間的有效秒數
+    CLOSED_AFTER_DAYS = 2  # 結束日期早於今天幾天以上視為已結束（不再變動）
+    STATS_FILENAME = "stats.json"
+
+    def __init__(self, cache_dir, max_bytes=512 * 1024 * 1024):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "stores": 0, "evictions": 0}
+        self._lock = threading.Lock()
+        self._total_bytes = None  # 第一次寫入時才掃描目錄
+
+    # ---- 鍵與有效期限 ----
+
+    @staticmethod
+    def make_key(dataset, stock_id, start_date, end_date):
+        raw = f"{dataset}|{stock_id}|{start_date}|{end_date}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return self.cache_dir / key[:2] / f"{key}{self.SUFFIX}"
+
+    def _expires_at(self, end_date):
+        """已結束的區間返回 None（永久有效），否則返回到期的 UNIX 時間"""
+        closed_before = (datetime.now() - timedelta(days=self.CLOSED_AFTER_DAYS)).strftime('%Y-%m-%d')
+        if end_date and end_date < closed_before:
+            return None
+        return time.time() + self.OPEN_TTL
+
+    # ---- 讀寫 ----
+
+    def get(self, dataset, stock_id, start_date, end_date):
+        """返回快取的 DataFrame；未命中或已過期時返回 None"""
+        path = self._path(self.make_key(dataset, stock_id, start_date, end_date))
+        try:
+            with gzip.open(path, 'rb') as f:
+                expires_at, df = pickle.load(f)
+        except FileNotFoundError:
+            self._count("misses")
+            return None
+        except Exception:
+            # 損毀或 pandas 版本不相容，視為未命中
+            self._discard(path)
+            self._count("misses")
+            return None
+
+        if expires_at is not None and expires_at < time.time():
+            self._discard(path)
+            self._count("expired")
+            self._count("misses")
+            return None
+
+        try:
+            os.utime(path)  # 更新最後存取時間（LRU）
+        except OSError:
+            pass
+        self._count("hits")
+        return df
+
+    def put(self, dataset, stock_id, start_date, end_date, df):
+        """寫入快取（原子性改名），必要時淘汰最久未使用的項目"""
+        path = self._path(self.make_key(dataset, stock_id, start_date, end_date))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        with gzip.open(tmp_path, 'wb', compresslevel=6) as f:
+            pickle.dump((self._expires_at(end_date), df), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        with self._lock:
+            old_size = path.stat().st_size if path.exists() else 0
+            os.replace(tmp_path, path)
+            self._ensure_total()
+            self._total_bytes += path.stat().st_size - old_size
+            self.stats["stores"] += 1
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _discard(self, path):
+        with self._lock:
+            try:
+                size = path.stat().st_size
+                path.unlink()
+            except OSError:
+                return
+            if self._total_bytes is not None:
+                self._total_bytes -= size
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    # ---- 容量管理 ----
+
+    def _entries(self):
+        """[(mtime, size, path), ...]"""
+        entries = []
+        if not self.cache_dir.exists():
+            return entries
+        for sub in os.scandir(self.cache_dir):
+            if not sub.is_dir():
+                continue
+            for entry in os.scandir(sub.path):
+                if entry.name.endswith(self.SUFFIX):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, Path(entry.path)))
+        return entries
+
+    def _ensure_total(self):
+        if self._total_bytes is None:
+            self._total_bytes = sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        """淘汰最久未使用的項目，直到總大小低於上限的 90%（呼叫端需持有鎖）"""
+        target = self.max_bytes * 0.9
+        for _, size, path in sorted(self._entries()):
+            if self._total_bytes <= target:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            self._total_bytes -= size
+            self.stats["evictions"] += 1
+
+    def size_bytes(self):
+        with self._lock:
+            self._ensure_total()
+            return self._total_bytes
+
+    def clear(self):
+        """刪除所有快取項目"""
+        with self._lock:
+            for _, _, path in self._entries():
+                path.unlink()
+            self._total_bytes = 0
+
+    # ---- 統計 ----
+
+    def save_stats(self):
+        """把本次的命中統計累加到 stats.json 並歸零，返回累計統計"""
+        stats_path = self.cache_dir / self.STATS_FILENAME
+        with self._lock:
+            total = {}
+            if stats_path.exists():
+                try:
+                    with open(stats_path, 'r', encoding='utf-8') as f:
+                        total = json.load(f)
+                except (OSError, ValueError):
+                    total = {}
+            for name, count in self.stats.items():
+                total[name] = total.get(name, 0) + count
+                self.stats[name] = 0
+
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = stats_path.with_name(stats_path.name + '.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(total, f)
+            os.replace(tmp_path, stats_path)
+        return total
+
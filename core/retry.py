@@ -0,0 +1,205 @@
+"""
+請求錯誤分類、重試退避與自適應並行控制
+
+- classify_error: 將例外分為額度不足（quota）、暫時性（transient）與永久性（permanent）
+- RetryPolicy: 帶隨機抖動的指數退避與整批共用的重試額度
+- AimdController: 依 AIMD（加法增加、乘法減少）調整並行數與請求速率，
+  遇到額度錯誤時減半並暫停一段時間，連續成功時逐步恢復；收到停止要求時不再發出新請求
+"""
+
+import random
+import re
+import threading
+import time
+
+ERROR_QUOTA = "quota"
+ERROR_TRANSIENT = "transient"
+ERROR_PERMANENT = "permanent"
+ERROR_STOPPED = "stopped"
+
+ERROR_LABELS = {
+    ERROR_QUOTA: "額度不足",
+    ERROR_TRANSIENT: "暫時性錯誤",
+    ERROR_PERMANENT: "請求錯誤",
+    ERROR_STOPPED: "已停止",
+}
+
+# HTTP 狀態碼需獨立成詞，避免與網址中的股票代號（例如 2402）混淆
+_QUOTA_PATTERN = re.compile(r"upper limit|too many requests|rate limit|quota|\b(402|429)\b")
+_PERMANENT_PATTERN = re.compile(r"level is|register|permission|unauthorized|forbidden|not support|\b(401|403|404)\b")
+
+
+class QuotaExhaustedError(Exception):
+    """額度錯誤持續發生，整批提前結束"""
+
+    def __init__(self, message="API 額度已用盡，停止本批次剩餘請求"):
+        super().__init__(message)
+
+
+class FetchStoppedError(Exception):
+    """收到停止要求，整批提前結束"""
+
+    def __init__(self, message="收到停止要求，剩餘請求留待下次執行"):
+        super().__init__(message)
+
+
+def classify_error(exc):
+    """
+    判斷例外類型
+
+    FinMind 的錯誤多以一般 Exception 搭配訊息文字拋出（例如
+    "Requests reach the upper limit"），因此以例外類型與訊息判斷；
+    無法判斷者視為暫時性錯誤（有限次數重試）
+    """
+    if isinstance(exc, QuotaExhaustedError):
+        return ERROR_QUOTA
+    if isinstance(exc, FetchStoppedError):
+        return ERROR_STOPPED
+
+    message = f"{type(exc).__name__}: {exc}".lower()
+    if _QUOTA_PATTERN.search(message):
+        return ERROR_QUOTA
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return ERROR_TRANSIENT
+    if _PERMANENT_PATTERN.search(message):
+        return ERROR_PERMANENT
+    return ERROR_TRANSIENT
+
+
+class RetryPolicy:
+    """
+    指數退避（full jitter）與重試額度
+
+    Args:
+        max_attempts: 每個請求最多嘗試次數（含第一次）
+        base_delay / max_delay: 退避時間的基準與上限（秒）
+        budget: 整批最多重試次數，避免大量失敗時耗費過多時間
+    """
+
+    def __init__(self, max_attempts=3, base_delay=1.0, max_delay=30.0, budget=20):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_batch(cls, unit_count, **kwargs):
+        """依批次大小決定重試額度（至少 10 次，約為請求數的 20%）"""
+        return cls(budget=max(10, unit_count // 5), **kwargs)
+
+    def backoff(self, attempt):
+        """第 attempt 次重試前的等待秒數（0 ~ base * 2^attempt 之間隨機）"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def take(self):
+        """取得一次重試額度，用完時返回 False"""
+        with self._lock:
+            if self.budget <= 0:
+                return False
+            self.budget -= 1
+            return True
+
+
+class AimdController:
+    """
+    自適應並行數與請求速率
+
+    - 每個請求前以 acquire() 取得名額，完成後 release()
+    - 成功時並行數 +1（每累積「目前並行數」次成功），速率加回初始值的 10%
+    - 暫時性錯誤時並行數減半
+    - 額度錯誤時並行數與速率減半，所有執行緒暫停 cooldown 秒（連續發生時加倍）；
+      連續 max_quota_strikes 次冷卻後仍失敗即中止（aborted）
+    - stop() 後不再發出新請求（stopped），等待中的執行緒立即返回
+
+    Args:
+        max_concurrency: 並行數上限（初始值）
+        limiter: 要調整速率的 TokenBucket（None 表示只調整並行數）
+        max_rate: 速率上限（預設為 limiter 目前的速率）
+        cooldown: 第一次額度錯誤的暫停秒數
+    """
+
+    def __init__(self, max_concurrency, limiter=None, max_rate=None, cooldown=60.0, max_cooldown=900.0,
+                 max_quota_strikes=3):
+        self.max_concurrency = max(1, max_concurrency)
+        self.concurrency = float(self.max_concurrency)
+        self.limiter = limiter
+        self.max_rate = max_rate or (limiter.rate if limiter is not None else None)
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.max_quota_strikes = max_quota_strikes
+
+        self.aborted = False
+        self.stopped = False
+        self._cooldown = cooldown
+        self._cooldown_until = 0.0
+        self._quota_strikes = 0
+        self._successes = 0
+        self._in_flight = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """等待並行名額與冷卻結束；已中止時拋出 QuotaExhaustedError，已停止時拋出 FetchStoppedError"""
+        with self._cond:
+            while True:
+                if self.stopped:
+                    raise FetchStoppedError()
+                if self.aborted:
+                    raise QuotaExhaustedError()
+                wait = self._cooldown_until - time.monotonic()
+                if wait <= 0 and self._in_flight < int(self.concurrency):
+                    self._in_flight += 1
+                    return
+                self._cond.wait(timeout=wait if wait > 0 else None)
+
+    def release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def stop(self):
+        """不再發出新請求（進行中的請求照常完成）"""
+        with self._cond:
+            self.stopped = True
+            self._cond.notify_all()
+
+    def on_success(self):
+        with self._cond:
+            self._quota_strikes = 0
+            self._cooldown = self.base_cooldown
+            self._successes += 1
+            if self._successes >= self.concurrency:
+                self._successes = 0
+                if self.concurrency < self.max_concurrency:
+                    self.concurrency += 1
+                    self._cond.notify_all()
+                if self.limiter is not None and self.limiter.rate < self.max_rate:
+                    self.limiter.set_rate(min(self.max_rate, self.limiter.rate + self.max_rate * 0.1))
+
+    def on_error(self, kind):
+        """依錯誤類型降低並行數與速率；返回是否值得重試"""
+        with self._cond:
+            self._successes = 0
+            if kind == ERROR_PERMANENT:
+                return False
+
+            self.concurrency = max(1.0, self.concurrency / 2)
+            if kind != ERROR_QUOTA:
+                return True
+
+            if self.limiter is not None:
+                self.limiter.set_rate(max(self.max_rate * 0.05, self.limiter.rate / 2))
+
+            now = time.monotonic()
+            if now >= self._cooldown_until:
+                # 同一次冷卻期間的其他額度錯誤不重複計算
+                self._quota_strikes += 1
+                if self._quota_strikes > self.max_quota_strikes:
+                    self.aborted = True
+                    self._cond.notify_all()
+                    return False
+                print(f"\n⏸️  API 額度不足，暫停 {self._cooldown:.0f} 秒並降低請求速率"
+                      f"（並行數 {int(self.concurrency)}）\n")
+                self._cooldown_until = now + self._cooldown
+                self._cooldown = min(self.max_cooldown, self._cooldown * 2)
+            return True
@@ -0,0 +1,358 @@
+"""
+增量滾動新高狀態
+為每支股票保存過去 N 年（不含最新交易日）的單調遞減佇列（monotonic deque），
+佇列第一個元素即視窗內最高價與其日期。每日新高檢查只需比對最新交易日的 high
+與佇列開頭，不必重新載入 N 年歷史資料
+
+狀態檔由儲存後端的寫入監聽器隨寫入更新；不存在、不一致或被標記失效時，
+可由歷史資料重建
+"""
+
+import json
+import math
+import os
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pandas as pd
+
+from core.new_high import print_check_header
+from core.store import StockStore
+
+HIGH_COLUMNS = ['date', 'stock_id', 'stock_name', 'high']
+
+
+def _date_str(value):
+    """將日期（字串或 Timestamp）轉為 'YYYY-MM-DD'"""
+    if isinstance(value, str):
+        return value[:10]
+    return pd.Timestamp(value).strftime('%Y-%m-%d')
+
+
+class RollingHighState:
+    """
+    每支股票的滾動最高價狀態
+
+    - stocks: {stock_id: [[date, high], ...]}，最新交易日之前視窗內的後綴最大值，
+      日期遞增、high 嚴格遞減；相同 high 只保留較晚的日期（即前高日期取最晚者）
+    - latest_rows: {stock_id: [stock_name, high]}，最新交易日的記錄
+    """
+
+    FILENAME = "rolling_high_state.json"
+    FORMAT_VERSION = 1
+
+    def __init__(self, path, years=3):
+        self.path = Path(path)
+        self.years = years
+        self.window_days = years * 365
+        self.latest_date = None
+        self.latest_rows = {}
+        self.stocks = {}
+        self.dirty = set()
+        self.synced_version = None
+
+    # ---- 持久化 ----
+
+    @classmethod
+    def load(cls, path, years=3):
+        """載入狀態，不存在或參數不符時返回 None"""
+        path = Path(path)
+        if not path.exists():
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get("format") != cls.FORMAT_VERSION or data.get("years") != years:
+            return None
+
+        state = cls(path, years)
+        state.latest_date = data["latest_date"]
+        state.latest_rows = data["latest_rows"]
+        state.stocks = data["stocks"]
+        state.dirty = set(data["dirty"])
+        state.synced_version = data["synced_version"]
+        return state
+
+    def save(self):
+        """原子性地寫入狀態檔"""
+        data = {
+            "format": self.FORMAT_VERSION,
+            "years": self.years,
+            "latest_date": self.latest_date,
+            "latest_rows": self.latest_rows,
+            "stocks": self.stocks,
+            "dirty": sorted(self.dirty),
+            "synced_version": self.synced_version,
+        }
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, self.path)
+
+    # ---- 重建 ----
+
+    @classmethod
+    def rebuild(cls, storage, years=3):
+        """由歷史資料重建狀態（只讀取最近 N 年的 date, stock_id, stock_name, high）"""
+        state = cls(Path(storage.output_dir) / cls.FILENAME, years)
+        manifest = storage.load_manifest()
+        state.synced_version = manifest.version
+        if manifest.is_empty:
+            return state
+
+        latest_date = manifest.max_date
+        df = StockStore(storage).query(start=state._cutoff(latest_date), columns=HIGH_COLUMNS)
+        df['date'] = df['date'].map(_date_str)
+        state.latest_date = latest_date
+
+        latest = df[df['date'] == latest_date].drop_duplicates('stock_id', keep='first')
+        state.latest_rows = {
+            stock_id: [name if isinstance(name, str) else '', float(high)]
+            for stock_id, name, high in latest[['stock_id', 'stock_name', 'high']].itertuples(index=False)
+        }
+
+        # 後綴最大值：只保留 high 嚴格大於其後所有 high 的記錄
+        history = df[(df['date'] < latest_date) & df['high'].notna()]
+        history = history.sort_values(['stock_id', 'date'], ascending=False)
+        later_max = history.groupby('stock_id', observed=True)['high'].cummax() \
+            .groupby(history['stock_id'], observed=True).shift(1)
+        kept = history[later_max.isna() | (history['high'] > later_max)]
+        kept = kept.sort_values(['stock_id', 'date'])
+
+        state.stocks = {
+            stock_id: [[date, float(high)] for date, high in zip(group['date'], group['high'])]
+            for stock_id, group in kept.groupby('stock_id', sort=False, observed=True)
+        }
+        return state
+
+    # ---- 增量更新 ----
+
+    def _cutoff(self, date):
+        """視窗起始日（含）"""
+        return (datetime.strptime(date, '%Y-%m-%d') - timedelta(days=self.window_days)).strftime('%Y-%m-%d')
+
+    def _roll_forward(self, new_date):
+        """最新交易日前進：把上一個最新交易日的記錄推入佇列，並移除過期的記錄"""
+        if self.latest_date is not None:
+            for stock_id, (_, high) in self.latest_rows.items():
+                if high is None or math.isnan(high):
+                    continue
+                entries = self.stocks.setdefault(stock_id, [])
+                while entries and entries[-1][1] <= high:
+                    entries.pop()
+                entries.append([self.latest_date, high])
+
+        cutoff = self._cutoff(new_date)
+        for stock_id in list(self.stocks):
+            entries = self.stocks[stock_id]
+            expired = bisect_left([date for date, _ in entries], cutoff)
+            if expired:
+                del entries[:expired]
+            if not entries:
+                del self.stocks[stock_id]
+
+        self.latest_date = new_date
+        self.latest_rows = {}
+
+    def _insert_history(self, stock_id, date, high):
+        """插入最新交易日之前的記錄（回補或更正）"""
+        if high is None or math.isnan(high) or date < self._cutoff(self.latest_date):
+            return
+
+        entries = self.stocks.setdefault(stock_id, [])
+        dates = [d for d, _ in entries]
+        pos = bisect_left(dates, date)
+
+        if pos < len(entries) and entries[pos][0] == date:
+            if high < entries[pos][1]:
+                # 佇列中的記錄被改小，被它支配而移除的記錄無法還原，需重建
+                self.dirty.add(stock_id)
+                return
+            del entries[pos]
+
+        # 被之後較高（或相等）的記錄支配
+        if any(h >= high for _, h in entries[pos:]):
+            return
+
+        # 移除之前被新記錄支配的記錄
+        start = pos
+        while start > 0 and entries[start - 1][1] <= high:
+            start -= 1
+        entries[start:pos] = [[date, high]]
+
+    def apply(self, batch_df):
+        """
+        套用一批新寫入的記錄
+
+        Args:
+            batch_df: 含 date, stock_id, stock_name, high 的 DataFrame
+        """
+        rows = batch_df[['date', 'stock_id', 'stock_name', 'high']].copy()
+        rows['date'] = rows['date'].map(_date_str)
+        rows = rows.sort_values('date', kind='stable')
+
+        for date, stock_id, name, high in rows.itertuples(index=False):
+            high = float(high)
+            if self.latest_date is None or date > self.latest_date:
+                self._roll_forward(date)
+
+            if date == self.latest_date:
+                self.latest_rows[stock_id] = [name if isinstance(name, str) else '', high]
+            else:
+                self._insert_history(stock_id, date, high)
+
+    # ---- 查詢 ----
+
+    def evaluate(self):
+        """
+        以狀態判斷最新交易日創 N 年新高的股票
+
+        Returns:
+            tuple: (創新高的股票資訊列表, 最新日期, 比對起始日期, 最新日期有交易的股票數)
+        """
+        latest_date = pd.Timestamp(self.latest_date)
+        start_date = latest_date - timedelta(days=self.window_days)
+        cutoff = self._cutoff(self.latest_date)
+
+        new_highs = []
+        for stock_id, (name, high) in self.latest_rows.items():
+            entries = self.stocks.get(stock_id, [])
+            pos = bisect_left([date for date, _ in entries], cutoff)
+            if pos >= len(entries):
+                continue
+
+            previous_high_date, previous_high = entries[pos]
+            if high > previous_high:
+                new_highs.append({
+                    'stock_id': stock_id,
+                    'stock_name': name,
+                    'date': latest_date.date(),
+                    'latest_high': high,
+                    'previous_high': previous_high,
+                    'previous_high_date': datetime.strptime(previous_high_date, '%Y-%m-%d').date(),
+                    'increase': high - previous_high,
+                    'increase_pct': ((high - previous_high) / previous_high) * 100
+                })
+
+        return new_highs, latest_date, start_date, len(self.latest_rows)
+
+
+class RollingHighListener:
+    """
+    寫入監聽器：第一次寫入時載入狀態檔，之後的寫入直接套用到記憶體中的狀態並寫回，
+    不再每次重新解析狀態檔；同一行程之後的新高檢查也可直接使用記憶體中的狀態
+
+    狀態檔不存在時不做任何事（下次檢查時再重建）；更新失敗時刪除狀態檔，
+    避免留下不一致的狀態
+    """
+
+    def __init__(self, storage, years=3):
+        self.path = Path(storage.output_dir) / RollingHighState.FILENAME
+        self.years = years
+        self.state = None
+
+    def __call__(self, batch_df, manifest):
+        state = self.state or RollingHighState.load(self.path, self.years)
+        self.state = None
+        if state is None:
+            return
+        if state.synced_version != manifest.version - 1:
+            # 中間有未經監聽器的寫入，交由 load_rolling_high 補上或重建
+            return
+        try:
+            state.apply(batch_df)
+            state.synced_version = manifest.version
+            state.save()
+        except Exception:
+            self.path.unlink(missing_ok=True)
+            raise
+        self.state = state
+
+
+def attach_rolling_high(storage, years=3):
+    """
+    在儲存後端註冊監聽器，每次寫入後增量更新狀態檔
+
+    Returns:
+        RollingHighListener: 監聽器（其 state 為記憶體中與資料同步的狀態，可傳給 load_rolling_high）
+    """
+    listener = RollingHighListener(storage, years)
+    storage.add_write_listener(listener)
+    return listener
+
+
+def load_rolling_high(storage, years=3, rebuild=False, listener=None):
+    """
+    取得與資料同步的狀態
+
+    監聽器在記憶體中的狀態與資料集清單一致時直接使用（不讀取任何檔案）；
+    狀態檔版本一致時直接使用；若只落後於新交易日的寫入，
+    只讀取最新交易日之後的記錄補上；其他情況由歷史資料重建
+    """
+    path = Path(storage.output_dir) / RollingHighState.FILENAME
+    manifest = storage.load_manifest()
+    if listener is not None and listener.years != years:
+        listener = None
+
+    state = None
+    if not rebuild:
+        if listener is not None and listener.state is not None \
+                and listener.state.synced_version == manifest.version:
+            state = listener.state
+        else:
+            state = RollingHighState.load(path, years)
+
+    if state is not None and not state.dirty and state.synced_version != manifest.version:
+        state = _catch_up(state, storage, manifest)
+
+    if state is None or state.dirty or state.synced_version != manifest.version:
+        print("🔄 由歷史資料重建滾動新高狀態...")
+        state = RollingHighState.rebuild(storage, years)
+        state.save()
+
+    if listener is not None:
+        listener.state = state
+    return state
+
+
+def _catch_up(state, storage, manifest):
+    """
+    讀取最新交易日（含）之後的記錄補上狀態
+
+    依資料集清單的寫入紀錄確認：狀態同步後的每次寫入都只涉及最新交易日（含）
+    之後的日期，才能只讀這部分資料；否則返回 None 要求重建
+    """
+    if state.latest_date is None or state.synced_version is None:
+        return None
+
+    writes = manifest.writes_since(state.synced_version)
+    if writes is None or any(w["min_date"] < state.latest_date for w in writes):
+        return None
+
+    df = StockStore(storage).query(start=state.latest_date, columns=HIGH_COLUMNS)
+    state.apply(df)
+    state.synced_version = manifest.version
+    state.save()
+    return state
+
+
+def check_new_highs_incremental(storage, years=3, rebuild=False, listener=None):
+    """
+    以增量狀態檢查哪些股票創下近期新高（結果與 core.new_high.check_new_highs 相同）
+
+    Args:
+        listener: attach_rolling_high 返回的監聽器；同一行程剛寫入資料時直接使用其記憶體中的狀態
+
+    Returns:
+        list: 創新高的股票資訊列表
+    """
+    state = load_rolling_high(storage, years=years, rebuild=rebuild, listener=listener)
+    if state.latest_date is None:
+        return []
+
+    new_highs, latest_date, start_date, active_count = state.evaluate()
+    print_check_header(latest_date, start_date, active_count, years)
+    return new_highs
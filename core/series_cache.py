@@ -0,0 +1,115 @@
+"""
+個股序列快取
+在行程內以 (股票代號, 欄位) 為鍵快取已解碼的整段歷史 numpy 陣列：
+- 重複查詢同一支股票時直接返回記憶體中的陣列，不讀取任何檔案
+- 總大小超過上限時淘汰最久未使用（LRU）的項目
+- 以資料集清單的版本號判斷是否過期：同一行程的寫入由寫入監聽器只移除該批涉及的股票，
+  其他行程的寫入（版本號跳號）則清空整個快取
+
+陣列設為唯讀，呼叫端不會意外改到快取內容；日期以 'U10' 字串陣列存放，
+佔用空間可由 nbytes 精確計算
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+CACHE_ENV = "STOCK_SERIES_CACHE_MB"
+DEFAULT_MAX_MB = 256
+
+
+def cache_bytes_from_env():
+    """快取上限（位元組），讀取 STOCK_SERIES_CACHE_MB，未設定為 256 MB；0 表示停用"""
+    return int(float(os.getenv(CACHE_ENV) or DEFAULT_MAX_MB) * 1024 * 1024)
+
+
+class SeriesCache:
+    """
+    記憶體預算內的個股序列 LRU 快取（執行緒安全）
+
+    Args:
+        max_bytes: 快取總大小上限（位元組）
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.version = None  # 快取內容對應的資料集版本
+        self.total_bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "invalidations": 0}
+        self._entries = OrderedDict()  # (stock_id, column) -> 陣列，由舊到新
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, stock_id, column):
+        """返回快取的陣列並標記為最近使用；未命中時返回 None"""
+        with self._lock:
+            array = self._entries.get((stock_id, column))
+            if array is None:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end((stock_id, column))
+            self.stats["hits"] += 1
+            return array
+
+    def put(self, stock_id, column, array, version):
+        """
+        存入陣列（只在快取仍對應 version 時；讀取期間有新寫入則捨棄）
+
+        單一陣列超過上限時不快取
+        """
+        array.flags.writeable = False
+        with self._lock:
+            if version != self.version or array.nbytes > self.max_bytes:
+                return
+            key = (stock_id, column)
+            if key in self._entries:
+                self.total_bytes -= self._entries.pop(key).nbytes
+            self._entries[key] = array
+            self.total_bytes += array.nbytes
+            self.stats["stores"] += 1
+            while self.total_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.total_bytes -= evicted.nbytes
+                self.stats["evictions"] += 1
+
+    # ---- 失效 ----
+
+    def invalidate(self, stock_ids=None):
+        """移除指定股票的所有欄位（None 表示全部）"""
+        with self._lock:
+            self._invalidate(stock_ids)
+
+    def _invalidate(self, stock_ids=None):
+        if stock_ids is None:
+            keys = list(self._entries)
+        else:
+            stock_ids = set(stock_ids)
+            keys = [key for key in self._entries if key[0] in stock_ids]
+        for key in keys:
+            self.total_bytes -= self._entries.pop(key).nbytes
+        if keys:
+            self.stats["invalidations"] += 1
+
+    def sync(self, version):
+        """對齊資料集版本，版本不同時清空快取"""
+        with self._lock:
+            if version != self.version:
+                self._invalidate()
+                self.version = version
+
+    def on_write(self, batch_df, manifest):
+        """寫入監聽器：只移除這批寫入涉及的股票；中間有其他寫入時清空"""
+        stock_ids = {str(stock_id) for stock_id in batch_df['stock_id'].unique()}
+        with self._lock:
+            if self.version is not None and self.version == manifest.version - 1:
+                self._invalidate(stock_ids)
+            else:
+                self._invalidate()
+            self.version = manifest.version
+
+    def summary(self):
+        """統計資訊（含目前項目數與佔用大小）"""
+        with self._lock:
+            return dict(self.stats, entries=len(self._entries), bytes=self.total_bytes, max_bytes=self.max_bytes)
@@ -1,19 +1,40 @@
 """
 臺股資料獲取器核心類
 提供臺股歷史資料的增量獲取功能
+
+模組層級只載入標準函式庫與輕量的 core 模組；pandas、FinMind 與資料層模組
+（儲存後端、交易日曆、面板等）在建立獲取器或實際抓取時才載入，
+匯入本模組（例如排程觸發時的快速檢查）不需付出載入成本
 """
 
-import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
+import os
+import threading
 import time
 from pathlib import Path
 import json
 
-try:
-    from FinMind.data import DataLoader
-except ImportError:
-    print("❌ 請先安裝依賴: pip install -r requirements.txt")
-    exit(1)
+from core.fetch_journal import FetchJournal
+from core.fetch_status import record_probe
+from core.negative_cache import NegativeCache
+from core.rate_limiter import TokenBucket
+from core.response_cache import ResponseCache
+from core.retry import (
+    ERROR_LABELS, ERROR_QUOTA, ERROR_STOPPED, ERROR_TRANSIENT, AimdController, FetchStoppedError,
+    QuotaExhaustedError, RetryPolicy, classify_error,
+)
+from core.series_cache import cache_bytes_from_env
+
+
+def _load_data_loader():
+    """延遲載入 FinMind（載入耗時，只在建立獲取器、實際需要抓取時才載入）"""
+    try:
+        from FinMind.data import DataLoader
+    except ImportError:
+        print("❌ 請先安裝依賴: pip install -r requirements.txt")
+        exit(1)
+    return DataLoader
 
 
 class TaiwanStockFetcher:
@@ -21,15 +42,69 @@ class TaiwanStockFetcher:
 
     TARGET_START_DATE = "2010-01-01"
     CSV_FILENAME = "taiwan_stocks.csv"
+    PROBE_STOCKS = ("2330", "2317", "2454")  # 探測資料是否已公布用的權值股
 
-    def __init__(self, api_token=None, output_dir="data"):
-        """初始化獲取器"""
-        self.api = DataLoader()
+    def __init__(self, api_token=None, output_dir="data", storage_backend=None,
+                 workers=None, rate_limit=None, fetch_mode=None, cache=None):
+        """
+        初始化獲取器
+
+        Args:
+            workers: 批次獲取時同時請求的執行緒數（預設讀取 FINMIND_WORKERS，未設定為 1）
+            rate_limit: 每小時請求數上限（預設讀取 FINMIND_RATE_LIMIT），
+                        所有執行緒與單次請求共用同一個 token bucket
+            fetch_mode: fetch_range 的抓取方式 'auto' / 'by_date' / 'by_stock'
+                        （預設讀取 FINMIND_FETCH_MODE，未設定為 auto）
+            cache: 是否使用磁碟回應快取（預設讀取 FINMIND_CACHE，未設定為啟用；
+                   上限 FINMIND_CACHE_MAX_MB，預設 512 MB）
+        """
+        from core.coverage import attach_coverage
+        from core.fetch_planner import MODE_AUTO
+        from core.panel import attach_panel
+        from core.range_index import attach_range_index
+        from core.rolling_high import attach_rolling_high
+        from core.storage import create_storage
+        from core.store import StockStore
+        from core.trading_calendar import attach_trading_calendar
+
+        self.api = _load_data_loader()()
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(exist_ok=True)
         self.csv_path = self.output_dir / self.CSV_FILENAME
+        self.storage = create_storage(self.output_dir, backend=storage_backend)
+        self.rolling_high = attach_rolling_high(self.storage)  # 記憶體中的滾動新高狀態隨寫入更新
+        attach_trading_calendar(self.storage)
+        attach_coverage(self.storage)
+        attach_panel(self.storage)
+        attach_range_index(self.storage)  # 需在面板之後註冊
+        # 查詢介面的個股序列快取隨寫入失效（上限 STOCK_SERIES_CACHE_MB，預設 256 MB）
+        self.store = StockStore(self.storage, cache_bytes=cache_bytes_from_env())
+        self._calendar = None
         self.stock_name_map = {}  # 股票代號 -> 中文名稱對應
 
+        self.workers = max(1, int(workers or os.getenv('FINMIND_WORKERS') or 1))
+        self.fetch_mode = fetch_mode or os.getenv('FINMIND_FETCH_MODE') or MODE_AUTO
+        self.journal = FetchJournal(self.output_dir / FetchJournal.FILENAME)
+        self.negative_cache = NegativeCache(self.output_dir / NegativeCache.FILENAME)
+        self.empty_stats = None  # 最近一批依股票請求的查無資料統計
+        rate_limit = rate_limit or os.getenv('FINMIND_RATE_LIMIT')
+        self.rate_limiter = None
+        self._configured_rate = None
+        self._batch_limiter = None  # 未設定速率上限時，批次獲取期間依 delay 換算的限制器
+        self._controller = None  # 批次獲取期間的並行控制器
+        self._stop_event = threading.Event()
+        if rate_limit:
+            self.rate_limiter = TokenBucket.per_hour(float(rate_limit), capacity=self.workers)
+            self._configured_rate = self.rate_limiter.rate
+            print(f"✓ 速率上限 {float(rate_limit):.0f} 次/小時，{self.workers} 個執行緒")
+
+        if cache is None:
+            cache = os.getenv('FINMIND_CACHE', '1').lower() not in ('0', 'false', 'no', 'off')
+        self.cache = None
+        if cache:
+            max_mb = float(os.getenv('FINMIND_CACHE_MAX_MB') or 512)
+            self.cache = ResponseCache(self.output_dir / "cache" / "finmind", max_bytes=int(max_mb * 1024 * 1024))
+
         if api_token:
             self.api.login_by_token(api_token=api_token)
             print("✓ 已使用 API Token 登入")
@@ -39,6 +114,15 @@ class TaiwanStockFetcher:
         # 嘗試從現有檔案載入股票名稱對應
         self._load_stock_name_map()
 
+    @property
+    def calendar(self):
+        """交易日曆（第一次使用時載入，之後由寫入監聽器隨寫入更新）"""
+        from core.trading_calendar import load_trading_calendar
+
+        if self._calendar is None or self._calendar.synced_version != self.storage.load_manifest().version:
+            self._calendar = load_trading_calendar(self.storage)
+        return self._calendar
+
     def _load_stock_name_map(self):
         """從現有的 stock_list.json 載入股票名稱對應"""
         json_path = self.output_dir / "stock_list.json"
@@ -54,22 +138,18 @@ class TaiwanStockFetcher:
 
     def get_existing_data_info(self):
         """
-        獲取現有資料資訊
+        獲取現有資料資訊（讀取資料集清單，不掃描資料）
         返回: (是否存在, 最早日期, 最晚日期, 記錄數)
         """
-        if not self.csv_path.exists():
+        if not self.storage.exists():
             return False, None, None, 0
 
         try:
-            df = pd.read_csv(self.csv_path, usecols=['date'])
-            if df.empty:
+            manifest = self.storage.load_manifest()
+            if manifest.is_empty:
                 return False, None, None, 0
 
-            dates = pd.to_datetime(df['date']).sort_values()
-            earliest = dates.min().strftime('%Y-%m-%d')
-            latest = dates.max().strftime('%Y-%m-%d')
-            count = len(df)
-            return True, earliest, latest, count
+            return True, manifest.min_date, manifest.max_date, manifest.row_count
 
         except Exception as e:
             print(f"⚠️  讀取現有資料失敗: {e}")
@@ -266,82 +346,767 @@ class TaiwanStockFetcher:
 
         print(f"✓ 股票列表已儲存到: {json_path}")
 
-    def fetch_stock_data(self, stock_id, start_date, end_date):
-        """獲取單一股票的歷史資料"""
+    def _clean_response(self, df):
+        """將 API 回應轉為統一的欄位格式"""
+        import pandas as pd
+
+        return pd.DataFrame({
+            'date': pd.to_datetime(df['date']).dt.strftime('%Y-%m-%d'),
+            'stock_id': df['stock_id'],
+            'stock_name': df['stock_id'].map(self.stock_name_map).fillna(''),
+            'open': df['open'],
+            'high': df['max'],
+            'low': df['min'],
+            'close': df['close'],
+            'volume': df['Trading_Volume']
+        })
+
+    def _request_daily(self, stock_id, start_date, end_date):
+        """
+        呼叫 taiwan_stock_daily（stock_id 為空字串時為全市場），先查回應快取；
+        只有實際發出的請求才受速率限制
+        """
+        if self.cache is not None:
+            df = self.cache.get("taiwan_stock_daily", stock_id, start_date, end_date)
+            if df is not None:
+                return df
+
+        limiter = self.rate_limiter or self._batch_limiter
+        if limiter is not None:
+            limiter.acquire()
+
+        df = self.api.taiwan_stock_daily(stock_id=stock_id, start_date=start_date, end_date=end_date)
+
+        # 空回應可能是資料尚未公布，不快取
+        if self.cache is not None and df is not None and not df.empty:
+            try:
+                self.cache.put("taiwan_stock_daily", stock_id, start_date, end_date, df)
+            except OSError as e:
+                print(f"⚠️  寫入回應快取失敗: {e}")
+        return df
+
+    def _report_cache_stats(self):
+        """列印並累計回應快取的命中統計"""
+        if self.cache is None:
+            return
+        hits, misses = self.cache.stats["hits"], self.cache.stats["misses"]
+        if hits + misses == 0:
+            return
+        print(f"\n🗄️  回應快取: 命中 {hits} | 未命中 {misses}（命中率 {hits / (hits + misses) * 100:.1f}%）")
         try:
-            df = self.api.taiwan_stock_daily(
-                stock_id=stock_id,
-                start_date=start_date,
-                end_date=end_date
-            )
+            self.cache.save_stats()
+        except OSError as e:
+            print(f"⚠️  儲存快取統計失敗: {e}")
+
+    def fetch_stock_data(self, stock_id, start_date, end_date, raise_errors=False):
+        """
+        獲取單一股票的歷史資料
+
+        Args:
+            raise_errors: 請求失敗時拋出例外（預設返回 None），以便與查無資料區分
+        """
+        try:
+            df = self._request_daily(stock_id, start_date, end_date)
 
             if df is not None and not df.empty:
-                # 獲取股票名稱
-                stock_name = self.stock_name_map.get(stock_id, '')
-
-                df_clean = pd.DataFrame({
-                    'date': pd.to_datetime(df['date']).dt.strftime('%Y-%m-%d'),
-                    'stock_id': df['stock_id'],
-                    'stock_name': stock_name,
-                    'open': df['open'],
-                    'high': df['max'],
-                    'low': df['min'],
-                    'close': df['close'],
-                    'volume': df['Trading_Volume']
-                })
-                return df_clean
+                return self._clean_response(df)
             else:
                 return None
 
         except Exception:
+            if raise_errors:
+                raise
+            return None
+
+    def fetch_market_data(self, date, stock_ids=None):
+        """
+        以單次請求獲取全市場某一天的資料（不指定 stock_id）
+
+        Args:
+            date: 日期 'YYYY-MM-DD'
+            stock_ids: 只保留這些股票（None 表示全部保留）
+
+        Returns:
+            DataFrame 或 None（休市日）；請求失敗時拋出例外，
+            以便與休市日區分（例如帳號等級不支援全市場查詢）
+        """
+        df = self._request_daily("", date, date)
+        if df is None or df.empty:
             return None
 
-    def fetch_batch(self, stock_list, start_date, end_date, delay=0.5):
-        """批次獲取股票資料"""
+        if stock_ids is not None:
+            df = df[df['stock_id'].isin(stock_ids)]
+            if df.empty:
+                return None
+        return self._clean_response(df).reset_index(drop=True)
+
+    def probe_session(self, date):
+        """
+        以少量請求確認某交易日的資料是否已公布
+
+        先以一次全市場請求探測（成功時資料會進入回應快取，之後依日期抓取可直接使用）；
+        帳號不支援全市場查詢時改為依序查詢 PROBE_STOCKS 中的權值股，任一支有資料即視為已公布
+
+        Returns:
+            bool: 資料是否已公布
+        """
+        try:
+            return self.fetch_market_data(date) is not None
+        except Exception as e:
+            if classify_error(e) == ERROR_QUOTA:
+                raise
+
+        for stock_id in self.PROBE_STOCKS:
+            if self.fetch_stock_data(stock_id, date, date, raise_errors=True) is not None:
+                return True
+        return False
+
+    def request_stop(self):
+        """
+        要求停止抓取（可由其他執行緒或 signal handler 呼叫）
+
+        進行中的請求完成並寫出後結束目前的批次，之後的批次也不再發出請求；
+        未完成的請求留在抓取日誌中，下次執行時續抓
+        """
+        self._stop_event.set()
+        controller = self._controller
+        if controller is not None:
+            controller.stop()
+
+    @staticmethod
+    def request_key(request):
+        """請求 (stock_id, start_date, end_date) 在抓取日誌中的識別字串（全市場請求以 * 表示）"""
+        stock_id, start_date, end_date = request
+        return f"{stock_id or '*'}:{start_date}:{end_date}"
+
+    def _fetch_units(self, units, fetch_unit, on_result, delay, workers, label=str):
+        """
+        以執行緒池執行一組請求，依完成順序列印進度；結果不在此保留，
+        每個請求完成時即交給 on_result，記憶體用量不隨請求數增加
+
+        請求失敗時依錯誤類型處理：暫時性錯誤以帶抖動的指數退避重試（整批共用重試額度），
+        額度錯誤時暫停並降低速率，永久性錯誤不重試；並行數與速率以 AIMD 自動調整。
+        額度錯誤持續發生或收到停止要求（request_stop）時提前結束本批次；
+        第一輪結束後，因暫時性錯誤失敗的請求會以單一執行緒再重試一輪
+
+        Args:
+            units: 請求單位
+            fetch_unit: 單一請求函式，返回 DataFrame 或 None（查無資料），失敗時拋出例外
+            on_result: 請求成功（含查無資料）時以 (unit, DataFrame 或 None) 呼叫（於目前執行緒）
+            delay: 未設定速率上限時，整體請求速率不超過每 delay 秒一次
+            label: 進度列印時單位的顯示方式
+
+        Returns:
+            tuple: (取得資料數, 無資料或失敗數, 仍失敗的 [(unit, 例外), ...])
+        """
+        # 未設定共用速率上限時，以 delay 換算本批次的速率上限（快取命中不受限）
+        if self.rate_limiter is None and delay > 0:
+            self._batch_limiter = TokenBucket(1.0 / delay, capacity=1)
+        limiter = self.rate_limiter or self._batch_limiter
+        controller = AimdController(
+            workers, limiter, max_rate=self._configured_rate if limiter is self.rate_limiter else None
+        )
+        self._controller = controller
+        if self._stop_event.is_set():
+            controller.stop()
+        success_count = 0
+
+        def fetch_with_retry(unit, policy):
+            for attempt in range(policy.max_attempts):
+                controller.acquire()
+                try:
+                    df = fetch_unit(unit)
+                    controller.on_success()
+                    return df
+                except Exception as e:
+                    error = e
+                    kind = classify_error(e)
+                    retry = controller.on_error(kind)
+                finally:
+                    controller.release()
+
+                if not retry or attempt + 1 >= policy.max_attempts or not policy.take():
+                    break
+                if kind != ERROR_QUOTA:  # 額度錯誤由 controller 的冷卻時間控制等待
+                    time.sleep(policy.backoff(attempt))
+            raise error
+
+        def run_pass(pass_units, pass_workers, policy):
+            nonlocal success_count
+            total = len(pass_units)
+            errors = []
+            executor = ThreadPoolExecutor(max_workers=pass_workers)
+            try:
+                futures = {
+                    executor.submit(fetch_with_retry, unit, policy): pos
+                    for pos, unit in enumerate(pass_units)
+                }
+
+                for idx, future in enumerate(as_completed(futures), 1):
+                    pos = futures.pop(future)  # 釋放已完成請求的結果
+                    try:
+                        df = future.result()
+                    except Exception as e:
+                        errors.append((pass_units[pos], e))
+                        df = None
+                        status = f"✗ {ERROR_LABELS[classify_error(e)]}"
+                    else:
+                        on_result(pass_units[pos], df)
+                        status = f"✓ {len(df)} 條" if df is not None and not df.empty else "✗"
+
+                    percentage = (idx / total) * 100
+                    print(f"[{idx}/{total}] ({percentage:.1f}%) {label(pass_units[pos])} {status}")
+
+                    if df is not None and not df.empty:
+                        success_count += 1
+
+                    if idx % 50 == 0:
+                        print(f"\n   進度統計: 成功 {success_count} | 失敗 {idx - success_count}\n")
+
+                    if controller.aborted or controller.stopped:
+                        break
+
+                if controller.stopped and futures:
+                    print(f"\n🛑 收到停止要求，停止本批次（剩餘 {len(futures)} 個請求留待下次執行）")
+                    for pos in futures.values():
+                        errors.append((pass_units[pos], FetchStoppedError()))
+                elif controller.aborted and futures:
+                    print(f"\n🛑 API 額度已用盡，停止本批次（剩餘 {len(futures)} 個請求留待下次執行）")
+                    for pos in futures.values():
+                        errors.append((pass_units[pos], QuotaExhaustedError()))
+            finally:
+                executor.shutdown(wait=False, cancel_futures=True)
+            return errors
+
+        try:
+            errors = run_pass(units, workers, RetryPolicy.for_batch(len(units)))
+
+            # 針對暫時性錯誤再重試一輪
+            retry_units = [unit for unit, e in errors if classify_error(e) == ERROR_TRANSIENT]
+            if retry_units and not controller.aborted and not controller.stopped:
+                print(f"\n🔁 重試 {len(retry_units)} 個暫時性錯誤的請求...\n")
+                retried = set(retry_units)
+                errors = [(unit, e) for unit, e in errors if unit not in retried]
+                errors += run_pass(retry_units, 1, RetryPolicy(max_attempts=2, budget=len(retry_units)))
+        finally:
+            self._batch_limiter = None
+            self._controller = None
+
+        self._report_cache_stats()
+        return success_count, len(units) - success_count, errors
+
+    def _stream_requests(self, requests, on_result, delay, workers, stock_ids=None, run=None,
+                         show_range=False):
+        """
+        執行一組請求 (stock_id, start_date, end_date)，stock_id 為空字串時為全市場單日請求
+
+        Args:
+            stock_ids: 全市場請求時只保留這些股票
+            run: 抓取日誌紀錄，已完成的請求會被略過
+            show_range: 進度列印時顯示各請求的日期區間
+
+        Returns:
+            tuple: 同 _fetch_units
+        """
+        if run is not None:
+            remaining = [request for request in requests if not run.is_done(self.request_key(request))]
+            if len(remaining) < len(requests):
+                print(f"⏭️  略過上次已完成的 {len(requests) - len(remaining)} 個請求，剩餘 {len(remaining)} 個\n")
+            requests = remaining
+
+        # 略過近期確認查無資料的股票（暫停交易、下市等）
+        known_empty = [request for request in requests if request[0] and self.negative_cache.should_skip(*request)]
+        if known_empty:
+            skipped = set(known_empty)
+            requests = [request for request in requests if request not in skipped]
+            print(f"⏭️  略過 {len(known_empty)} 個近期查無資料的股票請求\n")
+
+        empty_requests = []
+        got_data = False
+        closed_dates = []  # 全市場請求成功但沒有任何資料的日期
+        session_dates = []  # 全市場請求有資料的日期
+
+        def handle_result(request, df):
+            nonlocal got_data
+            stock_id = request[0]
+            if stock_id:
+                if df is None or df.empty:
+                    empty_requests.append(request)
+                else:
+                    got_data = True
+                    self.negative_cache.clear(stock_id)
+            on_result(request, df)
+
+        def fetch_request(request):
+            stock_id, start_date, end_date = request
+            if stock_id:
+                return self.fetch_stock_data(stock_id, start_date, end_date, raise_errors=True)
+            df = self.fetch_market_data(start_date)
+            if df is None:
+                closed_dates.append(start_date)
+                return None
+            session_dates.append(start_date)
+            if stock_ids is not None:
+                df = df[df['stock_id'].isin(stock_ids)].reset_index(drop=True)
+            return df if not df.empty else None
+
+        def label(request):
+            stock_id, start_date, end_date = request
+            if not stock_id:
+                return start_date
+            if show_range:
+                return f"{stock_id} ({start_date} ~ {end_date})"
+            return stock_id
+
+        try:
+            return self._fetch_units(requests, fetch_request, handle_result, delay, workers, label)
+        finally:
+            self._record_empty(empty_requests, got_data, len(known_empty))
+            self._record_closures(closed_dates, session_dates)
+
+    def _record_empty(self, empty_requests, got_data, skipped):
+        """
+        記錄查無資料的依股票請求
+
+        同一批次有其他股票取得資料時才記錄，整批皆無資料多半是休市日或資料尚未公布
+        """
+        recorded = 0
+        if got_data:
+            for request in empty_requests:
+                self.negative_cache.record_empty(*request)
+            recorded = len(empty_requests)
+        if empty_requests or skipped or self.negative_cache.entries:
+            try:
+                self.negative_cache.save()
+            except OSError as e:
+                print(f"⚠️  儲存查無資料紀錄失敗: {e}")
+        self.empty_stats = (len(empty_requests), recorded, skipped)
+
+    def _record_closures(self, closed_dates, session_dates):
+        """
+        記錄全市場請求沒有任何資料的日期為休市
+
+        只記錄早於已有資料的交易日（資料集或本批次）的日期，
+        最新日期的空結果可能只是資料尚未公布
+        """
+        latest = max(session_dates + [self.storage.load_manifest().max_date or ''])
+        closures = [date for date in closed_dates if date < latest]
+        if closures:
+            from core.trading_calendar import record_closures
+
+            record_closures(self.storage, closures)
+            self._calendar = None
+
+    def _print_fetch_header(self, title, workers):
+        """列印批次獲取標題"""
         print(f"\n{'='*70}")
-        print(f"📥 開始獲取資料: {start_date} 至 {end_date}")
+        print(title)
+        if workers > 1:
+            print(f"   併發執行緒: {workers}")
         print(f"{'='*70}\n")
 
-        all_data = []
-        total = len(stock_list)
-        success_count = 0
-        fail_count = 0
+    def _report_errors(self, errors, total):
+        """
+        列印仍失敗的請求（依錯誤類型分組）
 
-        for idx, stock_id in enumerate(stock_list, 1):
-            percentage = (idx / total) * 100
-            print(f"[{idx}/{total}] ({percentage:.1f}%) {stock_id} ", end='', flush=True)
+        Returns:
+            bool: 是否所有請求都因非額度錯誤失敗（例如帳號等級不支援全市場查詢），
+                  此時改用另一種請求方式才有意義（收到停止要求時不改用）
+        """
+        if not errors:
+            return False
 
-            df = self.fetch_stock_data(stock_id, start_date, end_date)
+        by_kind = {}
+        for request, error in errors:
+            by_kind.setdefault(classify_error(error), []).append((request, error))
 
-            if df is not None and not df.empty:
-                all_data.append(df)
-                success_count += 1
-                print(f"✓ {len(df)} 條")
-            else:
-                fail_count += 1
-                print("✗")
+        print(f"\n⚠️  {len(errors)}/{total} 個請求失敗")
+        for kind, items in by_kind.items():
+            request, error = items[0]
+            keys = ", ".join(self.request_key(r) for r, _ in items[:5])
+            more = f" ... 等 {len(items)} 個" if len(items) > 5 else ""
+            print(f"   {ERROR_LABELS[kind]}: {keys}{more}（{type(error).__name__}: {error}）")
 
-            if idx < total:
-                time.sleep(delay)
+        return len(errors) == total and ERROR_QUOTA not in by_kind and ERROR_STOPPED not in by_kind
 
-            if idx % 50 == 0:
-                print(f"\n   進度統計: 成功 {success_count} | 失敗 {fail_count}\n")
+    def fetch_batch(self, stock_list, start_date, end_date, delay=0.5, workers=None):
+        """
+        批次獲取股票資料（依股票逐一請求）
+
+        Args:
+            delay: 未設定速率上限時，整體請求速率不超過每 delay 秒一次
+            workers: 同時請求的執行緒數（預設使用初始化時的設定）
+        """
+        import pandas as pd
+
+        workers = workers or self.workers
+        self._print_fetch_header(f"📥 開始獲取資料: {start_date} 至 {end_date}", workers)
+
+        results = {}
+        requests = [(stock_id, start_date, end_date) for stock_id in stock_list]
+        success_count, fail_count, _ = self._stream_requests(
+            requests, lambda request, df: results.__setitem__(request[0], df), delay, workers
+        )
+
+        # 依股票列表順序合併，輸出與逐一獲取時相同
+        all_data = [results[stock_id] for stock_id in stock_list if results.get(stock_id) is not None]
 
         if all_data:
             final_df = pd.concat(all_data, ignore_index=True)
-            self._print_batch_summary(final_df, success_count, fail_count, total)
+            self._print_batch_summary(len(final_df), success_count, fail_count, len(stock_list))
             return final_df
         else:
             print("\n❌ 未獲取到任何資料")
             return pd.DataFrame()
 
-    def _print_batch_summary(self, df, success_count, fail_count, total):
-        """列印批次獲取摘要"""
+    def fetch_by_date(self, stock_list, dates, delay=0.5, workers=None):
+        """
+        依日期批次獲取全市場資料，只保留 stock_list 中的股票
+
+        所有日期的請求都失敗時（例如帳號等級不支援全市場查詢）返回 None，
+        由呼叫端改用依股票請求
+
+        Args:
+            dates: 日期列表 'YYYY-MM-DD'
+        """
+        import pandas as pd
+
+        workers = workers or self.workers
+        self._print_fetch_header(
+            f"📥 開始依日期獲取全市場資料: {dates[0]} 至 {dates[-1]}（{len(dates)} 天）", workers
+        )
+
+        results = {}
+        requests = [("", date, date) for date in dates]
+        success_count, _, errors = self._stream_requests(
+            requests, lambda request, df: results.__setitem__(request[1], df), delay, workers,
+            stock_ids=set(stock_list)
+        )
+        if self._report_errors(errors, len(requests)):
+            return None
+
+        all_data = [results[date] for date in dates if results.get(date) is not None]
+
+        if all_data:
+            final_df = pd.concat(all_data, ignore_index=True)
+            self._print_stock_summary(len(final_df), final_df['stock_id'], stock_list, (success_count, len(dates)))
+            return final_df
+        else:
+            print("\n❌ 未獲取到任何資料（可能皆為休市日）")
+            return pd.DataFrame()
+
+    def fetch_range(self, stock_list, start_date, end_date, delay=0.5, workers=None, mode=None):
+        """
+        依成本模型選擇依日期或依股票請求，獲取日期範圍內的資料
+
+        補齊最近幾天時依日期（全市場）請求，請求數約為天數；
+        回補長期歷史時依股票請求。依日期請求不可用時自動改用依股票
+
+        Args:
+            mode: 'auto' / 'by_date' / 'by_stock'（預設使用初始化時的設定）
+        """
+        import pandas as pd
+        from core.fetch_planner import MODE_BY_DATE, plan_fetch
+
+        plan = plan_fetch(stock_list, start_date, end_date, mode or self.fetch_mode, self.calendar)
+        if not plan.units:
+            print("ℹ️  範圍內沒有交易日")
+            return pd.DataFrame()
+        print(f"🧭 抓取方式: {plan.describe()}")
+
+        if plan.mode == MODE_BY_DATE:
+            df = self.fetch_by_date(stock_list, plan.units, delay=delay, workers=workers)
+            if df is not None:
+                return df
+            print("↩️  改用依股票請求...")
+
+        return self.fetch_batch(stock_list, start_date, end_date, delay=delay, workers=workers)
+
+    def _open_writer(self, spill_rows=None, run=None):
+        """建立串流寫入器；指定 run 時，請求的資料寫出後才在抓取日誌中標記完成"""
+        from core.stream_writer import StreamingWriter
+
+        spill_rows = spill_rows or int(os.getenv('STOCK_SPILL_ROWS') or 50_000)
+        on_flushed = None
+        if run is not None:
+            on_flushed = lambda requests: run.mark_done([self.request_key(r) for r in requests])
+        return StreamingWriter(self._append_segment, spill_rows=spill_rows, on_flushed=on_flushed)
+
+    def fetch_and_store(self, stock_list, start_date, end_date, delay=0.5, workers=None,
+                        mode=None, spill_rows=None, task=None):
+        """
+        串流抓取並儲存：抓取結果累積到 spill_rows 筆即由背景執行緒寫成資料段，
+        抓取與寫入同時進行，記憶體用量不隨日期範圍或股票數增加；
+        中途失敗或中斷時，已抓取的資料仍會寫出
+
+        指定 task 時記錄抓取日誌：每個請求的資料寫出後才標記完成，以相同參數
+        重新執行（或 resume_unfinished）只會補抓未完成的請求；全部完成才移除紀錄
+
+        Args:
+            spill_rows: 每個資料段的記錄數上限（預設讀取 STOCK_SPILL_ROWS，未設定為 50,000）
+            task: 抓取日誌的任務名稱（例如 'latest', 'past'）
+
+        Returns:
+            tuple: (寫入的記錄數, 前幾筆記錄的預覽 DataFrame)
+        """
+        import pandas as pd
+        from core.fetch_planner import MODE_BY_DATE, plan_fetch
+
+        workers = workers or self.workers
+        run_key = f"{task}:{start_date}:{end_date}"
+
+        # 續抓時沿用上次的抓取方式，已完成的請求才能對應得上
+        previous_run = self.journal.runs.get(run_key) if task is not None else None
+        if mode is None and previous_run is not None:
+            mode = previous_run.params.get("mode")
+
+        plan = plan_fetch(stock_list, start_date, end_date, mode or self.fetch_mode, self.calendar)
+        if not plan.units:
+            print("ℹ️  範圍內沒有交易日")
+            return 0, pd.DataFrame()
+        print(f"🧭 抓取方式: {plan.describe()}")
+
+        run = None
+        if task is not None:
+            run = self.journal.open_run(
+                run_key, task=task, start_date=start_date, end_date=end_date, mode=plan.mode
+            )
+
+        writer = self._open_writer(spill_rows, run)
+        fetched_stocks = set()
+        errors = []
+
+        def on_result(request, df):
+            if df is not None:
+                fetched_stocks.update(df['stock_id'].unique())
+            writer.add(df, request)
+
+        try:
+            date_count = None
+            if plan.mode == MODE_BY_DATE:
+                self._print_fetch_header(
+                    f"📥 開始依日期獲取全市場資料: {plan.units[0]} 至 {plan.units[-1]}（{len(plan.units)} 天）",
+                    workers
+                )
+                requests = [("", date, date) for date in plan.units]
+                date_count, _, errors = self._stream_requests(
+                    requests, on_result, delay, workers, stock_ids=set(stock_list), run=run
+                )
+                if self._report_errors(errors, len(requests)):
+                    date_count = None
+                    print("↩️  改用依股票請求...")
+
+            if plan.mode != MODE_BY_DATE or date_count is None:
+                self._print_fetch_header(f"📥 開始獲取資料: {start_date} 至 {end_date}", workers)
+                requests = [(stock_id, start_date, end_date) for stock_id in stock_list]
+                _, _, errors = self._stream_requests(requests, on_result, delay, workers, run=run)
+                self._report_errors(errors, len(requests))
+        finally:
+            writer.close()
+
+        if run is not None:
+            if errors:
+                print(f"📝 已記錄抓取進度，下次執行時只補抓未完成的 {len(errors)} 個請求")
+            else:
+                run.finish()
+
+        if writer.row_count == 0:
+            print("\n❌ 未獲取到任何資料")
+            return 0, pd.DataFrame()
+
+        self._print_stock_summary(
+            writer.row_count, fetched_stocks, stock_list,
+            (date_count, len(plan.units)) if date_count is not None else None
+        )
+        print(f"💾 共寫入 {writer.segment_count} 個資料段")
+        self._print_save_summary()
+        return writer.row_count, writer.preview
+
+    def fetch_requests_and_store(self, requests, delay=0.5, workers=None, spill_rows=None, task=None,
+                                 stock_ids=None, fallback=None):
+        """
+        串流執行任意一組請求 [(stock_id, start_date, end_date), ...] 並儲存
+        （例如補齊缺漏的日期區間），抓取日誌與中斷續抓的行為同 fetch_and_store
+
+        全市場請求因額度以外的原因失敗時（例如帳號等級不支援全市場查詢），
+        同 fetch_and_store 改用依股票請求：以 fallback(失敗的日期列表) 取得替代的依股票請求並執行
+
+        Args:
+            stock_ids: stock_id 為空字串的全市場請求只保留這些股票
+            fallback: 返回替代請求的函式（None 表示不改用）
+
+        Returns:
+            tuple: (寫入的記錄數, 取得資料的請求數, 無資料或失敗的請求數)
+        """
+        workers = workers or self.workers
+        run = self.journal.open_run(task, task=task) if task is not None else None
+
+        self._print_fetch_header(f"📥 開始獲取 {len(requests)} 個請求", workers)
+        writer = self._open_writer(spill_rows, run)
+        on_result = lambda request, df: writer.add(df, request)
+        try:
+            success_count, fail_count, errors = self._stream_requests(
+                requests, on_result, delay, workers, stock_ids=stock_ids, run=run, show_range=True
+            )
+            self._report_errors(errors, len(requests))
+
+            failed_dates = [
+                request[1] for request, error in errors
+                if not request[0] and classify_error(error) not in (ERROR_QUOTA, ERROR_STOPPED)
+            ]
+            if fallback is not None and failed_dates:
+                fallback_requests = fallback(sorted(failed_dates))
+                print(f"↩️  {len(failed_dates)} 個全市場請求失敗，改用 {len(fallback_requests)} 個依股票請求...")
+                failed = set(failed_dates)
+                errors = [(request, error) for request, error in errors if request[0] or request[1] not in failed]
+                fail_count -= len(failed_dates)
+                if fallback_requests:
+                    self._print_fetch_header(f"📥 開始獲取 {len(fallback_requests)} 個請求", workers)
+                    more_success, more_fail, more_errors = self._stream_requests(
+                        fallback_requests, on_result, delay, workers, run=run, show_range=True
+                    )
+                    self._report_errors(more_errors, len(fallback_requests))
+                    success_count += more_success
+                    fail_count += more_fail
+                    errors += more_errors
+        finally:
+            writer.close()
+
+        if run is not None:
+            if errors:
+                print(f"📝 已記錄抓取進度，下次執行時只補抓未完成的 {len(errors)} 個請求")
+            else:
+                run.finish()
+
+        if writer.row_count:
+            print(f"💾 共寫入 {writer.segment_count} 個資料段")
+            self._print_save_summary()
+        return writer.row_count, success_count, fail_count
+
+    def update_latest(self, today_str, delay=0.2):
+        """
+        每日更新：續抓上次未完成的批次，再補齊到今天之前的最後一個交易日
+
+        最新交易日的資料尚未公布時（依探測結果）只抓到前一個交易日；
+        沒有現有資料時抓取最近 30 天
+
+        Returns:
+            int: 寫入的記錄數
+        """
+        # 預期的最新資料日期：今天之前的最後一個交易日（週末與休市日依交易日曆）
+        expected_latest = self.calendar.prev_session(today_str)
+        total_new = 0
+
+        # 續抓上次被中斷的批次（依抓取日誌，只補抓未完成的請求）
+        if self.journal.unfinished('latest'):
+            stock_list = self.get_stock_list()
+            if not stock_list:
+                raise Exception("無法獲取股票列表")
+            total_new += self.resume_unfinished('latest', stock_list, delay=delay)
+
+        # 檢查現有資料
+        exists, earliest, latest, count = self.get_existing_data_info()
+
+        if exists and latest:
+            print(f"📂 現有資料: {earliest} ~ {latest} ({count:,} 筆)")
+
+            # 計算需要抓取的日期範圍
+            latest_date = datetime.strptime(latest, '%Y-%m-%d')
+            expected_date = datetime.strptime(expected_latest, '%Y-%m-%d')
+
+            if latest_date >= expected_date:
+                print(f"✓ 資料已是最新（{latest}），無需抓取\n")
+            else:
+                # 需要抓取的起始日期 = 最新日期 + 1 天
+                fetch_start = (latest_date + timedelta(days=1)).strftime('%Y-%m-%d')
+                fetch_end = expected_latest
+
+                # 先以少量請求確認最新交易日的資料已公布，避免整批請求都落空
+                print(f"🔎 探測 {expected_latest} 的資料是否已公布...")
+                published = self.probe_session(expected_latest)
+                wait_minutes = record_probe(self.output_dir, expected_latest, published, today_str)
+                if not published:
+                    # 只抓到前一個交易日為止；沒有更早的缺口時本次不抓取
+                    fetch_end = self.calendar.prev_session(expected_latest)
+                    print(f"⏳ {expected_latest} 的資料尚未公布，{wait_minutes} 分鐘後再探測\n")
+                else:
+                    print(f"✓ {expected_latest} 的資料已公布\n")
+
+            if latest_date < expected_date and fetch_start <= fetch_end:
+                days_gap = self.calendar.session_count(fetch_start, fetch_end)
+                print(f"📥 需補齊 {days_gap} 個交易日資料: {fetch_start} ~ {fetch_end}\n")
+
+                # 獲取股票列表
+                print("📝 獲取股票列表...")
+                stock_list = self.get_stock_list()
+                if not stock_list:
+                    raise Exception("無法獲取股票列表")
+                print(f"✓ 共 {len(stock_list)} 檔股票\n")
+
+                # 抓取並串流寫入資料
+                new_rows, preview_df = self.fetch_and_store(
+                    stock_list, fetch_start, fetch_end, delay=delay, task='latest'
+                )
+                total_new += new_rows
+
+                if new_rows:
+                    print(f"✓ 獲取到 {new_rows} 筆資料\n")
+                    self.show_preview(preview_df, n=5)
+                else:
+                    print("⚠️  未獲取到資料（可能是休市日）\n")
+        else:
+            print("📂 無現有資料，抓取最近 30 天...\n")
+            fetch_start = (datetime.strptime(today_str, '%Y-%m-%d') - timedelta(days=30)).strftime('%Y-%m-%d')
+            fetch_end = expected_latest
+
+            # 獲取股票列表
+            print("📝 獲取股票列表...")
+            stock_list = self.get_stock_list()
+            if not stock_list:
+                raise Exception("無法獲取股票列表")
+            print(f"✓ 共 {len(stock_list)} 檔股票\n")
+
+            # 抓取並串流寫入資料
+            new_rows, _ = self.fetch_and_store(stock_list, fetch_start, fetch_end, delay=delay, task='latest')
+            total_new += new_rows
+
+        return total_new
+
+    def resume_unfinished(self, task, stock_list, delay=0.5, workers=None):
+        """
+        續抓某任務上次未完成的批次（依抓取日誌）
+
+        Returns:
+            int: 寫入的記錄數
+        """
+        total = 0
+        for run in self.journal.unfinished(task):
+            start_date, end_date = run.params["start_date"], run.params["end_date"]
+            print(f"🔁 續抓上次未完成的批次: {start_date} ~ {end_date}（已完成 {len(run.done)} 個請求）")
+            rows, _ = self.fetch_and_store(stock_list, start_date, end_date, delay=delay,
+                                           workers=workers, task=task)
+            total += rows
+        return total
+
+    def _print_stock_summary(self, row_count, fetched_stock_ids, stock_list, date_count=None):
+        """依實際取得資料的股票列印摘要"""
+        success_count = len(set(fetched_stock_ids) & set(stock_list))
+        self._print_batch_summary(
+            row_count, success_count, len(stock_list) - success_count, len(stock_list), date_count
+        )
+
+    def _print_batch_summary(self, row_count, success_count, fail_count, total, date_count=None):
+        """列印批次獲取摘要（date_count: 依日期請求時的 (有資料天數, 請求天數)）"""
         print(f"\n{'='*70}")
         print(f"✓ 本次獲取完成")
-        print(f"  新增記錄: {len(df):,} 條")
+        print(f"  新增記錄: {row_count:,} 條")
+        if date_count is not None:
+            print(f"  交易日數: {date_count[0]}/{date_count[1]}")
         print(f"  成功股票: {success_count}/{total}")
         print(f"  失敗股票: {fail_count}/{total}")
+        if self.empty_stats is not None and any(self.empty_stats):
+            empty, recorded, skipped = self.empty_stats
+            print(f"  查無資料: {empty} 個請求（記錄 {recorded} 個）| 略過近期查無資料: {skipped} 個")
         print(f"{'='*70}\n")
 
     def merge_and_save(self, new_df):
@@ -350,64 +1115,31 @@ class TaiwanStockFetcher:
             print("⚠️  沒有新資料需要儲存")
             return
 
-        if self.csv_path.exists():
-            print("📂 正在讀取現有資料...")
-            existing_df = pd.read_csv(self.csv_path, dtype={'stock_id': str})
-            print(f"   現有記錄: {len(existing_df):,} 條")
-
-            # 為舊資料填充缺失的 stock_name
-            if 'stock_name' not in existing_df.columns:
-                existing_df['stock_name'] = ''
-
-            # 填充空的 stock_name
-            mask = existing_df['stock_name'].isna() | (existing_df['stock_name'] == '')
-            if mask.any():
-                existing_df.loc[mask, 'stock_name'] = existing_df.loc[mask, 'stock_id'].map(
-                    self.stock_name_map
-                ).fillna('')
-
-            print("🔄 合併新舊資料...")
-            combined_df = pd.concat([existing_df, new_df], ignore_index=True)
-
-            # 填充所有空的 stock_name
-            mask = combined_df['stock_name'].isna() | (combined_df['stock_name'] == '')
-            if mask.any():
-                combined_df.loc[mask, 'stock_name'] = combined_df.loc[mask, 'stock_id'].map(
-                    self.stock_name_map
-                ).fillna('')
-
-            print("🧹 去除重複記錄...")
-            combined_df = combined_df.drop_duplicates(
-                subset=['date', 'stock_id'],
-                keep='last'
-            )
-        else:
-            print("📝 建立新資料檔案...")
-            combined_df = new_df
-
-        print("📊 排序資料...")
-        combined_df = combined_df.sort_values(['date', 'stock_id']).reset_index(drop=True)
-
-        # 確保欄位順序正確
-        desired_columns = ['date', 'stock_id', 'stock_name', 'open', 'high', 'low', 'close', 'volume']
-        combined_df = combined_df[desired_columns]
+        self._append_segment(new_df)
+        self._print_save_summary()
 
-        print(f"💾 儲存到 {self.csv_path}...")
-        combined_df.to_csv(self.csv_path, index=False, encoding='utf-8-sig')
+    def _append_segment(self, df):
+        """寫入一個資料段，資料段數量達到門檻時執行 compaction"""
+        segment_path = self.storage.append(df, self.stock_name_map)
+        print(f"💾 已寫入資料段 {segment_path.name}（{len(df):,} 筆）")
 
-        self._print_save_summary(combined_df)
+        if self.storage.needs_compaction():
+            print("🗜️  資料段數量已達門檻，執行 compaction...")
+            compacted = self.storage.compact(self.stock_name_map)
+            print(f"✓ 已折疊 {compacted} 個資料段")
 
-    def _print_save_summary(self, df):
+    def _print_save_summary(self):
         """列印儲存摘要"""
-        file_size_mb = self.csv_path.stat().st_size / 1024 / 1024
-        date_range = f"{df['date'].min()} ~ {df['date'].max()}"
-        stock_count = df['stock_id'].nunique()
+        manifest = self.storage.load_manifest()
+        file_size_mb = self.storage.size_bytes() / 1024 / 1024
+        date_range = f"{manifest.min_date} ~ {manifest.max_date}"
+        stock_count = len(manifest.stocks)
 
         print(f"\n{'='*70}")
         print(f"✅ 資料已儲存")
-        print(f"   檔案路徑: {self.csv_path}")
+        print(f"   檔案路徑: {self.storage.location}")
         print(f"   檔案大小: {file_size_mb:.2f} MB")
-        print(f"   總記錄數: {len(df):,} 條")
+        print(f"   總記錄數: {manifest.row_count:,} 條")
         print(f"   股票數量: {stock_count} 支")
         print(f"   日期範圍: {date_range}")
         print(f"{'='*70}\n")
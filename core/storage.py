@@ -0,0 +1,767 @@
+"""
+臺股資料儲存後端
+提供可替換的儲存格式：
+- CsvStorage: 單一 taiwan_stocks.csv（相容舊格式）
+- ParquetStorage: 依年/月分區的壓縮欄式檔案，支援欄位與日期範圍裁剪讀取
+
+兩者共用 append-log + compaction 寫入路徑，每次寫入只需寫出新資料，
+並同步更新資料集清單（manifest），狀態查詢不必掃描資料
+
+讀取結果為型別化的 DataFrame：stock_id、stock_name 為類別型（每筆只佔一個整數代碼），
+date 維持 'YYYY-MM-DD' 字串（作為各模組共用的比較與合併鍵）
+"""
+
+import os
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from core.instruments import load_instruments
+from core.manifest import DatasetManifest
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+
+COLUMNS = ['date', 'stock_id', 'stock_name', 'open', 'high', 'low', 'close', 'volume']
+KEY_COLUMNS = ['date', 'stock_id']
+PRICE_COLUMNS = ['open', 'high', 'low', 'close']
+CATEGORY_COLUMNS = ['stock_id', 'stock_name']
+
+BACKEND_ENV = "STOCK_STORAGE_BACKEND"
+
+# CSV 直接解析為類別型，不必先建立每筆一個的字串物件
+CSV_DTYPES = {'stock_id': 'category', 'stock_name': 'category'}
+
+
+def to_typed(df):
+    """股票代號與名稱轉為類別型（類別依字典序排列，排序結果與字串相同）"""
+    for column in CATEGORY_COLUMNS:
+        if column not in df.columns:
+            continue
+        values = df[column]
+        if not isinstance(values.dtype, pd.CategoricalDtype):
+            df[column] = values.astype('category')
+        elif column == 'stock_id' and not values.cat.categories.is_monotonic_increasing:
+            df[column] = values.cat.reorder_categories(values.cat.categories.sort_values())
+    return df
+
+
+def concat_frames(frames):
+    """合併多個 DataFrame，類別型欄位的類別不同時先取聯集，避免退化為字串物件"""
+    frames = list(frames)
+    if len(frames) == 1:
+        return frames[0].reset_index(drop=True)
+
+    for column in CATEGORY_COLUMNS:
+        values = [frame[column] for frame in frames if column in frame.columns]
+        if not any(isinstance(v.dtype, pd.CategoricalDtype) for v in values):
+            continue
+        if len({v.dtype for v in values}) > 1:
+            categories = union_categoricals(
+                [v.astype('category') for v in values], sort_categories=True
+            ).categories
+            dtype = pd.CategoricalDtype(categories)
+            frames = [frame.astype({column: dtype}) if column in frame.columns else frame for frame in frames]
+    return pd.concat(frames, ignore_index=True)
+
+
+def fill_stock_names(df, stock_name_map=None):
+    """補齊空的 stock_name（缺欄位時新增）；類別型欄位只需檢查類別代碼"""
+    df = df.copy()
+    if 'stock_name' not in df.columns:
+        df['stock_name'] = ''
+
+    names = df['stock_name']
+    mask = names.isna() | (names == '')
+    if not mask.any():
+        return df
+
+    filled = pd.Series('', index=df.index[mask], dtype=object)
+    if stock_name_map:
+        filled = df.loc[mask, 'stock_id'].astype(str).map(stock_name_map).fillna('').astype(object)
+
+    if isinstance(names.dtype, pd.CategoricalDtype):
+        new_categories = pd.Index(pd.unique(filled)).difference(names.cat.categories)
+        if len(new_categories):
+            names = names.cat.add_categories(new_categories)
+        names = names.copy()
+        names[mask] = filled.to_numpy()
+        df['stock_name'] = names
+    else:
+        df.loc[mask, 'stock_name'] = filled
+        df['stock_name'] = df['stock_name'].fillna('')
+    return df
+
+
+def kway_merge(runs):
+    """
+    合併多個資料段，相同 (date, stock_id) 以較新的資料段為準（last-write-wins）
+
+    Args:
+        runs: 由舊到新排列的 DataFrame 列表，各自已依 (date, stock_id) 排序
+
+    將鍵編碼為單一整數後做穩定排序；timsort 會直接沿用各資料段既有的
+    排序區段，k 個區段的合併成本為 O(n log k)，實務上即線性的 k 路合併
+    """
+    runs = [run for run in runs if run is not None and not run.empty]
+    if not runs:
+        return pd.DataFrame(columns=COLUMNS)
+
+    combined = concat_frames(runs)
+
+    date_codes, _ = pd.factorize(combined['date'], sort=True)
+    stock_codes, stocks = pd.factorize(combined['stock_id'], sort=True)
+    keys = date_codes.astype(np.int64) * max(len(stocks), 1) + stock_codes
+
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+
+    # 相同鍵中只保留最後一筆（即最新資料段的那一筆）
+    keep = np.ones(len(order), dtype=bool)
+    keep[:-1] = sorted_keys[:-1] != sorted_keys[1:]
+
+    return combined.iloc[order[keep]].reset_index(drop=True)
+
+
+def merge_frames(existing_df, new_df, stock_name_map=None):
+    """
+    合併新舊資料（以 (date, stock_id) 去重，後寫入者為準）並依日期、代號排序
+
+    Args:
+        existing_df: 現有資料（可為 None）
+        new_df: 新資料
+        stock_name_map: 股票代號 -> 中文名稱對應，用於填充空的 stock_name
+    """
+    runs = [new_df] if existing_df is None else [existing_df, new_df]
+    runs = [fill_stock_names(run, stock_name_map) for run in runs if not run.empty]
+    return kway_merge(runs)[COLUMNS]
+
+
+def _filter_date_range(df, start_date=None, end_date=None):
+    """依日期範圍篩選（日期為 'YYYY-MM-DD' 字串，可直接比較）"""
+    if start_date:
+        df = df[df['date'] >= start_date]
+    if end_date:
+        df = df[df['date'] <= end_date]
+    return df
+
+
+def _filter_stock_ids(df, stock_ids=None):
+    """依股票代號篩選"""
+    if stock_ids is None:
+        return df
+    return df[df['stock_id'].isin(stock_ids)]
+
+
+def _date_filters(start=None, end=None):
+    """日期範圍轉為 Parquet 讀取條件（下推到 row group 統計值）"""
+    filters = []
+    if start:
+        filters.append(('date', '>=', start))
+    if end:
+        filters.append(('date', '<=', end))
+    return filters or None
+
+
+class StockStorage:
+    """
+    儲存後端基底類
+
+    寫入採用 append-log + compaction:
+    - append(): 每批新資料寫成一個已排序的小資料段（segment），成本只與新資料量相關
+    - read(): 讀取主資料並與所有資料段合併，相同鍵以較新的資料段為準
+    - compact(): 將資料段以 k 路合併折疊回主資料，並刪除資料段
+    """
+
+    name = None
+    SEGMENT_SUFFIX = None
+    COMPACT_SEGMENT_LIMIT = 16  # 資料段數量達到此值時應執行 compaction
+
+    def __init__(self, output_dir="data"):
+        self.output_dir = Path(output_dir)
+        self._write_listeners = []
+
+    def add_write_listener(self, callback):
+        """
+        註冊寫入監聽器，每次 append() 完成後以 callback(batch_df, manifest) 呼叫
+
+        用於增量維護衍生的索引與狀態檔；監聽器的錯誤不會影響已完成的寫入
+        """
+        self._write_listeners.append(callback)
+
+    @property
+    def location(self):
+        """資料實際存放位置（檔案或目錄）"""
+        raise NotImplementedError
+
+    @property
+    def segment_dir(self):
+        """資料段存放目錄"""
+        raise NotImplementedError
+
+    def _base_exists(self):
+        """主資料是否存在"""
+        raise NotImplementedError
+
+    def _read_base(self, columns=None, start_date=None, end_date=None, stock_ids=None):
+        """讀取主資料（需支援欄位、日期範圍與股票代號裁剪）"""
+        raise NotImplementedError
+
+    def _read_file(self, path, columns=None):
+        """讀取單一資料段檔案"""
+        raise NotImplementedError
+
+    def _write_file(self, path, df):
+        """寫入單一檔案（原子性）"""
+        raise NotImplementedError
+
+    def _compact_base(self, segment_df, stock_name_map=None):
+        """將已合併的資料段併入主資料，返回重寫過的檔案列表"""
+        raise NotImplementedError
+
+    def _base_size_bytes(self):
+        """主資料佔用的磁碟空間"""
+        raise NotImplementedError
+
+    def _base_files(self):
+        """主資料的所有檔案"""
+        raise NotImplementedError
+
+    @property
+    def manifest_path(self):
+        """資料集清單檔案位置"""
+        raise NotImplementedError
+
+    def data_files(self):
+        """所有資料檔（主資料與資料段）"""
+        return list(self._base_files()) + self.list_segments()
+
+    def load_manifest(self):
+        """
+        載入資料集清單
+
+        清單不存在或與磁碟上的資料檔不一致（例如被外部修改）時，
+        掃描 (date, stock_id) 重建一次並儲存
+        """
+        manifest = DatasetManifest.load(self.manifest_path)
+        files = self.data_files()
+        if manifest is not None and manifest.matches_files(self.output_dir, files):
+            return manifest
+
+        print("🔍 重建資料集清單...")
+        version = manifest.version if manifest is not None else 0
+        manifest = DatasetManifest(self.manifest_path)
+        manifest.data["version"] = version + 1
+        manifest.rebuild_stats(self.read(columns=KEY_COLUMNS))
+        manifest.set_files(self.output_dir, files)
+        manifest.save()
+        return manifest
+
+    def exists(self):
+        """是否已有資料"""
+        return self._base_exists() or bool(self.list_segments())
+
+    def list_segments(self):
+        """依寫入順序（由舊到新）列出所有資料段"""
+        if not self.segment_dir.exists():
+            return []
+        return sorted(self.segment_dir.glob(f"seg-*{self.SEGMENT_SUFFIX}"))
+
+    def _next_segment_path(self):
+        segments = self.list_segments()
+        seq = int(segments[-1].name[4:10]) + 1 if segments else 1
+        return self.segment_dir / f"seg-{seq:06d}{self.SEGMENT_SUFFIX}"
+
+    def read(self, columns=None, start_date=None, end_date=None, stock_ids=None):
+        """
+        讀取資料
+
+        Args:
+            columns: 需要的欄位（None 表示全部）
+            start_date: 起始日期 'YYYY-MM-DD'（含）
+            end_date: 結束日期 'YYYY-MM-DD'（含）
+            stock_ids: 需要的股票代號（None 表示全部）
+        """
+        if stock_ids is not None:
+            stock_ids = sorted({str(stock_id) for stock_id in stock_ids})
+
+        segments = self.list_segments()
+        if not segments:
+            return self._read_base(columns, start_date, end_date, stock_ids)
+
+        # 合併資料段時需要鍵欄位
+        read_columns = None
+        if columns is not None:
+            read_columns = list(dict.fromkeys(KEY_COLUMNS + list(columns)))
+
+        runs = [self._read_base(read_columns, start_date, end_date, stock_ids)]
+        for path in segments:
+            run = _filter_date_range(self._read_file(path, read_columns), start_date, end_date)
+            runs.append(_filter_stock_ids(run, stock_ids))
+
+        df = kway_merge(runs)
+        if columns is not None:
+            df = df[list(columns)]
+        return df
+
+    def append(self, new_df, stock_name_map=None):
+        """
+        將新資料寫成一個新的資料段
+
+        Returns:
+            Path: 新資料段的路徑
+        """
+        df = kway_merge([fill_stock_names(new_df, stock_name_map)[COLUMNS]])
+        manifest = self.load_manifest()
+
+        # 只有落在既有範圍內的記錄才需要讀取既有鍵值判斷是否為覆寫（只讀這些股票）
+        existing_keys = None
+        candidates = manifest.new_key_candidates(df)
+        if not candidates.empty:
+            existing_keys = self.read(
+                columns=KEY_COLUMNS,
+                start_date=candidates['date'].min(),
+                end_date=candidates['date'].max(),
+                stock_ids=candidates['stock_id'].astype(str).unique()
+            )
+
+        path = self._next_segment_path()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._write_file(path, df)
+
+        manifest.apply_batch(df, existing_keys)
+        manifest.set_files(self.output_dir, [path])
+        manifest.save()
+
+        for callback in self._write_listeners:
+            try:
+                callback(df, manifest)
+            except Exception as e:
+                print(f"⚠️  寫入監聽器執行失敗: {type(e).__name__}: {e}")
+        return path
+
+    def needs_compaction(self):
+        """資料段數量是否已達 compaction 門檻"""
+        return len(self.list_segments()) >= self.COMPACT_SEGMENT_LIMIT
+
+    def compact(self, stock_name_map=None):
+        """
+        將所有資料段折疊回主資料
+
+        主資料先以原子方式寫入，之後才刪除資料段；若中途中斷，
+        重新套用資料段的結果相同，不會遺失或重複資料
+
+        Returns:
+            int: 折疊的資料段數量
+        """
+        segments = self.list_segments()
+        if not segments:
+            return 0
+
+        manifest = self.load_manifest()
+
+        segment_df = kway_merge([self._read_file(path) for path in segments])
+        segment_df = fill_stock_names(segment_df, stock_name_map)[COLUMNS]
+        written = self._compact_base(segment_df, stock_name_map)
+
+        for path in segments:
+            path.unlink()
+
+        manifest.remove_files(self.output_dir, segments)
+        manifest.set_files(self.output_dir, written)
+        manifest.save()
+        return len(segments)
+
+    def size_bytes(self):
+        """資料佔用的磁碟空間（含資料段）"""
+        return self._base_size_bytes() + sum(path.stat().st_size for path in self.list_segments())
+
+
+class CsvStorage(StockStorage):
+    """單一 CSV 檔案儲存（舊格式）"""
+
+    name = "csv"
+    CSV_FILENAME = "taiwan_stocks.csv"
+    SEGMENT_DIRNAME = "taiwan_stocks_segments"
+    SEGMENT_SUFFIX = ".csv"
+    COMPACT_SEGMENT_LIMIT = 48  # compaction 需重寫整個 CSV，盡量累積較多資料段
+
+    def __init__(self, output_dir="data"):
+        super().__init__(output_dir)
+        self.csv_path = self.output_dir / self.CSV_FILENAME
+
+    @property
+    def location(self):
+        return self.csv_path
+
+    @property
+    def segment_dir(self):
+        return self.output_dir / self.SEGMENT_DIRNAME
+
+    def _base_exists(self):
+        return self.csv_path.exists()
+
+    def _read_base(self, columns=None, start_date=None, end_date=None, stock_ids=None):
+        if not self._base_exists():
+            return pd.DataFrame(columns=columns or COLUMNS)
+
+        usecols = None
+        if columns is not None:
+            usecols = list(dict.fromkeys(
+                list(columns)
+                + (['date'] if start_date or end_date else [])
+                + (['stock_id'] if stock_ids is not None else [])
+            ))
+
+        df = pd.read_csv(self.csv_path, usecols=usecols, dtype=CSV_DTYPES)
+        df = _filter_stock_ids(_filter_date_range(df, start_date, end_date), stock_ids)
+
+        if columns is not None:
+            df = df[list(columns)]
+        return to_typed(df.reset_index(drop=True))
+
+    def _read_file(self, path, columns=None):
+        return to_typed(pd.read_csv(path, usecols=columns, dtype=CSV_DTYPES))
+
+    def _write_file(self, path, df):
+        tmp_path = path.with_suffix('.csv.tmp')
+        df[COLUMNS].to_csv(tmp_path, index=False, encoding='utf-8-sig')
+        os.replace(tmp_path, path)
+
+    def _compact_base(self, segment_df, stock_name_map=None):
+        existing_df = None
+        if self._base_exists():
+            print("📂 正在讀取現有資料...")
+            existing_df = self._read_base()
+            print(f"   現有記錄: {len(existing_df):,} 條")
+
+        combined_df = merge_frames(existing_df, segment_df, stock_name_map)
+        print(f"💾 儲存到 {self.csv_path}...")
+        self._write_file(self.csv_path, combined_df)
+        return [self.csv_path]
+
+    def _base_size_bytes(self):
+        return self.csv_path.stat().st_size if self._base_exists() else 0
+
+    def _base_files(self):
+        return [self.csv_path] if self._base_exists() else []
+
+    @property
+    def manifest_path(self):
+        return self.output_dir / "taiwan_stocks.manifest.json"
+
+
+class ParquetStorage(StockStorage):
+    """
+    依年/月分區的 Parquet 儲存
+
+    目錄結構: data/taiwan_stocks/year=2024/month=01/data.parquet
+    讀取時只開啟與日期範圍重疊的分區，並只解碼需要的欄位
+    資料段存放在 data/taiwan_stocks/_segments/，compaction 只重寫涉及的分區
+
+    資料檔採用精簡格式：date 為 date32（int32 日數）、股票為 int32 代碼
+    （對應 data/instruments.json，不儲存名稱）、價格為以 0.01 元為單位的 int32
+    （無法精確表示時該檔案改存 float64）、volume 為 int64。
+    舊格式（字串欄位）的檔案仍可讀取，compaction 或 rewrite_partitions() 時改寫為精簡格式
+    """
+
+    name = "parquet"
+    DIR_NAME = "taiwan_stocks"
+    PART_FILENAME = "data.parquet"
+    SEGMENT_DIRNAME = "_segments"
+    SEGMENT_SUFFIX = ".parquet"
+    COMPRESSION = "zstd"
+    PRICE_SCALE = 100
+
+    def __init__(self, output_dir="data"):
+        if pq is None:
+            raise ImportError("Parquet 儲存需要 pyarrow，請先安裝: pip install pyarrow")
+        super().__init__(output_dir)
+        self.root = self.output_dir / self.DIR_NAME
+        self._instruments = None
+
+    @property
+    def instruments(self):
+        """股票代號字典（第一次使用時載入）"""
+        if self._instruments is None:
+            self._instruments = load_instruments(self.output_dir)
+        return self._instruments
+
+    @property
+    def location(self):
+        return self.root
+
+    @property
+    def segment_dir(self):
+        return self.root / self.SEGMENT_DIRNAME
+
+    def _base_exists(self):
+        return any(True for _ in self._iter_partitions())
+
+    def _partition_path(self, year, month):
+        return self.root / f"year={year}" / f"month={month:02d}" / self.PART_FILENAME
+
+    def _iter_partitions(self):
+        """依時間順序列出所有分區 (year, month, path)"""
+        if not self.root.exists():
+            return
+        for year_dir in sorted(self.root.glob("year=*")):
+            year = int(year_dir.name.split("=", 1)[1])
+            for month_dir in sorted(year_dir.glob("month=*")):
+                month = int(month_dir.name.split("=", 1)[1])
+                path = month_dir / self.PART_FILENAME
+                if path.exists():
+                    yield year, month, path
+
+    def _select_partitions(self, start_date=None, end_date=None):
+        """只保留與日期範圍重疊的分區"""
+        start_key = (int(start_date[:4]), int(start_date[5:7])) if start_date else None
+        end_key = (int(end_date[:4]), int(end_date[5:7])) if end_date else None
+
+        for year, month, path in self._iter_partitions():
+            if start_key and (year, month) < start_key:
+                continue
+            if end_key and (year, month) > end_key:
+                continue
+            yield year, month, path
+
+    def _read_base(self, columns=None, start_date=None, end_date=None, stock_ids=None):
+        read_columns = None
+        if columns is not None:
+            read_columns = list(dict.fromkeys(list(columns) + (['date'] if start_date or end_date else [])))
+        if stock_ids is not None and any(stock_id not in self.instruments.codes for stock_id in stock_ids):
+            # 其他程式可能新增了股票，重新載入字典（字典中沒有的股票不在任何資料檔中）
+            self._instruments = None
+
+        frames = [
+            self._read_file(path, read_columns, start_date, end_date, stock_ids)
+            for _, _, path in self._select_partitions(start_date, end_date)
+        ]
+
+        if not frames:
+            return pd.DataFrame(columns=columns or COLUMNS)
+
+        df = concat_frames(frames)
+        if columns is not None:
+            df = df[list(columns)]
+        return df
+
+    def _read_file(self, path, columns=None, start_date=None, end_date=None, stock_ids=None):
+        """
+        讀取單一檔案（精簡或舊格式）為型別化的 DataFrame
+
+        日期與股票代號條件下推到 Parquet 讀取（精簡格式以股票代碼比對），
+        不符合的 row group 與記錄不會被解碼成 pandas 物件
+        """
+        if 'code' not in pq.read_schema(path).names:
+            filters = _date_filters(start_date, end_date) or []
+            if stock_ids is not None:
+                filters.append(('stock_id', 'in', list(stock_ids)))
+            return to_typed(pq.read_table(path, columns=columns, filters=filters or None).to_pandas())
+
+        physical = None
+        if columns is not None:
+            physical = list(dict.fromkeys('code' if c in CATEGORY_COLUMNS else c for c in columns))
+        filters = _date_filters(
+            date.fromisoformat(start_date) if start_date else None,
+            date.fromisoformat(end_date) if end_date else None,
+        ) or []
+        if stock_ids is not None:
+            codes = self.instruments.codes
+            filters.append(('code', 'in', [codes[stock_id] for stock_id in stock_ids if stock_id in codes]))
+        table = pq.read_table(path, columns=physical, filters=filters or None)
+        return self._decode(table, columns or COLUMNS)
+
+    def _decode(self, table, columns):
+        """精簡格式的 Arrow table 轉為型別化的 DataFrame"""
+        data = {}
+        if 'code' in table.column_names:
+            codes = table.column('code').to_numpy()
+            if len(codes) and codes.max() >= len(self.instruments):
+                # 其他程式新增了股票，重新載入字典
+                self._instruments = None
+
+        for column in columns:
+            if column == 'date':
+                data[column] = table.column('date').cast(pa.string()).to_numpy(zero_copy_only=False)
+            elif column == 'stock_id':
+                data[column] = self.instruments.decode_ids(codes)
+            elif column == 'stock_name':
+                data[column] = self.instruments.decode_names(codes)
+            elif column in PRICE_COLUMNS:
+                values = table.column(column).cast(pa.float64()).to_numpy(zero_copy_only=False)
+                if pa.types.is_integer(table.schema.field(column).type):
+                    values = values / self.PRICE_SCALE
+                data[column] = values
+            else:
+                data[column] = table.column(column).to_numpy(zero_copy_only=False)
+        return pd.DataFrame(data, columns=list(columns))
+
+    def _encode_price(self, values):
+        """價格轉為以 0.01 元為單位的 int32；無法精確還原時維持 float64"""
+        values = pd.to_numeric(values).to_numpy(dtype=np.float64)
+        missing = np.isnan(values)
+        scaled = np.round(np.where(missing, 0, values) * self.PRICE_SCALE)
+        exact = np.array_equal(scaled[~missing] / self.PRICE_SCALE, values[~missing])
+        if exact and (np.abs(scaled) < 2 ** 31).all():
+            return pa.array(scaled.astype(np.int32), mask=missing)
+        return pa.array(values, mask=missing)
+
+    def _write_file(self, path, df):
+        df = df[COLUMNS]
+        # 重新載入字典再指派新代碼，避免覆蓋其他程式剛新增的股票
+        instruments = load_instruments(self.output_dir)
+        names = df[['stock_id', 'stock_name']].drop_duplicates('stock_id', keep='last')
+        instruments.update_names(names['stock_id'], names['stock_name'])
+        codes = instruments.encode(df['stock_id'])
+        instruments.save()
+        self._instruments = instruments
+
+        table = pa.table({
+            'date': pa.array(np.asarray(df['date'].astype(str).str[:10], dtype='datetime64[D]')),
+            'code': pa.array(codes, type=pa.int32()),
+            **{column: self._encode_price(df[column]) for column in PRICE_COLUMNS},
+            'volume': pa.array(df['volume'], from_pandas=True).cast(pa.int64()),
+        })
+        tmp_path = path.with_suffix('.parquet.tmp')
+        pq.write_table(table, tmp_path, compression=self.COMPRESSION)
+        os.replace(tmp_path, path)
+
+    def _write_partition(self, year, month, df):
+        """原子性地寫入單一分區"""
+        path = self._partition_path(year, month)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._write_file(path, df)
+
+    @staticmethod
+    def _partition_keys(df):
+        """由 'YYYY-MM-DD' 字串取得 (year, month) 分區鍵"""
+        return df['date'].str[:4].astype(int), df['date'].str[5:7].astype(int)
+
+    def _compact_base(self, segment_df, stock_name_map=None):
+        years, months = self._partition_keys(segment_df)
+        groups = list(segment_df.groupby([years, months], sort=True))
+        print(f"🔄 合併 {len(groups)} 個分區...")
+
+        written = []
+        for (year, month), part_new in groups:
+            path = self._partition_path(year, month)
+            existing_df = self._read_file(path) if path.exists() else None
+            combined_df = merge_frames(existing_df, part_new, stock_name_map)
+            self._write_partition(year, month, combined_df)
+            written.append(path)
+
+        print(f"💾 已儲存到 {self.root}/")
+        return written
+
+    def rewrite_partitions(self):
+        """
+        將舊格式（字串欄位）的分區改寫為精簡格式（內容不變，不遞增資料版本）
+
+        Returns:
+            int: 改寫的分區數
+        """
+        manifest = self.load_manifest()
+        written = []
+        for year, month, path in self._iter_partitions():
+            if 'code' in pq.read_schema(path).names:
+                continue
+            self._write_partition(year, month, self._read_file(path))
+            written.append(path)
+
+        if written:
+            manifest.set_files(self.output_dir, written)
+            manifest.save()
+        return len(written)
+
+    def _base_size_bytes(self):
+        return sum(path.stat().st_size for _, _, path in self._iter_partitions())
+
+    def _base_files(self):
+        return [path for _, _, path in self._iter_partitions()]
+
+    @property
+    def manifest_path(self):
+        return self.root / "_manifest.json"
+
+
+BACKENDS = {
+    CsvStorage.name: CsvStorage,
+    ParquetStorage.name: ParquetStorage,
+}
+
+
+def create_storage(output_dir="data", backend=None):
+    """
+    建立儲存後端
+
+    選擇順序: 參數 backend > 環境變數 STOCK_STORAGE_BACKEND > 自動偵測
+    自動偵測: 已有 Parquet 分區目錄時使用 Parquet，否則沿用 CSV
+    """
+    backend = backend or os.getenv(BACKEND_ENV)
+
+    if backend is None:
+        parquet_root = Path(output_dir) / ParquetStorage.DIR_NAME
+        backend = ParquetStorage.name if pq is not None and parquet_root.exists() else CsvStorage.name
+
+    if backend not in BACKENDS:
+        raise ValueError(f"未知的儲存後端: {backend}（可用: {', '.join(BACKENDS)}）")
+
+    return BACKENDS[backend](output_dir)
+
+
+def migrate_csv_to_parquet(output_dir="data", chunksize=500_000):
+    """
+    將現有 taiwan_stocks.csv 一次性轉換為分區 Parquet
+
+    以分塊方式讀取 CSV，避免一次載入整個檔案；轉換完成後保留原 CSV
+    Returns:
+        int: 轉換的記錄數
+    """
+    source = CsvStorage(output_dir)
+    target = ParquetStorage(output_dir)
+
+    if not source.exists():
+        print(f"❌ 找不到 CSV 檔案: {source.csv_path}")
+        return 0
+
+    if target.exists():
+        print(f"❌ Parquet 目錄已有資料: {target.root}，請先移除後再轉換")
+        return 0
+
+    if source.list_segments():
+        print("🔄 先將 CSV 的資料段折疊回主檔案...")
+        source.compact()
+
+    print(f"📂 讀取 {source.csv_path}...")
+    partitions = {}
+    total = 0
+    for chunk in pd.read_csv(source.csv_path, dtype={'stock_id': str}, chunksize=chunksize):
+        if 'stock_name' not in chunk.columns:
+            chunk['stock_name'] = ''
+        chunk['stock_name'] = chunk['stock_name'].fillna('')
+        years, months = target._partition_keys(chunk)
+        for key, part in chunk.groupby([years, months]):
+            partitions.setdefault(key, []).append(part)
+        total += len(chunk)
+        print(f"   已讀取 {total:,} 筆")
+
+    print(f"💾 寫入 {len(partitions)} 個分區到 {target.root}/...")
+    for (year, month), parts in sorted(partitions.items()):
+        part_df = merge_frames(None, pd.concat(parts, ignore_index=True))
+        target._write_partition(year, month, part_df)
+
+    target.load_manifest()
+
+    csv_mb = source.size_bytes() / 1024 / 1024
+    parquet_mb = target.size_bytes() / 1024 / 1024
+    print(f"✓ 轉換完成: {total:,} 筆，CSV {csv_mb:.2f} MB → Parquet {parquet_mb:.2f} MB")
+    return total
@@ -0,0 +1,217 @@
+"""
+資料查詢介面
+以單一的 query() 取得股價資料，股票、日期與欄位條件盡量下推到儲存層：
+- 股票代號：Parquet 以股票代碼過濾（其他股票的記錄不會被解碼），CSV 讀取後過濾
+- 日期範圍：先依資料集清單中各股票的首筆/末筆日期收窄，Parquet 只開啟重疊的分區，
+  並以 row group 的統計值略過範圍外的資料
+- 欄位：只讀取並解碼需要的欄位
+
+結果為型別化的 DataFrame（見 core.storage），或每個欄位一個 numpy 陣列
+
+series() 查詢單一股票的整段歷史，啟用個股序列快取（core.series_cache）時，
+重複查詢同一支股票只需 stat 一次資料集清單檔（確認沒有其他行程寫入），不需讀取資料
+"""
+
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from core.series_cache import SeriesCache, cache_bytes_from_env
+from core.storage import COLUMNS, create_storage
+
+
+class StockStore:
+    """
+    股價資料查詢介面
+
+    包裝儲存後端（core.storage.StockStorage），讀取端只需依賴這個介面，
+    不必知道資料存放格式與資料段合併的細節
+
+    Args:
+        storage: 儲存後端
+        cache_bytes: 個股序列快取的上限（位元組）；0 表示不快取。
+                     啟用時會在儲存後端註冊寫入監聽器，同一個儲存後端只應建立一個有快取的查詢介面
+    """
+
+    def __init__(self, storage, cache_bytes=0):
+        self.storage = storage
+        self.cache = None
+        self._manifest_stamp = None  # 快取最近一次對齊時資料集清單檔的 (mtime, 大小, inode)
+        if cache_bytes:
+            self.cache = SeriesCache(cache_bytes)
+            storage.add_write_listener(self.cache.on_write)
+
+    @property
+    def output_dir(self):
+        return self.storage.output_dir
+
+    @property
+    def location(self):
+        """資料實際存放位置（檔案或目錄）"""
+        return self.storage.location
+
+    def exists(self):
+        """是否已有資料"""
+        return self.storage.exists()
+
+    def load_manifest(self):
+        """資料集清單"""
+        return self.storage.load_manifest()
+
+    def query(self, stock_ids=None, start=None, end=None, columns=None, as_arrays=False):
+        """
+        查詢資料
+
+        Args:
+            stock_ids: 股票代號或其列表（None 表示全部）
+            start: 起始日期 'YYYY-MM-DD'（含）
+            end: 結束日期 'YYYY-MM-DD'（含）
+            columns: 需要的欄位（None 表示全部）
+            as_arrays: True 時返回 {欄位: numpy 陣列}
+
+        Returns:
+            DataFrame 或 dict: 依 (date, stock_id) 排序的資料
+        """
+        if isinstance(stock_ids, str):
+            stock_ids = [stock_ids]
+
+        manifest = self.storage.load_manifest()
+        date_range = _narrow_range(manifest, stock_ids, start, end)
+        if date_range is None:
+            df = pd.DataFrame(columns=list(columns or COLUMNS))
+        else:
+            start, end = date_range
+            df = self.storage.read(columns=columns, start_date=start, end_date=end, stock_ids=stock_ids)
+
+        if as_arrays:
+            return {column: _to_array(df[column]) for column in df.columns}
+        return df
+
+    def window(self, years, stock_ids=None, columns=None, as_arrays=False):
+        """
+        最新交易日往前 N 年（N × 365 天，與新高檢查的比對範圍相同）的資料
+
+        Returns:
+            tuple: (起始日期, 查詢結果)；沒有資料時起始日期為 None
+        """
+        manifest = self.storage.load_manifest()
+        if manifest.is_empty:
+            return None, self.query(stock_ids=stock_ids, columns=columns, as_arrays=as_arrays)
+
+        latest = datetime.strptime(manifest.max_date, '%Y-%m-%d')
+        start = (latest - timedelta(days=years * 365)).strftime('%Y-%m-%d')
+        return start, self.query(stock_ids=stock_ids, start=start, columns=columns, as_arrays=as_arrays)
+
+    def series(self, stock_id, columns=('close',), start=None, end=None):
+        """
+        單一股票的時間序列
+
+        快取整段歷史（每個欄位一個陣列），再依日期範圍切出視圖；
+        資料集清單檔未變動且全部欄位都命中時不讀取任何檔案
+
+        Args:
+            columns: 需要的欄位（date 一定會返回）
+
+        Returns:
+            dict: {'date': 'U10' 日期陣列, 欄位: 陣列}（唯讀，依日期排序）
+        """
+        stock_id = str(stock_id)
+        columns = ['date'] + [column for column in columns if column != 'date']
+
+        arrays = None
+        if self.cache is not None:
+            self._sync_cache()
+            cached = [self.cache.get(stock_id, column) for column in columns]
+            if all(array is not None for array in cached):
+                arrays = dict(zip(columns, cached))
+
+        if arrays is None:
+            arrays = self._load_series(stock_id, columns)
+
+        dates = arrays['date']
+        first = int(np.searchsorted(dates, start, side='left')) if start else 0
+        last = int(np.searchsorted(dates, end, side='right')) if end else len(dates)
+        return {column: array[first:last] for column, array in arrays.items()}
+
+    def _load_series(self, stock_id, columns):
+        """讀取單一股票所有欄位的整段歷史並存入快取"""
+        version = None
+        if self.cache is not None:
+            # 先對齊資料集版本（其他行程寫入後清空），讀取期間有新寫入時不存入
+            self.cache.sync(self.storage.load_manifest().version)
+            version = self.cache.version
+
+        arrays = self.query(stock_ids=[stock_id], columns=columns, as_arrays=True)
+        arrays['date'] = arrays['date'].astype('U10')
+        for column, array in arrays.items():
+            array.flags.writeable = False
+            if self.cache is not None:
+                self.cache.put(stock_id, column, array, version)
+        return arrays
+
+    def refresh(self):
+        """與資料集清單對齊快取（series() 會自動檢查；同一行程的寫入由寫入監聽器處理）"""
+        if self.cache is not None:
+            self._sync_cache()
+
+    def _sync_cache(self):
+        """資料集清單檔有變動時（例如其他行程寫入）載入清單並對齊快取版本；未變動時只需一次 stat"""
+        try:
+            stat = os.stat(self.storage.manifest_path)
+            stamp = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        except OSError:
+            stamp = None
+        if stamp is not None and stamp == self._manifest_stamp:
+            return
+        self.cache.sync(self.storage.load_manifest().version)
+        self._manifest_stamp = stamp
+
+
+def _narrow_range(manifest, stock_ids, start, end):
+    """
+    依資料集清單收窄日期範圍（指定股票時以這些股票的首筆/末筆日期為界）
+
+    Returns:
+        tuple: (start, end)；確定沒有符合的資料時返回 None
+    """
+    if manifest.is_empty:
+        return start, end
+
+    if stock_ids is None:
+        first, last = manifest.min_date, manifest.max_date
+    else:
+        stats = [manifest.stocks[str(stock_id)] for stock_id in stock_ids if str(stock_id) in manifest.stocks]
+        if not stats:
+            return None
+        first = min(s["first"] for s in stats)
+        last = max(s["last"] for s in stats)
+
+    # 只在比整個資料集更窄時才加上日期條件（不必要的條件在 CSV 上仍需逐筆比較）
+    if first > manifest.min_date or start:
+        start = max(start, first) if start else first
+    if last < manifest.max_date or end:
+        end = min(end, last) if end else last
+    if start and end and start > end:
+        return None
+    return start, end
+
+
+def _to_array(values):
+    """欄位轉為 numpy 陣列（類別型欄位轉為字串物件陣列）"""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return np.asarray(values.astype(object))
+    return values.to_numpy()
+
+
+def create_store(output_dir="data", backend=None, cache_bytes=None):
+    """
+    建立查詢介面（儲存後端的選擇規則同 core.storage.create_storage）
+
+    Args:
+        cache_bytes: 個股序列快取上限（預設讀取 STOCK_SERIES_CACHE_MB，未設定為 256 MB）
+    """
+    if cache_bytes is None:
+        cache_bytes = cache_bytes_from_env()
+    return StockStore(create_storage(output_dir, backend), cache_bytes=cache_bytes)
@@ -0,0 +1,129 @@
+"""
+串流寫入器
+抓取結果先累積在有上限的緩衝區，達到門檻即交給背景執行緒寫成資料段，
+抓取與寫入同時進行；佇列有上限，寫入跟不上時抓取端會等待，
+記憶體用量與批次大小無關
+"""
+
+import queue
+import threading
+
+import pandas as pd
+
+from core.storage import COLUMNS, KEY_COLUMNS
+
+NUMERIC_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+
+def validate_chunk(df):
+    """
+    檢查並整理一批抓取結果
+
+    - 缺少必要欄位時拋出 ValueError
+    - 移除缺少日期或股票代號的記錄
+    - 價量欄位轉為數值（無法解析者為 NaN）
+    """
+    missing = [col for col in COLUMNS if col not in df.columns]
+    if missing:
+        raise ValueError(f"抓取結果缺少欄位: {missing}")
+
+    df = df[COLUMNS].dropna(subset=KEY_COLUMNS)
+    df = df[(df['date'] != '') & (df['stock_id'] != '')]
+    for col in NUMERIC_COLUMNS:
+        if not pd.api.types.is_numeric_dtype(df[col]):
+            df = df.assign(**{col: pd.to_numeric(df[col], errors='coerce')})
+    return df
+
+
+class StreamingWriter:
+    """
+    背景寫入資料段
+
+    Args:
+        write_segment: 寫入函式，接收一個 DataFrame（於背景執行緒呼叫，一次只有一個）
+        spill_rows: 緩衝區累積到多少筆記錄時寫出一個資料段
+        max_pending: 最多幾個待寫入的資料段排隊（超過時 add() 會等待）
+        on_flushed: 資料段寫入後以其包含的單位列表呼叫（於背景執行緒），
+                    用於在資料落地後才標記單位完成
+    """
+
+    def __init__(self, write_segment, spill_rows=50_000, max_pending=2, on_flushed=None):
+        self.write_segment = write_segment
+        self.on_flushed = on_flushed
+        self.spill_rows = max(1, int(spill_rows))
+        self.row_count = 0
+        self.segment_count = 0
+        self.preview = None  # 第一批記錄的前幾筆，供預覽
+
+        self._buffer = []
+        self._buffered_units = []
+        self._buffered_rows = 0
+        self._queue = queue.Queue(maxsize=max(1, max_pending))
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="segment-writer", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            if self._error is not None:
+                continue
+            df, units = item
+            try:
+                if df is not None:
+                    self.write_segment(df)
+                    self.segment_count += 1
+                if units and self.on_flushed is not None:
+                    self.on_flushed(units)
+            except Exception as e:
+                self._error = e
+
+    def _raise_if_failed(self):
+        if self._error is not None:
+            raise self._error
+
+    def add(self, df, unit=None):
+        """
+        加入一批抓取結果，緩衝區達到門檻時交給背景執行緒寫出
+
+        Args:
+            df: 抓取結果（None 或空表示該單位沒有資料）
+            unit: 結果所屬的單位，隨資料一起寫出後傳給 on_flushed
+        """
+        self._raise_if_failed()
+        if unit is not None:
+            self._buffered_units.append(unit)
+        if df is None or df.empty:
+            return
+
+        df = validate_chunk(df)
+        if df.empty:
+            return
+        if self.preview is None:
+            self.preview = df.head(5)
+
+        self._buffer.append(df)
+        self._buffered_rows += len(df)
+        self.row_count += len(df)
+        if self._buffered_rows >= self.spill_rows:
+            self._spill()
+
+    def _spill(self):
+        if not self._buffer and not self._buffered_units:
+            return
+        chunk = pd.concat(self._buffer, ignore_index=True) if self._buffer else None
+        units = self._buffered_units
+        self._buffer = []
+        self._buffered_units = []
+        self._buffered_rows = 0
+        self._queue.put((chunk, units))
+
+    def close(self):
+        """寫出剩餘的緩衝資料並等待背景執行緒完成"""
+        if self._error is None:
+            self._spill()
+        self._queue.put(None)
+        self._thread.join()
+        self._raise_if_failed()
@@ -0,0 +1,309 @@
+"""
+臺股交易日曆
+以實際觀察到的全市場資料判斷交易日，並以休市日表補足尚未有資料的期間：
+- 觀察到的交易日：有多支股票資料的日期
+- 確認休市日：全市場單日請求成功但沒有任何資料的週間日（颱風假等臨時休市），
+  由獲取器記錄（record_closures）；資料中的缺口不會被推斷為休市
+- 休市日表：固定日期的國定假日與 data/holidays.json 中的日期（農曆節日、補假等），
+  用於尚未抓取的期間（例如判斷今天之後的交易日）
+
+日期運算以 numpy 的 busdaycalendar 實作（下一個/上一個交易日、區間內交易日數）
+狀態檔由儲存後端的寫入監聽器隨寫入更新；不存在或與資料集清單不一致時由歷史資料重建
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from core.store import StockStore
+
+# 有幾筆以上記錄的日期才視為全市場的交易日（避免單一股票的異常資料）
+OBSERVED_MIN_ROWS = 5
+
+# 固定日期的國定假日（月, 日）：元旦、和平紀念日、兒童節、勞動節、國慶日
+FIXED_HOLIDAYS = [(1, 1), (2, 28), (4, 4), (5, 1), (10, 10)]
+
+
+def _to_day(date):
+    """'YYYY-MM-DD'、datetime 或 Timestamp 轉為 numpy datetime64[D]"""
+    if isinstance(date, str):
+        return np.datetime64(date[:10], 'D')
+    return np.datetime64(date.strftime('%Y-%m-%d'), 'D')
+
+
+def _is_weekday(date_str):
+    return datetime.strptime(date_str, '%Y-%m-%d').weekday() < 5
+
+
+# 寫入監聽器（串流寫入的背景執行緒）與記錄休市日共用狀態檔
+_state_lock = threading.Lock()
+
+
+class TradingCalendar:
+    """
+    交易日曆
+
+    - observed: 觀察到的交易日
+    - sparse: 記錄不足 OBSERVED_MIN_ROWS 支股票的日期 -> 有記錄的股票代號
+      （依股票分批寫入時跨批次累計，與由全部資料重建的結果一致）
+    - closures: 確認休市的週間日（全市場請求成功但沒有資料）
+    - holidays: 休市日表（data/holidays.json 的日期，另加固定國定假日），只在沒有觀察資料時採用
+    """
+
+    FILENAME = "trading_calendar.json"
+    HOLIDAYS_FILENAME = "holidays.json"
+    FORMAT_VERSION = 3
+
+    def __init__(self, path, holidays=None):
+        self.path = Path(path)
+        self.observed = set()
+        self.sparse = {}
+        self.closures = set()
+        self.holidays = set(holidays or [])
+        self.synced_version = None
+        self._busdaycal = None
+        self._weekend_sessions = None
+
+    # ---- 持久化 ----
+
+    @classmethod
+    def load(cls, path, holidays=None):
+        """載入狀態，不存在或格式不符時返回 None"""
+        path = Path(path)
+        if not path.exists():
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get("format") != cls.FORMAT_VERSION:
+            return None
+
+        calendar = cls(path, holidays)
+        calendar.observed = set(data["observed"])
+        calendar.sparse = {date: set(stock_ids) for date, stock_ids in data["sparse"].items()}
+        calendar.closures = set(data["closures"])
+        calendar.synced_version = data["synced_version"]
+        return calendar
+
+    def save(self):
+        """原子性地寫入狀態檔"""
+        data = {
+            "format": self.FORMAT_VERSION,
+            "synced_version": self.synced_version,
+            "observed": sorted(self.observed),
+            "sparse": {date: sorted(stock_ids) for date, stock_ids in sorted(self.sparse.items())},
+            "closures": sorted(self.closures),
+        }
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, separators=(',', ':'))
+        os.replace(tmp_path, self.path)
+
+    # ---- 由資料更新 ----
+
+    @classmethod
+    def rebuild(cls, storage, holidays=None, closures=None):
+        """
+        由歷史資料重建觀察到的交易日（只讀取 date, stock_id 欄位）
+
+        資料中沒有記錄的日期不一定休市（可能只是尚未抓取），確認休市日無法由資料重建，
+        由 closures 沿用先前記錄的日期
+
+        Args:
+            closures: 先前確認的休市日
+        """
+        calendar = cls(Path(storage.output_dir) / cls.FILENAME, holidays)
+        calendar.closures = set(closures or [])
+        manifest = storage.load_manifest()
+        calendar.synced_version = manifest.version
+        if manifest.is_empty:
+            return calendar
+
+        df = StockStore(storage).query(columns=['date', 'stock_id'])
+        dates = df['date'].astype(str).str[:10]
+        counts = dates.value_counts()
+        calendar.observed = set(counts[counts >= OBSERVED_MIN_ROWS].index)
+        calendar.closures -= calendar.observed
+
+        # 每個 (date, stock_id) 只有一筆記錄，記錄數即股票數
+        sparse = ~dates.isin(calendar.observed)
+        for date, stock_ids in df['stock_id'][sparse].astype(str).groupby(dates[sparse]):
+            calendar.sparse[date] = set(stock_ids)
+        return calendar
+
+    def apply(self, batch_df):
+        """
+        套用一批新寫入的記錄
+
+        Args:
+            batch_df: 含 date, stock_id 的 DataFrame
+        """
+        if batch_df.empty:
+            return
+        dates = batch_df['date'].astype(str).str[:10]
+        unobserved = ~dates.isin(self.observed)
+        if not unobserved.any():
+            return
+
+        # 與先前批次的股票合併計算（覆寫的記錄不會重複計入）
+        new_sessions = set()
+        for date, stock_ids in batch_df['stock_id'][unobserved].astype(str).groupby(dates[unobserved]):
+            seen = self.sparse.setdefault(date, set())
+            seen.update(stock_ids)
+            if len(seen) >= OBSERVED_MIN_ROWS:
+                new_sessions.add(date)
+                del self.sparse[date]
+
+        self.observed |= new_sessions
+        self.closures -= new_sessions
+        self._invalidate()
+
+    def add_closures(self, dates):
+        """
+        記錄確認休市的日期（觀察到有交易的日期除外）
+
+        Returns:
+            bool: 是否有新增
+        """
+        new_closures = set(dates) - self.observed - self.closures
+        self.closures |= new_closures
+        if new_closures:
+            self._invalidate()
+        return bool(new_closures)
+
+    def _invalidate(self):
+        self._busdaycal = None
+        self._weekend_sessions = None
+
+    # ---- 查詢 ----
+
+    @property
+    def busdaycal(self):
+        """休市的週間日（確認休市 + 休市日表，觀察到有交易者除外）組成的 numpy busdaycalendar"""
+        if self._busdaycal is None:
+            closed = (self.closures | self._table_holidays()) - self.observed
+            self._busdaycal = np.busdaycalendar(holidays=sorted(closed))
+            self._weekend_sessions = np.array(
+                sorted(date for date in self.observed if not _is_weekday(date)), dtype='datetime64[D]'
+            )
+        return self._busdaycal
+
+    def _table_holidays(self):
+        """休市日表：固定日期的國定假日與 data/holidays.json 的日期（觀察到有交易的日期會在 busdaycal 中排除）"""
+        years = range(2005, datetime.now().year + 2)
+        fixed = {f"{year}-{month:02d}-{day:02d}" for year in years for month, day in FIXED_HOLIDAYS}
+        return self.holidays | fixed
+
+    def _extra_sessions(self, start, end):
+        """區間內（含）在週末但實際有交易的日期（補班日）"""
+        self.busdaycal  # 確保已建立
+        extras = self._weekend_sessions
+        return extras[(extras >= start) & (extras <= end)]
+
+    def is_session(self, date):
+        """date 是否為交易日"""
+        day = _to_day(date)
+        return bool(np.is_busday(day, busdaycal=self.busdaycal)) or day in self._weekend_sessions
+
+    def sessions_between(self, start_date, end_date):
+        """start_date 與 end_date 之間（含）的交易日列表 ['YYYY-MM-DD', ...]"""
+        start, end = _to_day(start_date), _to_day(end_date)
+        if end < start:
+            return []
+        days = np.arange(start, end + 1, dtype='datetime64[D]')
+        sessions = days[np.is_busday(days, busdaycal=self.busdaycal)]
+        extras = self._extra_sessions(start, end)
+        if len(extras):
+            sessions = np.union1d(sessions, extras)
+        return sessions.astype(str).tolist()
+
+    def session_count(self, start_date, end_date):
+        """start_date 與 end_date 之間（含）的交易日數"""
+        start, end = _to_day(start_date), _to_day(end_date)
+        if end < start:
+            return 0
+        count = int(np.busday_count(start, end + 1, busdaycal=self.busdaycal))
+        return count + len(self._extra_sessions(start, end))
+
+    def next_session(self, date, inclusive=False):
+        """date 之後（inclusive 時含當天）的第一個交易日"""
+        day = _to_day(date) + (0 if inclusive else 1)
+        candidate = np.busday_offset(day, 0, roll='forward', busdaycal=self.busdaycal)
+        extras = self._extra_sessions(day, candidate)
+        return str(extras[0] if len(extras) else candidate)
+
+    def prev_session(self, date, inclusive=False):
+        """date 之前（inclusive 時含當天）的最後一個交易日"""
+        day = _to_day(date) - (0 if inclusive else 1)
+        candidate = np.busday_offset(day, 0, roll='backward', busdaycal=self.busdaycal)
+        extras = self._extra_sessions(candidate, day)
+        return str(extras[-1] if len(extras) else candidate)
+
+
+def _load_holiday_table(output_dir):
+    """讀取休市日表 data/holidays.json（{"holidays": ["YYYY-MM-DD", ...]}）"""
+    path = Path(output_dir) / TradingCalendar.HOLIDAYS_FILENAME
+    if not path.exists():
+        return set()
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return set(json.load(f).get("holidays", []))
+    except (OSError, ValueError) as e:
+        print(f"⚠️  讀取休市日表失敗: {e}")
+        return set()
+
+
+def attach_trading_calendar(storage):
+    """在儲存後端註冊監聽器，每次寫入後更新交易日曆（狀態檔不存在時不做任何事）"""
+    path = Path(storage.output_dir) / TradingCalendar.FILENAME
+
+    def _on_write(batch_df, manifest):
+        with _state_lock:
+            calendar = TradingCalendar.load(path)
+            if calendar is None or calendar.synced_version != manifest.version - 1:
+                # 中間有未經監聽器的寫入，交由 load_trading_calendar 重建
+                return
+            calendar.apply(batch_df)
+            calendar.synced_version = manifest.version
+            calendar.save()
+
+    storage.add_write_listener(_on_write)
+
+
+def record_closures(storage, dates):
+    """
+    記錄確認休市的日期（全市場單日請求成功但沒有任何資料）
+
+    只應傳入已確定不是「資料尚未公布」的日期（例如早於已有資料的交易日）
+    """
+    if not dates:
+        return
+    with _state_lock:
+        calendar = TradingCalendar.load(Path(storage.output_dir) / TradingCalendar.FILENAME)
+        if calendar is None:
+            calendar = load_trading_calendar(storage)
+        if calendar.add_closures(dates):
+            calendar.save()
+
+
+def load_trading_calendar(storage, rebuild=False):
+    """取得與資料同步的交易日曆，不存在或不一致時由歷史資料重建"""
+    path = Path(storage.output_dir) / TradingCalendar.FILENAME
+    holidays = _load_holiday_table(storage.output_dir)
+    manifest = storage.load_manifest()
+
+    previous = TradingCalendar.load(path, holidays)
+    calendar = None if rebuild else previous
+    if calendar is None or calendar.synced_version != manifest.version:
+        print("🔄 由歷史資料重建交易日曆...")
+        closures = previous.closures if previous is not None else None
+        calendar = TradingCalendar.rebuild(storage, holidays, closures)
+        calendar.save()
+    return calendar
+
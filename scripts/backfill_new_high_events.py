@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+建立 / 更新歷史新高事件表
+功能：
+- 計算整段歷史中每個 (股票, 交易日) 創 N 年新高的事件，含被突破的前高與其日期
+- 結果存於 data/new_high_events.csv；之後執行只更新新寫入的交易日
+"""
+
+import sys
+from pathlib import Path
+import argparse
+import os
+
+# 嘗試載入 python-dotenv（如果有安裝的話）
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    # 手動載入 .env 檔案
+    env_file = Path(__file__).parent.parent / '.env'
+    if env_file.exists():
+        with open(env_file) as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith('#') and '=' in line:
+                    key, value = line.split('=', 1)
+                    os.environ.setdefault(key, value)
+
+# 添加父目錄到 Python 路徑以導入 core 模組
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core.new_high_events import update_new_high_events
+from core.range_index import WINDOWS
+from core.storage import create_storage
+
+
+def main():
+    """主程式"""
+    parser = argparse.ArgumentParser(description='建立 / 更新歷史新高事件表')
+    parser.add_argument(
+        '--windows',
+        nargs='+',
+        choices=list(WINDOWS),
+        default=['3y'],
+        help='記錄的新高視窗（預設 3y，可指定多個）'
+    )
+    parser.add_argument(
+        '--rebuild',
+        action='store_true',
+        help='重新計算全部事件'
+    )
+    args = parser.parse_args()
+
+    print("\n" + "="*70)
+    print("📚 歷史新高事件表")
+    print("="*70 + "\n")
+
+    project_root = Path(__file__).parent.parent
+    storage = create_storage(project_root / 'data')
+    if not storage.exists():
+        print(f"❌ 找不到資料: {storage.location}")
+        return
+
+    table = update_new_high_events(storage, windows=args.windows, rebuild=args.rebuild)
+    events = table.events
+    print(f"\n✓ 事件表: {table.path}（共 {len(events):,} 筆）\n")
+
+    for window in table.windows:
+        window_events = events[events['window'] == window]
+        if window_events.empty:
+            print(f"  {window}: 無事件")
+            continue
+        per_year = window_events.groupby(window_events['date'].str[:4]).size()
+        print(f"  {window}: {len(window_events):,} 筆，{window_events['stock_id'].nunique()} 支股票，"
+              f"最近 {window_events['date'].max()}")
+        for year, count in per_year.tail(5).items():
+            print(f"     {year}: {count:,} 筆")
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,7 @@
 
 import sys
 from pathlib import Path
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 import argparse
@@ -31,20 +32,28 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from core.stock_fetcher import TaiwanStockFetcher
 from core.line_sender import send_line_message
+from core.coverage import load_coverage
+from core.fetch_planner import MODE_BY_STOCK, estimate_seconds, plan_gap_fill
+from core.storage import create_storage
+from core.trading_calendar import load_trading_calendar
 
 
-def get_trading_days(start_date, end_date):
+def get_trading_days(start_date, end_date, calendar=None):
     """
-    獲取台股交易日（排除週末）
-    注意：這裡只排除週末，不包含國定假日
+    獲取台股交易日
+    有交易日曆時依日曆排除國定假日與颱風假等休市日，否則只排除週末
 
     Args:
         start_date: 開始日期 (datetime)
         end_date: 結束日期 (datetime)
+        calendar: 交易日曆（core.trading_calendar.TradingCalendar）
 
     Returns:
         list: 交易日列表
     """
+    if calendar is not None:
+        return calendar.sessions_between(start_date, end_date)
+
     trading_days = []
     current = start_date
 
@@ -57,12 +66,12 @@ def get_trading_days(start_date, end_date):
     return trading_days
 
 
-def analyze_missing_data(csv_path, output_dir):
+def analyze_missing_data(storage, output_dir):
     """
-    分析CSV中缺失的資料
+    分析儲存資料中缺失的資料
 
     Args:
-        csv_path: CSV檔案路徑
+        storage: 儲存後端（core.storage.StockStorage）
         output_dir: 輸出目錄
 
     Returns:
@@ -72,24 +81,22 @@ def analyze_missing_data(csv_path, output_dir):
     print("📊 分析資料完整性")
     print(f"{'='*70}\n")
 
-    if not csv_path.exists():
-        print("❌ CSV檔案不存在")
+    if not storage.exists():
+        print(f"❌ 資料不存在: {storage.location}")
         return {}, {}
 
-    print("📂 讀取資料...")
-    df = pd.read_csv(csv_path, dtype={'stock_id': str})
-
-    if df.empty:
-        print("❌ CSV檔案為空")
+    manifest = storage.load_manifest()
+    if manifest.is_empty:
+        print("❌ 資料為空")
         return {}, {}
 
-    # 基本統計
-    total_records = len(df)
-    unique_stocks = df['stock_id'].nunique()
-    date_range_start = df['date'].min()
-    date_range_end = df['date'].max()
+    # 基本統計（由資料集清單取得，不讀取資料）
+    total_records = manifest.row_count
+    unique_stocks = len(manifest.stocks)
+    date_range_start = manifest.min_date
+    date_range_end = manifest.max_date
 
-    print(f"✓ 資料載入完成")
+    print(f"✓ 資料集清單載入完成")
     print(f"   總記錄數: {total_records:,}")
     print(f"   股票數量: {unique_stocks}")
     print(f"   日期範圍: {date_range_start} ~ {date_range_end}")
@@ -97,48 +104,40 @@ def analyze_missing_data(csv_path, output_dir):
     # 計算交易日
     start_dt = datetime.strptime(date_range_start, '%Y-%m-%d')
     end_dt = datetime.strptime(date_range_end, '%Y-%m-%d')
-    all_trading_days = get_trading_days(start_dt, end_dt)
+    calendar = load_trading_calendar(storage)
+    all_trading_days = get_trading_days(start_dt, end_dt, calendar)
     total_trading_days = len(all_trading_days)
 
-    print(f"\n📅 預期交易日數（排除週末）: {total_trading_days} 天")
-    print(f"🔍 開始檢查每支股票的資料完整性...\n")
-
-    # 分析每支股票的缺失日期
-    missing_data = {}
-    stock_stats = []
-
-    all_stocks = sorted(df['stock_id'].unique())
-
-    for idx, stock_id in enumerate(all_stocks, 1):
-        stock_df = df[df['stock_id'] == stock_id]
-        stock_dates = set(stock_df['date'].tolist())
-
-        # 找出缺失的日期
-        missing_dates = [d for d in all_trading_days if d not in stock_dates]
-
-        if missing_dates:
-            missing_data[stock_id] = missing_dates
-
-        # 統計
-        actual_days = len(stock_dates)
-        missing_count = len(missing_dates)
-        completeness = (actual_days / total_trading_days) * 100 if total_trading_days > 0 else 0
-
-        stock_stats.append({
-            'stock_id': stock_id,
-            'actual_days': actual_days,
-            'missing_days': missing_count,
-            'completeness': completeness
-        })
-
-        # 每100支股票顯示一次進度
-        if idx % 100 == 0:
-            print(f"   處理進度: {idx}/{unique_stocks}")
+    print(f"\n📅 預期交易日數（依交易日曆，排除週末與休市日）: {total_trading_days} 天")
+    print(f"🔍 以資料覆蓋位元圖檢查每支股票的資料完整性...\n")
+
+    # 股票 × 交易日的覆蓋矩陣，缺失 = 沒有資料的交易日
+    coverage = load_coverage(storage)
+    order = np.argsort(coverage.stock_ids)
+    stock_ids = np.array(coverage.stock_ids)[order]
+    missing = ~coverage.matrix(all_trading_days)[order]
+    actual_days = coverage.day_counts(date_range_start, date_range_end)[order]
+    missing_days = missing.sum(axis=1)
+
+    # 缺失日期明細 {stock_id: [missing_dates]}
+    rows, cols = np.nonzero(missing)
+    trading_days = np.array(all_trading_days)
+    boundaries = np.cumsum(missing_days)[:-1]
+    missing_data = {
+        stock_ids[row]: dates.tolist()
+        for row, dates in enumerate(np.split(trading_days[cols], boundaries))
+        if len(dates)
+    }
 
-    print(f"\n✓ 分析完成\n")
+    print(f"✓ 分析完成\n")
 
     # 顯示統計結果
-    stats_df = pd.DataFrame(stock_stats)
+    stats_df = pd.DataFrame({
+        'stock_id': stock_ids,
+        'actual_days': actual_days,
+        'missing_days': missing_days,
+        'completeness': actual_days / total_trading_days * 100 if total_trading_days > 0 else 0.0,
+    })
 
     # 完整度統計
     complete_stocks = len(stats_df[stats_df['missing_days'] == 0])
@@ -151,7 +150,7 @@ def analyze_missing_data(csv_path, output_dir):
     print(f"缺失股票數量: {incomplete_stocks} ({incomplete_stocks/unique_stocks*100:.1f}%)")
 
     if incomplete_stocks > 0:
-        total_missing = stats_df['missing_days'].sum()
+        total_missing = int(stats_df['missing_days'].sum())
         avg_missing = stats_df[stats_df['missing_days'] > 0]['missing_days'].mean()
         max_missing = stats_df['missing_days'].max()
         max_missing_stock = stats_df[stats_df['missing_days'] == max_missing].iloc[0]['stock_id']
@@ -200,14 +199,19 @@ def analyze_missing_data(csv_path, output_dir):
     }
 
 
-def fill_missing_data(missing_data, fetcher, max_stocks=None):
+def fill_missing_data(missing_data, fetcher, max_stocks=None, budget=None, dry_run=False):
     """
     補齊缺失的資料
 
+    依整個「股票 × 交易日」缺失矩陣規劃請求：許多股票同時缺漏的日期改用一次全市場請求，
+    其餘依股票的日期區間補齊，並以成本模型與額度預算選出請求數最少的計畫
+
     Args:
         missing_data: 缺失資料字典 {stock_id: [missing_dates]}
         fetcher: TaiwanStockFetcher 實例
         max_stocks: 最多補齊幾支股票（None 表示全部）
+        budget: 本次最多使用的請求數（None 表示不限，超出部分留待下次執行）
+        dry_run: 只列印計畫與估計時間，不發出請求
     """
     if not missing_data:
         print("✓ 沒有缺失的資料需要補齊")
@@ -217,89 +221,59 @@ def fill_missing_data(missing_data, fetcher, max_stocks=None):
     print(f"🔧 開始補齊缺失資料")
     print(f"{'='*70}\n")
 
-    total_stocks = len(missing_data)
     if max_stocks:
         print(f"⚠️  限制補齊數量: 最多 {max_stocks} 支股票\n")
         stocks_to_fill = list(missing_data.keys())[:max_stocks]
     else:
         stocks_to_fill = list(missing_data.keys())
 
-    all_new_data = []
-    success_count = 0
-    fail_count = 0
-
-    for idx, stock_id in enumerate(stocks_to_fill, 1):
-        missing_dates = missing_data[stock_id]
-
-        print(f"[{idx}/{len(stocks_to_fill)}] {stock_id} (缺 {len(missing_dates)} 天)", end=' ')
-
-        # 將連續的日期合併成區間來減少API請求
-        date_ranges = _merge_date_ranges(missing_dates)
-
-        stock_data = []
-        for start_date, end_date in date_ranges:
-            df = fetcher.fetch_stock_data(stock_id, start_date, end_date)
-            if df is not None and not df.empty:
-                stock_data.append(df)
+    # 缺失矩陣：列為股票、欄為最早到最晚缺失日之間的所有交易日
+    first = min(missing_data[stock_id][0] for stock_id in stocks_to_fill)
+    last = max(missing_data[stock_id][-1] for stock_id in stocks_to_fill)
+    sessions = fetcher.calendar.sessions_between(first, last)
+    columns = {date: col for col, date in enumerate(sessions)}
+    missing = np.zeros((len(stocks_to_fill), len(sessions)), dtype=bool)
+    for row, stock_id in enumerate(stocks_to_fill):
+        cols = [columns[date] for date in missing_data[stock_id] if date in columns]
+        missing[row, cols] = True
+
+    plan = plan_gap_fill(missing, stocks_to_fill, sessions, budget=budget, mode=fetcher.fetch_mode)
+    rate = fetcher.rate_limiter.rate if fetcher.rate_limiter is not None else None
+    seconds = estimate_seconds(plan.request_count, fetcher.workers, rate)
+    print(f"📋 {len(stocks_to_fill)} 支股票，補齊計畫: {plan.describe()}")
+    print(f"⏱️  預估耗時: {seconds / 60:.1f} 分鐘（{fetcher.workers} 個執行緒"
+          f"{f'，速率上限 {rate * 3600:.0f} 次/小時' if rate else ''}）")
+
+    if dry_run:
+        print("\n✓ 試算模式，未發出任何請求\n")
+        return 0
 
-        if stock_data:
-            combined = pd.concat(stock_data, ignore_index=True)
-            all_new_data.append(combined)
-            success_count += 1
-            print(f"✓ 補齊 {len(combined)} 筆")
-        else:
-            fail_count += 1
-            print("✗ 失敗")
+    def by_stock_fallback(dates):
+        """全市場請求失敗的日期改以依股票的區間補齊（沿用剩餘的額度預算）"""
+        cols = [columns[date] for date in dates]
+        subset = np.zeros_like(missing)
+        subset[:, cols] = missing[:, cols]
+        remaining = None if budget is None else max(1, budget - plan.request_count + len(dates))
+        return plan_gap_fill(subset, stocks_to_fill, sessions, budget=remaining, mode=MODE_BY_STOCK).requests
+
+    # 串流寫入並記錄抓取日誌，中斷後重新執行只補抓未完成的請求
+    total_rows, success_count, fail_count = fetcher.fetch_requests_and_store(
+        plan.requests, delay=0, task='missing', stock_ids=set(stocks_to_fill), fallback=by_stock_fallback
+    )
 
     print(f"\n{'='*70}")
     print(f"補齊結果:")
-    print(f"   成功: {success_count}/{len(stocks_to_fill)}")
-    print(f"   失敗: {fail_count}/{len(stocks_to_fill)}")
+    print(f"   成功: {success_count}/{plan.request_count} 個請求")
+    print(f"   失敗: {fail_count}/{plan.request_count} 個請求")
     print(f"{'='*70}\n")
 
-    # 合併並儲存
-    if all_new_data:
-        final_df = pd.concat(all_new_data, ignore_index=True)
-        print(f"💾 儲存補齊的資料...")
-        fetcher.merge_and_save(final_df)
-        return len(final_df)
+    if total_rows:
+        return total_rows
     else:
         print("⚠️  沒有成功補齊任何資料")
         return 0
 
 
-def _merge_date_ranges(dates):
-    """
-    將日期列表合併成連續的日期區間
-
-    Args:
-        dates: 日期字串列表 ['2024-01-01', '2024-01-02', ...]
-
-    Returns:
-        list: [(start_date, end_date), ...]
-    """
-    if not dates:
-        return []
-
-    # 轉換為 datetime 並排序
-    date_objs = sorted([datetime.strptime(d, '%Y-%m-%d') for d in dates])
-
-    ranges = []
-    start = date_objs[0]
-    end = date_objs[0]
-
-    for i in range(1, len(date_objs)):
-        if (date_objs[i] - end).days <= 3:  # 允許3天內的間隔（考慮週末）
-            end = date_objs[i]
-        else:
-            ranges.append((start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')))
-            start = date_objs[i]
-            end = date_objs[i]
-
-    ranges.append((start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')))
-    return ranges
-
-
 def main():
     """主程式"""
     parser = argparse.ArgumentParser(description='檢查並補齊臺股資料中缺失的資料')
@@ -313,6 +287,16 @@ def main():
         type=int,
         help='最多補齊幾支股票（用於測試）'
     )
+    parser.add_argument(
+        '--budget',
+        type=int,
+        help='本次最多使用的 API 請求數（超出部分留待下次執行）'
+    )
+    parser.add_argument(
+        '--dry-run',
+        action='store_true',
+        help='只列印補齊計畫與預估耗時，不發出請求'
+    )
     parser.add_argument(
         '--output-dir',
         type=str,
@@ -328,10 +312,10 @@ def main():
 
     # 初始化
     output_dir = Path(args.output_dir)
-    csv_path = output_dir / "taiwan_stocks.csv"
+    storage = create_storage(output_dir)
 
     # 分析缺失資料
-    missing_data, stats = analyze_missing_data(csv_path, output_dir)
+    missing_data, stats = analyze_missing_data(storage, output_dir)
 
     # 如果只是檢查，就結束
     if args.check_only:
@@ -343,7 +327,11 @@ def main():
         api_token = os.getenv('FINMIND_API_TOKEN')
         fetcher = TaiwanStockFetcher(api_token=api_token, output_dir=args.output_dir)
 
-        filled_count = fill_missing_data(missing_data, fetcher, max_stocks=args.max_stocks)
+        filled_count = fill_missing_data(
+            missing_data, fetcher, max_stocks=args.max_stocks, budget=args.budget, dry_run=args.dry_run
+        )
+        if args.dry_run:
+            return
 
         print(f"\n✅ 任務完成！共補齊 {filled_count:,} 筆資料\n")
 
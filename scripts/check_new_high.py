@@ -4,12 +4,14 @@
 功能：
 - 檢查每支股票的最新 high 價格是否為近三年的新高點
 - 如果是新高點，發送 Line 通知
+- 使用 data/rolling_high_state.json 增量狀態；加 --rebuild-state 可由歷史資料重建
+- 加 --panel 改以記憶體映射的價格面板（data/panel/）做橫斷面運算
+- 加 --scan 改為直接查詢最近三年的 high（只讀取需要的欄位與日期範圍）
 """
 
 import sys
 from pathlib import Path
-from datetime import datetime, timedelta
-import pandas as pd
+import argparse
 import os
 
 # 嘗試載入 python-dotenv（如果有安裝的話）
@@ -30,140 +32,73 @@ except ImportError:
 # 添加父目錄到 Python 路徑以導入 core 模組
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+from core.instruments import load_instruments
 from core.line_sender import send_line_message
-
-
-def load_stock_data(data_file):
-    """載入股票資料"""
-    if not data_file.exists():
-        print(f"❌ 找不到資料檔案: {data_file}")
-        return None
-
-    try:
-        df = pd.read_csv(data_file)
-        df['date'] = pd.to_datetime(df['date'])
-        return df
-    except Exception as e:
-        print(f"❌ 讀取資料檔案失敗: {e}")
-        return None
-
-
-def check_new_highs(df, years=3):
-    """
-    檢查哪些股票創下近期新高
-
-    Args:
-        df: 股票資料 DataFrame
-        years: 檢查幾年內的新高（預設 3 年）
-
-    Returns:
-        list: 創新高的股票資訊列表
-    """
-    if df is None or df.empty:
-        return []
-
-    # 計算時間範圍
-    latest_date = df['date'].max()
-    start_date = latest_date - timedelta(days=years * 365)
-
-    print(f"🔍 最新日期: {latest_date.date()}")
-    print(f"📊 比對範圍: {start_date.date()} ~ {(latest_date - timedelta(days=1)).date()} (過去 {years} 年)")
-    print(f"📌 邏輯: 檢查最新日期的 high 是否 > 過去 {years} 年內的所有 high\n")
-
-    # 篩選近 N 年的資料（用於比對）
-    df_recent = df[df['date'] >= start_date].copy()
-
-    new_highs = []
-
-    # 取得最新日期有交易的股票
-    latest_df = df_recent[df_recent['date'] == latest_date]
-    print(f"💼 最新日期有交易的股票數: {latest_df['stock_id'].nunique()} 支\n")
-
-    # 對每支股票進行檢查
-    for stock_id in latest_df['stock_id'].unique():
-        # 該股票在近 N 年的所有歷史資料
-        stock_data = df_recent[df_recent['stock_id'] == stock_id]
-
-        if len(stock_data) < 2:
-            continue
-
-        # 【比對點1】最新日期的 high
-        latest_record = stock_data[stock_data['date'] == latest_date].iloc[0]
-        latest_high = latest_record['high']
-
-        # 【比對點2】過去 N 年的最高價（不含最新日期）
-        historical_data = stock_data[stock_data['date'] < latest_date]
-        if historical_data.empty:
-            continue
-
-        historical_max = historical_data['high'].max()
-
-        # 找出前高的日期
-        previous_high_date = historical_data[historical_data['high'] == historical_max]['date'].max()
-
-        # 檢查是否創新高
-        if latest_high > historical_max:
-            new_highs.append({
-                'stock_id': stock_id,
-                'stock_name': latest_record['stock_name'],
-                'date': latest_date.date(),
-                'latest_high': latest_high,
-                'previous_high': historical_max,
-                'previous_high_date': previous_high_date.date(),
-                'increase': latest_high - historical_max,
-                'increase_pct': ((latest_high - historical_max) / historical_max) * 100
-            })
-
-    return new_highs
+from core.new_high import check_new_highs, format_new_high_message, print_check_header
+from core.panel import find_new_highs_panel, load_panel
+from core.rolling_high import check_new_highs_incremental
+from core.store import create_store
 
 
 def format_notification(new_highs, years=3):
     """格式化通知訊息"""
-    if not new_highs:
-        return f"📊 今日無股票創 {years} 年新高"
-
-    message_lines = [
-        f"🚀 創 {years} 年新高通知",
-        f"📅 {new_highs[0]['date']} (共 {len(new_highs)} 支)",
-        ""
-    ]
-
-    # 依照股票代號排序
-    sorted_highs = sorted(new_highs, key=lambda x: x['stock_id'])
-
-    for stock in sorted_highs:
-        message_lines.append(
-            f"{stock['stock_id']} ({stock['stock_name']}): "
-            f"新高 ${stock['latest_high']:.2f} | "
-            f"前高 ${stock['previous_high']:.2f} ({stock['previous_high_date']})"
-        )
-
-    return "\n".join(message_lines)
+    return format_new_high_message(new_highs, years) or f"📊 今日無股票創 {years} 年新高"
 
 
 def main():
     """主程式"""
+    parser = argparse.ArgumentParser(description='檢查股票是否創三年新高並發送 Line 通知')
+    parser.add_argument(
+        '--rebuild-state',
+        action='store_true',
+        help='由歷史資料重建滾動新高狀態'
+    )
+    parser.add_argument(
+        '--panel',
+        action='store_true',
+        help='以價格面板檢查（不使用滾動新高狀態）'
+    )
+    parser.add_argument(
+        '--scan',
+        action='store_true',
+        help='直接查詢最近三年的 high 檢查（不使用滾動新高狀態）'
+    )
+    args = parser.parse_args()
+
     print("\n" + "="*70)
     print("🔍 股票三年新高檢查工具")
     print("="*70 + "\n")
 
-    # 資料檔案路徑
+    # 資料儲存位置
     project_root = Path(__file__).parent.parent
-    data_file = project_root / 'data' / 'taiwan_stocks.csv'
+    store = create_store(project_root / 'data')
 
-    # 載入資料
-    print("📂 載入股票資料...")
-    df = load_stock_data(data_file)
-
-    if df is None:
+    if not store.exists():
+        print(f"❌ 找不到資料: {store.location}")
         print("\n❌ 無法載入資料，程式結束\n")
         return
 
-    print(f"✓ 已載入 {len(df):,} 筆資料")
-    print(f"✓ 股票數量: {df['stock_id'].nunique()} 支\n")
-
-    # 檢查新高
-    new_highs = check_new_highs(df, years=3)
+    manifest = store.load_manifest()
+    print(f"✓ 資料共 {manifest.row_count:,} 筆")
+    print(f"✓ 股票數量: {len(manifest.stocks)} 支\n")
+
+    # 檢查新高（使用增量滾動新高狀態，不重新載入三年歷史）
+    print("📌 邏輯: 檢查最新日期的 high 是否 > 過去 3 年內的所有 high")
+    if args.panel:
+        panel = load_panel(store.storage)
+        instruments = load_instruments(store.output_dir)
+        stock_names = dict(zip(instruments.stock_ids, instruments.names))
+        new_highs, latest_date, start_date, active_count = find_new_highs_panel(panel, years=3, stock_names=stock_names)
+        if latest_date is None:
+            print("❌ 資料為空")
+            return
+        print_check_header(latest_date, start_date, active_count, years=3)
+    elif args.scan:
+        # 只讀取最近三年的 date, stock_id, stock_name, high
+        _, df = store.window(3, columns=['date', 'stock_id', 'stock_name', 'high'])
+        new_highs = check_new_highs(df, years=3)
+    else:
+        new_highs = check_new_highs_incremental(store.storage, years=3, rebuild=args.rebuild_state)
 
     # 顯示結果
     if new_highs:
@@ -11,8 +11,8 @@ import sys
 from pathlib import Path
 import time
 import os
-from datetime import datetime, timedelta
-import pandas as pd
+import argparse
+from datetime import datetime
 
 # 嘗試載入 python-dotenv（如果有安裝的話）
 try:
@@ -32,113 +32,47 @@ except ImportError:
 # 添加父目錄到 Python 路徑以導入 core 模組
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from core.stock_fetcher import TaiwanStockFetcher
-from core.line_sender import send_line_message
-
-
-def check_new_highs(df, years=3):
-    """
-    檢查哪些股票創下近期新高
-
-    Args:
-        df: 股票資料 DataFrame
-        years: 檢查幾年內的新高（預設 3 年）
-
-    Returns:
-        list: 創新高的股票資訊列表
-    """
-    if df is None or df.empty:
-        return []
-
-    # 確保 date 欄位是 datetime
-    df = df.copy()
-    df['date'] = pd.to_datetime(df['date'])
-
-    # 計算時間範圍
-    latest_date = df['date'].max()
-    start_date = latest_date - timedelta(days=years * 365)
-
-    print(f"🔍 最新日期: {latest_date.date()}")
-    print(f"📊 比對範圍: {start_date.date()} ~ {(latest_date - timedelta(days=1)).date()} (過去 {years} 年)")
-
-    # 篩選近 N 年的資料（用於比對）
-    df_recent = df[df['date'] >= start_date].copy()
-
-    new_highs = []
-
-    # 取得最新日期有交易的股票
-    latest_df = df_recent[df_recent['date'] == latest_date]
-    print(f"💼 最新日期有交易的股票數: {latest_df['stock_id'].nunique()} 支\n")
-
-    # 對每支股票進行檢查
-    for stock_id in latest_df['stock_id'].unique():
-        # 該股票在近 N 年的所有歷史資料
-        stock_data = df_recent[df_recent['stock_id'] == stock_id]
-
-        if len(stock_data) < 2:
-            continue
-
-        # 【比對點1】最新日期的 high
-        latest_record = stock_data[stock_data['date'] == latest_date].iloc[0]
-        latest_high = latest_record['high']
-
-        # 【比對點2】過去 N 年的最高價（不含最新日期）
-        historical_data = stock_data[stock_data['date'] < latest_date]
-        if historical_data.empty:
-            continue
-
-        historical_max = historical_data['high'].max()
-
-        # 找出前高的日期
-        previous_high_date = historical_data[historical_data['high'] == historical_max]['date'].max()
-
-        # 檢查是否創新高
-        if latest_high > historical_max:
-            new_highs.append({
-                'stock_id': stock_id,
-                'stock_name': latest_record['stock_name'],
-                'date': latest_date.date(),
-                'latest_high': latest_high,
-                'previous_high': historical_max,
-                'previous_high_date': previous_high_date.date(),
-                'increase': latest_high - historical_max,
-                'increase_pct': ((latest_high - historical_max) / historical_max) * 100
-            })
-
-    return new_highs
+# 只匯入標準函式庫模組；pandas、FinMind 等在確定需要抓取後才載入
+from core.fetch_status import check_up_to_date, probe_backoff, write_fetch_status
 
 
 def format_new_high_notification(new_highs, years=3):
     """格式化新高通知訊息"""
-    if not new_highs:
-        return None
-
-    message_lines = [
-        f"🚀 創 {years} 年新高通知",
-        f"📅 {new_highs[0]['date']} (共 {len(new_highs)} 支)",
-        ""
-    ]
-
-    # 依照股票代號排序
-    sorted_highs = sorted(new_highs, key=lambda x: x['stock_id'])
-
-    for stock in sorted_highs:
-        message_lines.append(
-            f"{stock['stock_id']} ({stock['stock_name']}): "
-            f"新高 ${stock['latest_high']:.2f} | "
-            f"前高 ${stock['previous_high']:.2f} ({stock['previous_high_date']})"
-        )
-
-    return "\n".join(message_lines)
+    from core.new_high import format_new_high_message
+    return format_new_high_message(new_highs, years)
 
 
 def main():
     """主程式 - 抓取缺失資料並檢查新高"""
+    parser = argparse.ArgumentParser(description='抓取臺股最新資料並檢查三年新高')
+    parser.add_argument(
+        '--force',
+        action='store_true',
+        help='略過快速檢查，一律完整執行'
+    )
+    args = parser.parse_args()
+
     start_time = time.time()
     today = datetime.now()
-    yesterday = (today - timedelta(days=1)).strftime('%Y-%m-%d')
     today_str = today.strftime('%Y-%m-%d')
 
+    # 快速檢查：資料已是最新時不載入任何重量級模組，直接結束
+    if not args.force:
+        latest = check_up_to_date('data', today_str)
+        if latest:
+            print(f"✓ {today_str} 資料已是最新（{latest}），無需執行")
+            return
+
+        backoff = probe_backoff('data', today_str)
+        if backoff:
+            session, remaining = backoff
+            print(f"⏳ {session} 的資料尚未公布，{remaining / 60:.0f} 分鐘後再探測")
+            return
+
+    from core.stock_fetcher import TaiwanStockFetcher
+    from core.line_sender import send_line_message
+    from core.rolling_high import check_new_highs_incremental
+
     print("\n" + "="*70)
     print(f"🇹🇼  臺股每日資料獲取工具 - {today_str}")
     print("="*70 + "\n")
@@ -147,82 +81,28 @@ def main():
     api_token = os.getenv('FINMIND_API_TOKEN')
     fetcher = TaiwanStockFetcher(api_token=api_token)
 
+    # 預期的最新資料日期：今天之前的最後一個交易日（週末與休市日依交易日曆）
+    expected_latest = fetcher.calendar.prev_session(today_str)
+
     status_message = "✅ 執行成功"
     total_new = 0
     new_highs = []
 
     try:
-        # 檢查現有資料
-        exists, earliest, latest, count = fetcher.get_existing_data_info()
-
-        if exists and latest:
-            print(f"📂 現有資料: {earliest} ~ {latest} ({count:,} 筆)")
-
-            # 計算需要抓取的日期範圍
-            latest_date = datetime.strptime(latest, '%Y-%m-%d')
-            yesterday_date = datetime.strptime(yesterday, '%Y-%m-%d')
-
-            if latest_date >= yesterday_date:
-                print(f"✓ 資料已是最新（{latest}），無需抓取\n")
-            else:
-                # 需要抓取的起始日期 = 最新日期 + 1 天
-                fetch_start = (latest_date + timedelta(days=1)).strftime('%Y-%m-%d')
-                fetch_end = yesterday
-
-                days_gap = (yesterday_date - latest_date).days
-                print(f"📥 需補齊 {days_gap} 天資料: {fetch_start} ~ {fetch_end}\n")
-
-                # 獲取股票列表
-                print("📝 獲取股票列表...")
-                stock_list = fetcher.get_stock_list()
-                if not stock_list:
-                    raise Exception("無法獲取股票列表")
-                print(f"✓ 共 {len(stock_list)} 檔股票\n")
-
-                # 抓取資料
-                new_df = fetcher.fetch_batch(stock_list, fetch_start, fetch_end, delay=0.2)
-
-                if not new_df.empty:
-                    total_new = len(new_df)
-                    print(f"✓ 獲取到 {total_new} 筆資料\n")
-
-                    # 儲存資料
-                    fetcher.merge_and_save(new_df)
-                    fetcher.show_preview(new_df, n=5)
-                else:
-                    print("⚠️  未獲取到資料（可能是休市日）\n")
-        else:
-            print("📂 無現有資料，抓取最近 30 天...\n")
-            fetch_start = (today - timedelta(days=30)).strftime('%Y-%m-%d')
-            fetch_end = yesterday
-
-            # 獲取股票列表
-            print("📝 獲取股票列表...")
-            stock_list = fetcher.get_stock_list()
-            if not stock_list:
-                raise Exception("無法獲取股票列表")
-            print(f"✓ 共 {len(stock_list)} 檔股票\n")
-
-            # 抓取資料
-            new_df = fetcher.fetch_batch(stock_list, fetch_start, fetch_end, delay=0.2)
-
-            if not new_df.empty:
-                total_new = len(new_df)
-                fetcher.merge_and_save(new_df)
+        # 續抓未完成的批次，並補齊到最新交易日
+        total_new += fetcher.update_latest(today_str, delay=0.2)
 
         # 檢查三年新高（僅在資料為最新時執行）
         _, _, latest, _ = fetcher.get_existing_data_info()
-        if latest != yesterday:
-            print(f"\n⚠️  資料不是最新（最新: {latest}，預期: {yesterday}），跳過新高檢查\n")
+        if latest != expected_latest:
+            print(f"\n⚠️  資料不是最新（最新: {latest}，預期: {expected_latest}），跳過新高檢查\n")
         else:
             print("\n" + "="*70)
             print("🔍 檢查三年新高...")
             print("="*70 + "\n")
 
-            data_file = fetcher.csv_path
-            if data_file.exists():
-                df = pd.read_csv(data_file)
-                new_highs = check_new_highs(df, years=3)
+            if fetcher.storage.exists():
+                new_highs = check_new_highs_incremental(fetcher.storage, years=3, listener=fetcher.rolling_high)
 
                 if new_highs:
                     print(f"🎉 發現 {len(new_highs)} 支股票創三年新高！\n")
@@ -244,6 +124,12 @@ def main():
         print(f"   日期範圍: {earliest} ~ {latest}")
         print(f"{'='*70}\n")
 
+        # 記錄狀態，供下次排程觸發時快速判斷是否需要執行
+        if latest:
+            write_fetch_status(
+                fetcher.output_dir, fetcher.storage.manifest_path, latest, fetcher.calendar.next_session(latest)
+            )
+
     except KeyboardInterrupt:
         status_message = "⚠️  執行被使用者中斷"
         print(f"\n\n{status_message}\n")
@@ -276,14 +162,14 @@ def main():
         send_line_message(fetch_message)
 
         # 新高通知（僅在資料為最新時發送）
-        if latest == yesterday:
+        if latest == expected_latest:
             new_high_message = format_new_high_notification(new_highs, years=3)
             if new_high_message:
                 send_line_message(new_high_message)
             else:
                 send_line_message(f"📊 {latest} 無股票創 3 年新高")
         else:
-            send_line_message(f"⚠️ 資料未更新至 {yesterday}（目前最新: {latest}），跳過新高檢查")
+            send_line_message(f"⚠️ 資料未更新至 {expected_latest}（目前最新: {latest}），跳過新高檢查")
 
 
 if __name__ == "__main__":
@@ -117,20 +117,21 @@ def main():
 
         # 抓取資料
         print(f"📥 開始抓取資料...")
-        new_df = fetcher.fetch_batch(
+        total_new, preview_df = fetcher.fetch_and_store(
             stock_list,
             fetch_start.strftime('%Y-%m-%d'),
             fetch_end.strftime('%Y-%m-%d'),
-            delay=0.2
+            delay=0.2,
+            task='past'
         )
 
-        if not new_df.empty:
-            total_new = len(new_df)
+        if fetcher.journal.unfinished('past'):
+            # 部分請求失敗：不推進起始日期，下次以相同範圍只補抓未完成的請求
+            status_message = "⚠️  部分請求失敗，下次執行時將從中斷處繼續"
+            print(f"\n{status_message}")
+        elif total_new:
             print(f"✓ 獲取到 {total_new} 筆資料\n")
-
-            # 儲存資料
-            fetcher.merge_and_save(new_df)
-            fetcher.show_preview(new_df, n=5)
+            fetcher.show_preview(preview_df, n=5)
 
             # 更新起始日期記錄（往前推）
             new_start_date = fetch_start - timedelta(days=1)
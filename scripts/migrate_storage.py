@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+臺股資料儲存格式轉換工具
+將 data/taiwan_stocks.csv 一次性轉換為依年/月分區的 Parquet 檔案
+轉換完成後，各腳本會自動偵測並改用 Parquet 儲存
+加 --rewrite-parquet 可將既有的舊格式 Parquet 分區改寫為精簡格式
+"""
+
+import sys
+from pathlib import Path
+import argparse
+import time
+
+# 添加父目錄到 Python 路徑以導入 core 模組
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core.storage import CsvStorage, ParquetStorage, migrate_csv_to_parquet
+
+
+def main():
+    """主程式"""
+    parser = argparse.ArgumentParser(description='將 taiwan_stocks.csv 轉換為分區 Parquet')
+    parser.add_argument(
+        '--output-dir',
+        type=str,
+        default='data',
+        help='資料目錄（預設: data）'
+    )
+    parser.add_argument(
+        '--remove-csv',
+        action='store_true',
+        help='轉換成功後刪除原 CSV 檔案'
+    )
+    parser.add_argument(
+        '--rewrite-parquet',
+        action='store_true',
+        help='將既有的舊格式 Parquet 分區改寫為精簡格式（整數代碼、date32、整數價格）'
+    )
+
+    args = parser.parse_args()
+
+    print("\n" + "="*70)
+    print("🗂️  臺股資料儲存格式轉換工具 (CSV → Parquet)")
+    print("="*70 + "\n")
+
+    start_time = time.time()
+    if args.rewrite_parquet:
+        rewritten = ParquetStorage(args.output_dir).rewrite_partitions()
+        print(f"✓ 已改寫 {rewritten} 個分區")
+        print(f"\n⏱️  耗時 {time.time() - start_time:.2f} 秒\n")
+        return
+
+    total = migrate_csv_to_parquet(args.output_dir)
+
+    if total and args.remove_csv:
+        csv_path = Path(args.output_dir) / CsvStorage.CSV_FILENAME
+        csv_path.unlink()
+        print(f"🗑️  已刪除 {csv_path}")
+
+    print(f"\n⏱️  耗時 {time.time() - start_time:.2f} 秒\n")
+
+
+if __name__ == "__main__":
+    main()
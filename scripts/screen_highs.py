@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+以區間極值索引篩選新高 / 新低
+功能：
+- 篩選任一交易日創 52 週、1 / 3 / 5 年或歷史新高（加 --low 為新低）的股票
+- 加 --stock 查詢單一股票截至某日的各視窗高 / 低點與日期
+- 查詢只需查表（data/panel/range_*.npy），不必掃描歷史資料
+"""
+
+import sys
+from pathlib import Path
+import argparse
+import os
+
+# 嘗試載入 python-dotenv（如果有安裝的話）
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    # 手動載入 .env 檔案
+    env_file = Path(__file__).parent.parent / '.env'
+    if env_file.exists():
+        with open(env_file) as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith('#') and '=' in line:
+                    key, value = line.split('=', 1)
+                    os.environ.setdefault(key, value)
+
+# 添加父目錄到 Python 路徑以導入 core 模組
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core.instruments import load_instruments
+from core.range_index import WINDOWS, extreme_as_of, find_breakouts, load_range_index
+from core.storage import create_storage
+
+WINDOW_LABELS = {'52w': '52 週', '1y': '1 年', '3y': '3 年', '5y': '5 年', 'all': '歷史'}
+
+
+def print_stock_extremes(panel, index, stock_id, as_of=None):
+    """列印單一股票各視窗的高 / 低點"""
+    print(f"📈 {stock_id} 截至 {as_of or panel.dates[-1]} 的高 / 低點\n")
+    for window, days in WINDOWS.items():
+        high, high_date = extreme_as_of(panel, index, stock_id, 'high', days, as_of)
+        low, low_date = extreme_as_of(panel, index, stock_id, 'low', days, as_of)
+        if high is None:
+            print(f"  {WINDOW_LABELS[window]:>5}: 無資料")
+            continue
+        print(f"  {WINDOW_LABELS[window]:>5}: 高 ${high:.2f} ({high_date}) | 低 ${low:.2f} ({low_date})")
+    print()
+
+
+def main():
+    """主程式"""
+    parser = argparse.ArgumentParser(description='以區間極值索引篩選新高 / 新低')
+    parser.add_argument(
+        '--window',
+        choices=list(WINDOWS),
+        default='3y',
+        help='比對視窗（預設 3y）'
+    )
+    parser.add_argument(
+        '--as-of',
+        default=None,
+        help='檢查日期 YYYY-MM-DD（該日或之前最後一個交易日，預設最新交易日）'
+    )
+    parser.add_argument(
+        '--low',
+        action='store_true',
+        help='篩選新低（預設為新高）'
+    )
+    parser.add_argument(
+        '--stock',
+        default=None,
+        help='只查詢單一股票各視窗的高 / 低點'
+    )
+    parser.add_argument(
+        '--rebuild',
+        action='store_true',
+        help='由歷史資料重建價格面板與索引'
+    )
+    args = parser.parse_args()
+
+    project_root = Path(__file__).parent.parent
+    storage = create_storage(project_root / 'data')
+    if not storage.exists():
+        print(f"❌ 找不到資料: {storage.location}")
+        return
+
+    panel, index = load_range_index(storage, rebuild=args.rebuild)
+    if not panel.dates:
+        print("❌ 資料為空")
+        return
+
+    if args.stock:
+        print_stock_extremes(panel, index, args.stock, args.as_of)
+        return
+
+    field = 'low' if args.low else 'high'
+    kind = '新低' if args.low else '新高'
+    label = WINDOW_LABELS[args.window]
+    instruments = load_instruments(storage.output_dir)
+    stock_names = dict(zip(instruments.stock_ids, instruments.names))
+    results, date, start_date, active_count = find_breakouts(
+        panel, index, field, WINDOWS[args.window], args.as_of, stock_names
+    )
+    if date is None:
+        print(f"❌ {args.as_of} 之前沒有資料")
+        return
+
+    print(f"🔍 檢查日期: {date.date()}")
+    print(f"📊 比對範圍: {start_date.date()} 起（{label}）")
+    print(f"💼 當日有交易的股票數: {active_count} 支\n")
+
+    if not results:
+        print(f"ℹ️  無股票創 {label}{kind}\n")
+        return
+
+    print(f"🎉 {len(results)} 支股票創 {label}{kind}\n")
+    for stock in sorted(results, key=lambda x: x['stock_id']):
+        print(f"  {stock['stock_id']} ({stock['stock_name']}): "
+              f"{kind} ${stock[f'latest_{field}']:.2f} | "
+              f"前{'低' if args.low else '高'} ${stock[f'previous_{field}']:.2f} ({stock[f'previous_{field}_date']}) | "
+              f"{stock['increase_pct']:+.2f}%")
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+臺股資料常駐服務
+功能：
+- run: 啟動常駐服務，依內部排程抓取最新資料、合併資料段並檢查三年新高
+- status: 查詢執行中服務的狀態
+- trigger <fetch|merge|screen>: 立即執行指定工作
+- stop: 停止執行中的服務
+- series <stock_id>: 由服務的記憶體快取查詢個股序列
+"""
+
+import sys
+from pathlib import Path
+import argparse
+import json
+import os
+import signal
+
+# 嘗試載入 python-dotenv（如果有安裝的話）
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    # 手動載入 .env 檔案
+    env_file = Path(__file__).parent.parent / '.env'
+    if env_file.exists():
+        with open(env_file) as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith('#') and '=' in line:
+                    key, value = line.split('=', 1)
+                    os.environ.setdefault(key, value)
+
+# 添加父目錄到 Python 路徑以導入 core 模組
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core.daemon import JOBS, SOCKET_FILENAME, StockDaemon, send_command
+
+
+def main():
+    """主程式"""
+    parser = argparse.ArgumentParser(description='臺股資料常駐服務')
+    parser.add_argument(
+        '--socket',
+        default=None,
+        help=f'控制 socket 路徑（預設 data/{SOCKET_FILENAME}）'
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='啟動常駐服務')
+    run_parser.add_argument(
+        '--fetch-interval',
+        type=int,
+        default=60,
+        help='抓取間隔（分鐘，預設 60）'
+    )
+    run_parser.add_argument(
+        '--merge-interval',
+        type=int,
+        default=24 * 60,
+        help='資料段合併間隔（分鐘，預設 1440）'
+    )
+    subparsers.add_parser('status', help='查詢服務狀態')
+    trigger_parser = subparsers.add_parser('trigger', help='立即執行指定工作')
+    trigger_parser.add_argument('job', choices=JOBS)
+    subparsers.add_parser('stop', help='停止服務')
+    series_parser = subparsers.add_parser('series', help='查詢個股序列（經由服務的記憶體快取）')
+    series_parser.add_argument('stock_id')
+    series_parser.add_argument('--columns', default='close', help='欄位，以逗號分隔（預設 close）')
+    series_parser.add_argument('--start', default=None, help='起始日期 YYYY-MM-DD')
+    series_parser.add_argument('--end', default=None, help='結束日期 YYYY-MM-DD')
+    args = parser.parse_args()
+
+    project_root = Path(__file__).parent.parent
+    socket_path = Path(args.socket) if args.socket else project_root / 'data' / SOCKET_FILENAME
+
+    if args.command == 'run':
+        daemon = StockDaemon(
+            output_dir=project_root / 'data',
+            socket_path=socket_path,
+            fetch_interval=args.fetch_interval * 60,
+            merge_interval=args.merge_interval * 60,
+            api_token=os.getenv('FINMIND_API_TOKEN'),
+        )
+
+        def _handle_signal(signum, frame):
+            # 只要求停止：執行中的工作在進行中的請求寫出後結束（抓取日誌會記錄進度，下次啟動時續抓），
+            # 不在寫入資料段與資料集清單之間中斷
+            daemon.stop()
+
+        signal.signal(signal.SIGTERM, _handle_signal)
+        try:
+            daemon.run_forever()
+        except KeyboardInterrupt:
+            print("\n⚠️  執行被中斷")
+        return
+
+    try:
+        params = {}
+        if args.command == 'trigger':
+            params = {'job': args.job}
+        elif args.command == 'series':
+            params = {'stock_id': args.stock_id, 'columns': args.columns.split(','),
+                      'start': args.start, 'end': args.end}
+        response = send_command(socket_path, args.command, **params)
+    except OSError as e:
+        print(f"❌ 無法連線到常駐服務（{socket_path}）: {e}")
+        sys.exit(1)
+
+    if not response.get('ok'):
+        print(f"❌ {response.get('error')}")
+        sys.exit(1)
+    if args.command == 'status':
+        print(json.dumps(response['status'], ensure_ascii=False, indent=2))
+    elif args.command == 'trigger':
+        print(f"✓ 已排入工作: {args.job}")
+    elif args.command == 'series':
+        series = response['series']
+        columns = [column for column in series if column != 'date']
+        print('\t'.join(['date'] + columns))
+        for i, date in enumerate(series['date']):
+            print('\t'.join([date] + [str(series[column][i]) for column in columns]))
+    else:
+        print("✓ 已要求服務停止")
+
+
+if __name__ == "__main__":
+    main()